@@ -4,16 +4,19 @@ Create this file: authentication/admin.py
 """
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from backend.admin_pagination import FastChangeListMixin
 from .models import User
 
 
 @admin.register(User)
-class UserAdmin(BaseUserAdmin):
+class UserAdmin(FastChangeListMixin, BaseUserAdmin):
     """Custom admin for User model"""
     
     list_display = ['email', 'name', 'role', 'is_active', 'date_joined']
     list_filter = ['role', 'is_active', 'is_staff', 'date_joined']
-    search_fields = ['email', 'name']
+    # The email prefix match can use users_email_prefix_idx on PostgreSQL
+    search_fields = ['email__istartswith', 'name']
+    search_help_text = 'Email (or its beginning) or name'
     ordering = ['-date_joined']
     
     fieldsets = (
@@ -0,0 +1,111 @@
+"""
+Async API views for authentication
+
+Native async counterparts of views.login_view and views.verify_token_view for
+running under backend.asgi. DRF's @api_view is sync-only, so these are plain
+Django async views returning the same JSON.
+"""
+from functools import wraps
+from django.contrib.auth import aauthenticate
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from .authentication import ClaimsJWTAuthentication
+from .hashing import HashingBusy
+from .serializers import LoginSerializer, UserSerializer
+from .views import get_tokens_for_user
+import json
+
+
+def parse_json(request):
+    """Request body as a dict, {} if empty or not JSON"""
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def jwt_required(view):
+    """Authenticate an async view with the Bearer token, 401 otherwise"""
+    authenticator = ClaimsJWTAuthentication()
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            result = await authenticator.aauthenticate(request)
+        except (AuthenticationFailed, InvalidToken, TokenError) as e:
+            return JsonResponse({'detail': str(getattr(e, 'detail', e))}, status=401)
+        if result is None:
+            return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+        request.user, request.auth = result
+        return await view(request, *args, **kwargs)
+
+    return wrapper
+
+
+@csrf_exempt
+@require_POST
+async def login_view(request):
+    """
+    Login user
+
+    Expected input: {email, password}
+    Returns: {success, message, user, token} OR {success: false, message}
+    """
+    serializer = LoginSerializer(data=parse_json(request))
+
+    if not serializer.is_valid():
+        return JsonResponse({
+            'success': False,
+            'message': 'Please provide valid email and password'
+        }, status=400)
+
+    try:
+        user = await aauthenticate(
+            request,
+            username=serializer.validated_data['email'],
+            password=serializer.validated_data['password']
+        )
+    except HashingBusy as e:
+        response = JsonResponse({'success': False, 'message': str(e)}, status=503)
+        response['Retry-After'] = str(e.retry_after)
+        return response
+
+    if user is None:
+        return JsonResponse({
+            'success': False,
+            'message': 'Invalid email or password'
+        }, status=401)
+
+    if not user.is_active:
+        return JsonResponse({
+            'success': False,
+            'message': 'Account is disabled'
+        }, status=403)
+
+    tokens = get_tokens_for_user(user)
+    return JsonResponse({
+        'success': True,
+        'message': 'Login successful',
+        'user': UserSerializer(user).data,
+        'token': tokens['access'],
+        'refresh': tokens['refresh']
+    })
+
+
+@require_GET
+@jwt_required
+async def verify_token_view(request):
+    """
+    Verify if the token is valid and return user data
+
+    Requires: Authorization header with Bearer token
+    Returns: {success, user}
+    """
+    return JsonResponse({
+        'success': True,
+        'user': UserSerializer(request.user).data
+    })
@@ -0,0 +1,199 @@
+"""
+Database-free JWT authentication
+
+Access tokens carry the user's id, role, name, email and is_staff claims (see
+views.get_tokens_for_user), so requests are authenticated without loading the
+users row. Whether the account is still active, and its current role, come
+from a small per-worker cache that is re-checked against the database every
+AUTH_USER_STATE_TTL seconds, or as soon as the shared account-revocation
+generation moves (any deactivation, role, permission or password change).
+"""
+from asgiref.sync import sync_to_async
+from collections import OrderedDict, namedtuple
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.functional import cached_property
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from .models import User
+import threading
+import time
+import uuid
+
+REVOCATION_GENERATION_KEY = 'auth:revocation-generation'
+
+UserState = namedtuple('UserState', ['is_active', 'role', 'is_staff'])
+
+
+class UserStateCache:
+    """Bounded, short-TTL LRU of user_id -> UserState"""
+
+    def __init__(self, max_entries=10000, ttl=30.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, user_id, generation):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            state, stored_at, stored_generation = entry
+            if stored_generation != generation or time.monotonic() - stored_at > self.ttl:
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return state
+
+    def set(self, user_id, state, generation):
+        with self._lock:
+            self._entries[user_id] = (state, time.monotonic(), generation)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_states = UserStateCache(
+    max_entries=settings.AUTH_USER_STATE_MAX_ENTRIES,
+    ttl=settings.AUTH_USER_STATE_TTL,
+)
+
+
+def get_revocation_generation():
+    return cache.get(REVOCATION_GENERATION_KEY, 0)
+
+
+def revoke_user_state(user_id):
+    """Force every worker to re-check accounts against the database"""
+    user_states.discard(user_id)
+    cache.set(REVOCATION_GENERATION_KEY, time.time_ns(), None)
+
+
+def revoke_all_user_states():
+    """Force every worker to re-check every account (after bulk updates)"""
+    user_states.clear()
+    cache.set(REVOCATION_GENERATION_KEY, time.time_ns(), None)
+
+
+def get_user_state(user_id):
+    """Current UserState for a user id, None if the user no longer exists"""
+    generation = get_revocation_generation()
+    state = user_states.get(user_id, generation)
+    if state is None:
+        row = User.objects.filter(pk=user_id).values_list('is_active', 'role', 'is_staff').first()
+        if row is None:
+            return None
+        state = UserState(*row)
+        user_states.set(user_id, state, generation)
+    return state
+
+
+async def aget_user_state(user_id):
+    """get_user_state() using the async ORM"""
+    generation = await cache.aget(REVOCATION_GENERATION_KEY, 0)
+    state = user_states.get(user_id, generation)
+    if state is None:
+        row = await User.objects.filter(pk=user_id).values_list('is_active', 'role', 'is_staff').afirst()
+        if row is None:
+            return None
+        state = UserState(*row)
+        user_states.set(user_id, state, generation)
+    return state
+
+
+class ClaimsUser(TokenUser):
+    """Request user built from signed token claims; has no users row loaded"""
+
+    def __init__(self, token, state):
+        super().__init__(token)
+        self.state = state
+
+    def __str__(self):
+        return f"{self.name} ({self.email})"
+
+    @cached_property
+    def id(self):
+        return uuid.UUID(str(self.token[api_settings.USER_ID_CLAIM]))
+
+    @cached_property
+    def pk(self):
+        return self.id
+
+    @cached_property
+    def email(self):
+        return self.token.get('email', '')
+
+    @cached_property
+    def name(self):
+        return self.token.get('name', '')
+
+    @property
+    def role(self):
+        return self.state.role
+
+    @property
+    def is_staff(self):
+        return self.state.is_staff
+
+    def get_full_name(self):
+        return self.name
+
+    def get_short_name(self):
+        return self.name
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that builds the user from token claims
+
+    Tokens issued before claims were embedded fall back to the database lookup.
+    """
+
+    def _claims_user_id(self, validated_token):
+        if 'role' not in validated_token:
+            return None
+        try:
+            return uuid.UUID(str(validated_token[api_settings.USER_ID_CLAIM]))
+        except (KeyError, ValueError):
+            return None
+
+    def _claims_user(self, validated_token, state):
+        if state is None:
+            raise AuthenticationFailed('User not found', code='user_not_found')
+        if not state.is_active:
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+        return ClaimsUser(validated_token, state)
+
+    def get_user(self, validated_token):
+        user_id = self._claims_user_id(validated_token)
+        if user_id is None:
+            return super().get_user(validated_token)
+        return self._claims_user(validated_token, get_user_state(user_id))
+
+    async def aget_user(self, validated_token):
+        user_id = self._claims_user_id(validated_token)
+        if user_id is None:
+            return await sync_to_async(super().get_user)(validated_token)
+        return self._claims_user(validated_token, await aget_user_state(user_id))
+
+    async def aauthenticate(self, request):
+        """authenticate() for plain async Django views; token checks are CPU only"""
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
@@ -0,0 +1,161 @@
+"""
+Bounded executor for password hashing
+
+PBKDF2 runs on AUTH_HASHING_WORKERS dedicated threads instead of the request
+thread (or the event loop under ASGI), so a login burst can use at most that
+many cores. At most AUTH_HASHING_MAX_PENDING hashes are queued or running;
+beyond that, or when a queued hash has waited AUTH_HASHING_MAX_QUEUE_WAIT
+seconds, HashingBusy is raised and views answer 503 with Retry-After.
+AUTH_HASHING_WORKERS = 0 hashes inline, uncapped.
+"""
+from concurrent.futures import Future, ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth import hashers
+import asyncio
+import math
+import threading
+import time
+
+
+class HashingBusy(Exception):
+    """The hashing executor is saturated; retry after `retry_after` seconds"""
+
+    def __init__(self, retry_after):
+        super().__init__('Too many concurrent sign-ins, please retry shortly')
+        self.retry_after = retry_after
+
+
+class HashingExecutor:
+    """Thread pool with an admission cap and a queue-time limit"""
+
+    def __init__(self, max_workers=2, max_pending=64, max_queue_wait=2.0):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.max_queue_wait = max_queue_wait
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._completed = 0
+        self._rejected = 0
+        self._expired = 0
+        self._pool = None
+        if max_workers > 0:
+            self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='password-hashing')
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            max_workers=settings.AUTH_HASHING_WORKERS,
+            max_pending=settings.AUTH_HASHING_MAX_PENDING,
+            max_queue_wait=settings.AUTH_HASHING_MAX_QUEUE_WAIT,
+        )
+
+    @property
+    def retry_after(self):
+        return max(1, math.ceil(self.max_queue_wait))
+
+    def _call(self, fn, args, queued_at):
+        if time.monotonic() - queued_at > self.max_queue_wait:
+            with self._lock:
+                self._expired += 1
+            raise HashingBusy(self.retry_after)
+        return fn(*args)
+
+    def _done(self, future):
+        with self._lock:
+            self._pending -= 1
+            self._completed += 1
+
+    def submit(self, fn, *args):
+        """Queue fn(*args); raises HashingBusy if max_pending are already queued"""
+        if self._pool is None:
+            future = Future()
+            try:
+                future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+            with self._lock:
+                self._completed += 1
+            return future
+
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                raise HashingBusy(self.retry_after)
+            self._pending += 1
+        future = self._pool.submit(self._call, fn, args, time.monotonic())
+        future.add_done_callback(self._done)
+        return future
+
+    def run(self, fn, *args):
+        return self.submit(fn, *args).result()
+
+    async def arun(self, fn, *args):
+        """run() without blocking the event loop"""
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.max_workers,
+                'pending': self._pending,
+                'completed': self._completed,
+                'rejected': self._rejected,
+                'expired_in_queue': self._expired,
+            }
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """The worker's hashing executor, created on first use"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = HashingExecutor.from_settings()
+    return _executor
+
+
+def _verify(raw_password, encoded):
+    """(is_correct, must_update) without saving anything"""
+    must_update = []
+    is_correct = hashers.check_password(raw_password, encoded, must_update.append)
+    return is_correct, bool(must_update)
+
+
+def make_password(raw_password):
+    return get_executor().run(hashers.make_password, raw_password)
+
+
+async def amake_password(raw_password):
+    return await get_executor().arun(hashers.make_password, raw_password)
+
+
+def check_password(user, raw_password):
+    """
+    user.check_password() with the hash computed on the executor
+
+    Upgrading an outdated hash is best effort: when the executor is busy the
+    sign-in still succeeds and the upgrade waits for the next one.
+    """
+    is_correct, must_update = get_executor().run(_verify, raw_password, user.password)
+    if is_correct and must_update:
+        try:
+            user.password = make_password(raw_password)
+        except HashingBusy:
+            return is_correct
+        user.save(update_fields=['password'])
+    return is_correct
+
+
+async def acheck_password(user, raw_password):
+    is_correct, must_update = await get_executor().arun(_verify, raw_password, user.password)
+    if is_correct and must_update:
+        try:
+            user.password = await amake_password(raw_password)
+        except HashingBusy:
+            return is_correct
+        await user.asave(update_fields=['password'])
+    return is_correct
@@ -0,0 +1,61 @@
+"""
+Requests/sec for an authenticated endpoint with and without the users lookup
+
+Sends GET /api/auth/verify/ through the test client with the stock
+JWTAuthentication (one users query per request) and with
+ClaimsJWTAuthentication. Runs against the configured database (migrate first):
+    python manage.py bench_auth --requests 2000
+"""
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from authentication import views
+from authentication.authentication import ClaimsJWTAuthentication
+from authentication.models import User
+import json
+import time
+import uuid
+
+
+class Command(BaseCommand):
+    help = 'Benchmark JWT authentication with and without the users table lookup'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+
+    def run(self, client, authentication_class, requests):
+        view_class = views.verify_token_view.cls
+        original = view_class.authentication_classes
+        view_class.authentication_classes = [authentication_class]
+        try:
+            client.get(reverse('authentication:verify'))
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                for _ in range(requests):
+                    response = client.get(reverse('authentication:verify'))
+                    assert response.status_code == 200, response.status_code
+                elapsed = time.perf_counter() - started
+        finally:
+            view_class.authentication_classes = original
+        return {
+            'requests_per_sec': round(requests / elapsed, 1),
+            'mean_ms': round(elapsed / requests * 1000, 3),
+            'queries_per_request': round(len(queries.captured_queries) / requests, 3),
+        }
+
+    def handle(self, *args, **options):
+        user = User.objects.create_user(email=f'bench-{uuid.uuid4().hex[:8]}@example.com', name='Bench User')
+        try:
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=f"Bearer {views.get_tokens_for_user(user)['access']}")
+            report = {
+                'requests': options['requests'],
+                'database_lookup': self.run(client, JWTAuthentication, options['requests']),
+                'claims': self.run(client, ClaimsJWTAuthentication, options['requests']),
+            }
+            self.stdout.write(json.dumps(report, indent=2))
+        finally:
+            user.delete()
@@ -0,0 +1,115 @@
+"""
+Dashboard latency during a login burst, with inline and offloaded hashing
+
+Submits a burst of logins mixed with dashboard requests to a pool of
+--workers threads standing in for sync server workers, once hashing inline
+on the worker and once on the bounded hashing executor, and reports p50/p99
+for the dashboard requests (queueing included) plus login outcomes. Runs
+against the configured database (migrate first) and removes its fixtures
+afterwards:
+    python manage.py bench_login_burst --workers 8 --logins 100 --requests 400
+"""
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.test import Client
+from django.urls import reverse
+from unittest.mock import patch
+from authentication import hashing
+from authentication.models import User
+from authentication.views import get_tokens_for_user
+import json
+import random
+import statistics
+import time
+import uuid
+
+PASSWORD = 'Bench-Passw0rd'
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def latency_summary(samples):
+    return {
+        'mean': round(statistics.fmean(samples), 2) if samples else 0.0,
+        'p50': round(percentile(samples, 50), 2),
+        'p99': round(percentile(samples, 99), 2),
+    }
+
+
+class Command(BaseCommand):
+    help = 'Benchmark non-login latency during a login burst'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help='Server worker threads')
+        parser.add_argument('--logins', type=int, default=100)
+        parser.add_argument('--requests', type=int, default=400, help='Dashboard requests in the burst')
+        parser.add_argument('--hashing-workers', type=int, default=None)
+        parser.add_argument('--max-pending', type=int, default=None)
+        parser.add_argument('--max-queue-wait', type=float, default=None)
+
+    def run(self, executor, jobs, workers, email, headers):
+        login_url = reverse('authentication:login')
+        dashboard_url = reverse('progress:dashboard')
+        results = {'login': [], 'dashboard': []}
+
+        def handle(job, submitted_at):
+            client = Client()
+            try:
+                if job == 'login':
+                    response = client.post(login_url, {'email': email, 'password': PASSWORD}, content_type='application/json')
+                else:
+                    response = client.get(dashboard_url, headers=headers)
+                results[job].append((response.status_code, (time.perf_counter() - submitted_at) * 1000))
+            finally:
+                close_old_connections()
+
+        with patch.object(hashing, 'get_executor', return_value=executor):
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                for job in jobs:
+                    pool.submit(handle, job, time.perf_counter())
+            elapsed = time.perf_counter() - started
+
+        logins = results['login']
+        return {
+            'elapsed_s': round(elapsed, 2),
+            'dashboard_ms': latency_summary([ms for status, ms in results['dashboard'] if status == 200]),
+            'dashboard_failures': sum(status != 200 for status, ms in results['dashboard']),
+            'logins_ok': sum(status == 200 for status, ms in logins),
+            'logins_503': sum(status == 503 for status, ms in logins),
+            'login_ok_ms': latency_summary([ms for status, ms in logins if status == 200]),
+            'hashing': executor.stats(),
+        }
+
+    def handle(self, *args, **options):
+        user = User.objects.create_user(
+            email=f'bench-{uuid.uuid4().hex[:8]}@example.com', name='Bench Student', password=PASSWORD
+        )
+        headers = {'Authorization': f"Bearer {get_tokens_for_user(user)['access']}"}
+        jobs = ['login'] * options['logins'] + ['dashboard'] * options['requests']
+        random.Random(0).shuffle(jobs)
+
+        offloaded = hashing.HashingExecutor(
+            max_workers=options['hashing_workers'] or settings.AUTH_HASHING_WORKERS,
+            max_pending=options['max_pending'] or settings.AUTH_HASHING_MAX_PENDING,
+            max_queue_wait=options['max_queue_wait'] or settings.AUTH_HASHING_MAX_QUEUE_WAIT,
+        )
+
+        try:
+            report = {
+                'workers': options['workers'],
+                'logins': options['logins'],
+                'requests': options['requests'],
+                'inline': self.run(hashing.HashingExecutor(max_workers=0), jobs, options['workers'], user.email, headers),
+                'executor': self.run(offloaded, jobs, options['workers'], user.email, headers),
+            }
+            self.stdout.write(json.dumps(report, indent=2))
+        finally:
+            user.delete()
@@ -2,7 +2,9 @@
 Custom User Model for Authentication
 """
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
+from django.contrib.postgres.indexes import OpClass
 from django.db import models
+from django.db.models.functions import Upper
 import uuid
 
 
@@ -64,6 +66,15 @@ class User(AbstractBaseUser, PermissionsMixin):
         db_table = 'users'
         verbose_name = 'User'
         verbose_name_plural = 'Users'
+        indexes = [
+            # Students/teachers by role, newest first (admin, analytics, rosters)
+            models.Index(fields=['role', 'date_joined'], name='users_role_joined_idx'),
+            # Admin's default -date_joined ordering
+            models.Index(fields=['date_joined'], name='users_date_joined_idx'),
+            # Admin email prefix search, case-insensitive (UPPER(email) LIKE
+            # 'ABC%'); PostgreSQL only, see migration 0004
+            models.Index(OpClass(Upper('email'), name='text_pattern_ops'), name='users_email_prefix_idx'),
+        ]
     
     def __str__(self):
         return f"{self.name} ({self.email})"
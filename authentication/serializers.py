@@ -5,6 +5,7 @@ from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
 from rest_framework.validators import UniqueValidator
+from . import hashing
 import re
 
 User = get_user_model()
@@ -90,12 +91,14 @@ class RegisterSerializer(serializers.ModelSerializer):
         # Remove confirm_password as it's not needed
         validated_data.pop('confirm_password')
         
-        user = User.objects.create_user(
-            email=validated_data['email'],
+        # Hash on the bounded executor, then save the already-hashed password
+        user = User(
+            email=User.objects.normalize_email(validated_data['email']),
             name=validated_data['name'],
-            password=validated_data['password'],
-            role=validated_data.get('role', 'student')
+            role=validated_data.get('role', 'student'),
+            password=hashing.make_password(validated_data['password'])
         )
+        user.save()
         return user
 
 
@@ -0,0 +1,20 @@
+"""
+Signal handlers for authentication models
+"""
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .authentication import revoke_user_state
+from .models import User
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, created, update_fields=None, **kwargs):
+    """Re-check cached account state after deactivation, role or password changes"""
+    if created or (update_fields is not None and set(update_fields) <= {'last_login'}):
+        return
+    revoke_user_state(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    revoke_user_state(instance.pk)
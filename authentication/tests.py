@@ -1,3 +1,209 @@
-from django.test import TestCase
+"""
+Tests for authentication API
+"""
+from unittest.mock import patch
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+from .authentication import user_states
+from .hashing import HashingBusy, HashingExecutor
+from .models import User
+from .views import get_tokens_for_user
+import threading
+import time
 
-# Create your tests here.
+
+class ClaimsAuthenticationTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        user_states.clear()
+        self.user = User.objects.create_user(
+            email='student@example.com', name='Student', password='Passw0rd!'
+        )
+        self.token = get_tokens_for_user(self.user)['access']
+
+    def verify(self, token=None):
+        return self.client.get(
+            reverse('authentication:verify'),
+            HTTP_AUTHORIZATION=f"Bearer {token or self.token}"
+        )
+
+    def test_verify_without_user_lookup(self):
+        self.verify()
+
+        with self.assertNumQueries(0):
+            response = self.verify()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['user'], {
+            'id': str(self.user.id), 'email': 'student@example.com', 'name': 'Student', 'role': 'student'
+        })
+
+    def test_deactivated_user_rejected(self):
+        self.verify()
+
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertEqual(self.verify().status_code, 401)
+
+    def test_role_change_applies_to_existing_token(self):
+        self.verify()
+
+        self.user.role = 'teacher'
+        self.user.save()
+
+        self.assertEqual(self.verify().json()['user']['role'], 'teacher')
+
+    def test_token_without_claims_falls_back_to_database(self):
+        legacy_token = str(RefreshToken.for_user(self.user).access_token)
+
+        with self.assertNumQueries(1):
+            response = self.verify(legacy_token)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['user']['id'], str(self.user.id))
+
+    def test_login_tokens_carry_claims(self):
+        response = self.client.post(reverse('authentication:login'), {
+            'email': 'student@example.com', 'password': 'Passw0rd!'
+        }, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.verify(response.json()['token']).status_code, 200)
+
+
+class AsyncAuthenticationTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        user_states.clear()
+        self.user = User.objects.create_user(
+            email='student@example.com', name='Student', password='Passw0rd!'
+        )
+
+    async def test_async_login_and_verify(self):
+        response = await self.async_client.post(
+            reverse('authentication:async-login'),
+            {'email': 'student@example.com', 'password': 'Passw0rd!'},
+            content_type='application/json'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        token = response.json()['token']
+
+        response = await self.async_client.get(
+            reverse('authentication:async-verify'),
+            headers={'Authorization': f"Bearer {token}"}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['user']['email'], 'student@example.com')
+
+    async def test_async_login_rejects_bad_password(self):
+        response = await self.async_client.post(
+            reverse('authentication:async-login'),
+            {'email': 'student@example.com', 'password': 'wrong'},
+            content_type='application/json'
+        )
+
+        self.assertEqual(response.status_code, 401)
+
+
+class HashingExecutorTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        user_states.clear()
+        self.user = User.objects.create_user(
+            email='student@example.com', name='Student', password='Passw0rd!'
+        )
+
+    def login(self, password='Passw0rd!'):
+        return self.client.post(reverse('authentication:login'), {
+            'email': 'student@example.com', 'password': password
+        }, format='json')
+
+    def test_login_and_register_hash_on_executor(self):
+        executor = HashingExecutor(max_workers=1)
+        with patch('authentication.hashing.get_executor', return_value=executor):
+            self.assertEqual(self.login().status_code, 200)
+            self.assertEqual(self.login('Wrong0ne!').status_code, 401)
+            response = self.client.post(reverse('authentication:register'), {
+                'name': 'New Student', 'email': 'New@Example.com',
+                'password': 'Passw0rd!', 'confirm_password': 'Passw0rd!'
+            }, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(User.objects.get(email='new@example.com').check_password('Passw0rd!'))
+        self.assertEqual(executor.stats()['completed'], 3)
+
+    def test_saturated_executor_returns_503(self):
+        executor = HashingExecutor(max_workers=1, max_pending=0, max_queue_wait=2.5)
+        with patch('authentication.hashing.get_executor', return_value=executor):
+            response = self.login()
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '3')
+        self.assertEqual(executor.stats()['rejected'], 1)
+
+    def test_busy_hash_upgrade_keeps_login(self):
+        encoded = self.user.password
+        with patch('authentication.hashing._verify', return_value=(True, True)), \
+                patch('authentication.hashing.make_password', side_effect=HashingBusy(1)):
+            response = self.login()
+
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.password, encoded)
+
+    def test_hash_expires_in_queue(self):
+        executor = HashingExecutor(max_workers=1, max_queue_wait=0.05)
+        release = threading.Event()
+        blocker = executor.submit(release.wait)
+        queued = executor.submit(lambda: 'hashed')
+        time.sleep(0.1)
+        release.set()
+
+        blocker.result()
+        with self.assertRaises(HashingBusy):
+            queued.result()
+        self.assertEqual(executor.stats()['expired_in_queue'], 1)
+
+
+class UserAdminTests(APITestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(email='admin@example.com', name='Admin', password='Passw0rd!')
+        User.objects.bulk_create([
+            User(email=f'student{number}@example.com', name=f'Student {number}') for number in range(30)
+        ])
+        self.client.force_login(self.admin)
+        self.url = reverse('admin:authentication_user_changelist')
+
+    def test_query_budget(self):
+        # Session, user, statistics check, count, page; not per row
+        with self.assertNumQueries(5):
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cl'].result_count, 31)
+
+    def test_email_prefix_search(self):
+        response = self.client.get(self.url, {'q': 'Student2'})
+
+        emails = {user.email for user in response.context['cl'].result_list}
+        self.assertEqual(emails, {'student2@example.com'} | {f'student2{n}@example.com' for n in range(10)})
+        # A prefix search, not a substring one
+        self.assertEqual(self.client.get(self.url, {'q': 'example.com'}).context['cl'].result_count, 0)
+
+    def test_search_keeps_case_and_name(self):
+        # normalize_email() lowercases the domain only
+        user = User.objects.create_user(email='Mixed.Case@Example.COM', name='Grace Hopper')
+
+        for term in ('Mixed.Case', 'mixed.case', 'hopper'):
+            with self.subTest(term=term):
+                response = self.client.get(self.url, {'q': term})
+                self.assertEqual(list(response.context['cl'].result_list), [user])
@@ -5,7 +5,7 @@
 URL configuration for authentication app
 """
 from django.urls import path
-from . import views
+from . import views, async_views
 
 app_name = 'authentication'
 
@@ -14,6 +14,10 @@ urlpatterns = [
     path('login/', views.login_view, name='login'),
     path('verify/', views.verify_token_view, name='verify'),
     path('logout/', views.logout_view, name='logout'),
+    
+    # Native async variants for ASGI deployments
+    path('async/login/', async_views.login_view, name='async-login'),
+    path('async/verify/', async_views.verify_token_view, name='async-verify'),
 ]
 
 
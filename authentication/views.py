@@ -8,18 +8,36 @@ from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from django.contrib.auth import authenticate
 from rest_framework_simplejwt.tokens import RefreshToken
+from .hashing import HashingBusy
 from .serializers import RegisterSerializer, LoginSerializer, UserSerializer
 
 
 def get_tokens_for_user(user):
-    """Generate JWT tokens for user"""
+    """
+    Generate JWT tokens for user
+    Profile claims let ClaimsJWTAuthentication skip the users lookup
+    """
     refresh = RefreshToken.for_user(user)
+    refresh['email'] = user.email
+    refresh['name'] = user.name
+    refresh['role'] = user.role
+    refresh['is_staff'] = user.is_staff
     return {
         'refresh': str(refresh),
         'access': str(refresh.access_token),
     }
 
 
+def hashing_busy_response(error):
+    """503 telling the client when to retry a sign-in or registration"""
+    response = Response({
+        'success': False,
+        'message': str(error)
+    }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    response['Retry-After'] = str(error.retry_after)
+    return response
+
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def register_view(request):
@@ -45,6 +63,8 @@ def register_view(request):
                 'refresh': tokens['refresh']
             }, status=status.HTTP_201_CREATED)
             
+        except HashingBusy as e:
+            return hashing_busy_response(e)
         except Exception as e:
             return Response({
                 'success': False,
@@ -88,8 +108,11 @@ def login_view(request):
     email = serializer.validated_data['email']
     password = serializer.validated_data['password']
     
-    # Authenticate user
-    user = authenticate(request, username=email, password=password)
+    # Authenticate user (password check runs on the hashing executor)
+    try:
+        user = authenticate(request, username=email, password=password)
+    except HashingBusy as e:
+        return hashing_busy_response(e)
     
     if user is not None:
         if user.is_active:
@@ -0,0 +1,156 @@
+"""
+Admin changelists for large tables
+
+EstimatedCountPaginator answers an unfiltered changelist's count from the
+planner's statistics (pg_class.reltuples on PostgreSQL, sqlite_stat1 after
+ANALYZE on SQLite) once they put the table above
+ADMIN_ESTIMATED_COUNT_THRESHOLD rows, instead of a COUNT(*) over the whole
+table. Filtered and searched lists, and small tables, are counted exactly.
+With an estimate the last page numbers can be off by a page or two; the
+admin reports a page past the end as an invalid page.
+
+KeysetChangeList pages the default ordering by (ordering field, pk) with an
+?after= cursor instead of OFFSET, so a deep page costs what the first one
+does, and shows Next/First links instead of page numbers. It is used with
+ADMIN_KEYSET_PAGINATION; sorting by a column falls back to numbered pages.
+
+FastChangeListMixin puts both on a ModelAdmin and drops the second,
+unfiltered count the admin runs for "N results (M total)".
+"""
+from django.conf import settings
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.utils.functional import cached_property
+
+KEYSET_VAR = 'after'
+CURSOR_SEPARATOR = '~'
+
+
+def estimated_count(model, using):
+    """The planner's row count estimate for the model's table, None when it has none"""
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)',
+                [connection.ops.quote_name(table)]
+            )
+            row = cursor.fetchone()
+            # -1 until the table is first analyzed
+            return row[0] if row and row[0] >= 0 else None
+        if connection.vendor == 'sqlite':
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+            if cursor.fetchone() is None:
+                return None
+            # Each row's stat starts with the number of rows in the table
+            cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [table])
+            row = cursor.fetchone()
+            return int(row[0].split()[0]) if row else None
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that counts big unfiltered tables from planner statistics"""
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if isinstance(queryset, QuerySet) and not queryset.query.where:
+            estimate = estimated_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > settings.ADMIN_ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+        return super().count
+
+
+class KeysetChangeList(ChangeList):
+    """ChangeList that pages the default ordering by cursor when the admin allows it"""
+
+    def __init__(self, request, *args, **kwargs):
+        self.keyset_after = request.GET.get(KEYSET_VAR)
+        # {'next_url', 'first_url'} while paging by cursor, for the template
+        self.keyset = None
+        super().__init__(request, *args, **kwargs)
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(KEYSET_VAR, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # Sorting, filtering and searching start again from the first page
+        return super().get_query_string(new_params, [*(remove or []), KEYSET_VAR])
+
+    def _keyset_field(self, request):
+        """(field name, descending) to page by, or None for numbered pages"""
+        if not self.model_admin.keyset_pagination or ORDER_VAR in self.params or self.list_editable:
+            return None
+        ordering = self.model_admin.get_ordering(request)
+        if not ordering:
+            return None
+        return ordering[0].lstrip('-'), ordering[0].startswith('-')
+
+    def _parse_cursor(self, name):
+        value, separator, pk = self.keyset_after.rpartition(CURSOR_SEPARATOR)
+        if not separator:
+            raise IncorrectLookupParameters
+        try:
+            return self.opts.get_field(name).to_python(value), self.opts.pk.to_python(pk)
+        except ValidationError:
+            raise IncorrectLookupParameters
+
+    def get_results(self, request):
+        keyset_field = self._keyset_field(request)
+        if keyset_field is None:
+            return super().get_results(request)
+        name, descending = keyset_field
+
+        sign, after, bound = ('-', 'lt', 'lte') if descending else ('', 'gt', 'gte')
+        queryset = self.queryset.order_by(f'{sign}{name}', f'{sign}pk')
+        if self.keyset_after:
+            value, pk = self._parse_cursor(name)
+            # The plain range lets the index seek to the cursor; the OR alone would not
+            queryset = queryset.filter(
+                Q(**{f'{name}__{bound}': value}),
+                Q(**{f'{name}__{after}': value}) | Q(**{f'pk__{after}': pk}),
+            )
+        rows = list(queryset[:self.list_per_page + 1])
+
+        paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        self.result_count = paginator.count
+        self.show_full_result_count = False
+        self.full_result_count = None
+        self.show_admin_actions = True
+        self.result_list = rows[:self.list_per_page]
+        self.can_show_all = False
+        self.multi_page = len(rows) > self.list_per_page or bool(self.keyset_after)
+        self.paginator = paginator
+
+        self.keyset = {'next_url': None, 'first_url': self.get_query_string() if self.keyset_after else None}
+        if len(rows) > self.list_per_page:
+            last = self.result_list[-1]
+            value = getattr(last, name)
+            cursor = f'{value.isoformat() if hasattr(value, "isoformat") else value}{CURSOR_SEPARATOR}{last.pk}'
+            self.keyset['next_url'] = self.get_query_string({KEYSET_VAR: cursor})
+
+
+class FastChangeListMixin:
+    """
+    ModelAdmin mixin for tables too big to count or OFFSET through
+
+    Lists with an estimated count and no "(M total)"; with
+    ADMIN_KEYSET_PAGINATION, by cursor.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    @property
+    def keyset_pagination(self):
+        return settings.ADMIN_KEYSET_PAGINATION
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
@@ -1,8 +1,30 @@
 """
 ASGI config for backend project.
+
+Serves the native async views (/api/auth/async/..., /api/progress/async/...)
+and the live progress stream (/api/progress/live/) without tying up a worker
+per request or open stream, e.g.:
+    uvicorn backend.asgi:application --workers 4
+    gunicorn backend.asgi:application -k uvicorn.workers.UvicornWorker
+
+Django runs each request in its own ThreadSensitiveContext, whose sync thread
+(used by sync-only middleware and by the async ORM and cache) lives until the
+response ends. For a live stream that would be one idle thread per open
+connection, so the stream path is handled without one; its little sync work
+at connect time runs on asgiref's shared sync thread instead.
 """
 import os
 from django.core.asgi import get_asgi_application
+from django.urls import reverse
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
-application = get_asgi_application()
\ No newline at end of file
+django_application = get_asgi_application()
+
+LIVE_STREAM_PATH = reverse('progress:live')
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'] == LIVE_STREAM_PATH:
+        await django_application.handle(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -0,0 +1,282 @@
+"""
+Request instrumentation
+
+RequestMetricsMiddleware times every request and records, per view, the
+wall time, number of database queries and time spent in them, template/DRF
+rendering time and response size. Requests by staff get a Server-Timing
+header (visible in the browser's network panel); it isn't sent to anyone
+else, as it tells a client how long its request spent in the database. The
+numbers are aggregated into histograms served in Prometheus text format by
+metrics_view.
+
+Queries are counted by an execute wrapper installed once on every database
+connection, which adds to the stats of the request in the current context
+(a ContextVar, so queries run by async views through sync_to_async are
+counted too). Outside a request the wrapper only does a ContextVar lookup.
+
+Metrics are per process: with several gunicorn workers each scrape sees the
+worker that answered it, so scrape every worker (or sum over instances).
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from bisect import bisect_left
+from contextvars import ContextVar
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseForbidden
+from secrets import compare_digest
+import threading
+import time
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+RENDER_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+# name -> (help, buckets)
+HISTOGRAMS = {
+    'http_request_duration_seconds': ('Wall time per request', LATENCY_BUCKETS),
+    'http_request_db_queries': ('Database queries per request', QUERY_BUCKETS),
+    'http_request_db_duration_seconds': ('Time in database queries per request', DB_TIME_BUCKETS),
+    'http_response_render_seconds': ('Response rendering (serialization) time per request', RENDER_BUCKETS),
+    'http_response_size_bytes': ('Response body size', SIZE_BUCKETS),
+}
+
+UNMATCHED_VIEW = '<unmatched>'
+
+_current = ContextVar('request_stats', default=None)
+
+
+class RequestStats:
+    """Counters for the request being handled"""
+
+    __slots__ = ('queries', 'db_time', 'render_started', 'render_time')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.render_started = None
+        self.render_time = 0.0
+
+
+class Histogram:
+    """Per-bucket counts (made cumulative when rendered), a sum and a count"""
+
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self, size):
+        self.counts = [0] * (size + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, buckets, value):
+        self.counts[bisect_left(buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Per-process request histograms and counters"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            # name -> {labels: Histogram}
+            self._histograms = {name: {} for name in HISTOGRAMS}
+            # (view, method, status) -> count
+            self._requests = {}
+
+    def _observe(self, name, labels, value):
+        series = self._histograms[name]
+        histogram = series.get(labels)
+        if histogram is None:
+            histogram = series[labels] = Histogram(len(HISTOGRAMS[name][1]))
+        histogram.observe(HISTOGRAMS[name][1], value)
+
+    def observe_request(self, view, method, status, duration, stats, size):
+        view_labels = (('view', view),)
+        with self._lock:
+            key = (view, method, str(status))
+            self._requests[key] = self._requests.get(key, 0) + 1
+            self._observe('http_request_duration_seconds', view_labels + (('method', method),), duration)
+            self._observe('http_request_db_queries', view_labels, stats.queries)
+            self._observe('http_request_db_duration_seconds', view_labels, stats.db_time)
+            if stats.render_started is not None:
+                self._observe('http_response_render_seconds', view_labels, stats.render_time)
+            if size is not None:
+                self._observe('http_response_size_bytes', view_labels, size)
+
+    def render(self):
+        """Prometheus text exposition format 0.0.4"""
+        lines = [
+            '# HELP http_requests_total Requests handled, by view, method and status',
+            '# TYPE http_requests_total counter',
+        ]
+        with self._lock:
+            for (view, method, status), count in sorted(self._requests.items()):
+                lines.append(f"http_requests_total{_labels((('view', view), ('method', method), ('status', status)))} {count}")
+            for name, (help_text, buckets) in HISTOGRAMS.items():
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+                for labels, histogram in sorted(self._histograms[name].items()):
+                    cumulative = 0
+                    for bound, count in zip(buckets + (float('inf'),), histogram.counts):
+                        cumulative += count
+                        le = '+Inf' if bound == float('inf') else _number(bound)
+                        lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+                    lines.append(f"{name}_sum{_labels(labels)} {_number(histogram.sum)}")
+                    lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(pairs):
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+_registry = MetricsRegistry()
+
+
+def get_registry():
+    return _registry
+
+
+def _track_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.db_time += time.perf_counter() - started
+        stats.queries += 1
+
+
+def _wrap_connection(connection):
+    # connection_created fires again on every reconnect. Outermost, so that
+    # connection.execute_wrapper() blocks, which pop the last wrapper on
+    # exit, never remove this one.
+    if _track_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _track_query)
+
+
+@receiver(connection_created, dispatch_uid='instrumentation.track_queries')
+def _on_connection_created(sender, connection, **kwargs):
+    _wrap_connection(connection)
+
+
+def install_query_tracking():
+    """Wrap this thread's connections opened before this module was imported"""
+    for connection in connections.all(initialized_only=True):
+        _wrap_connection(connection)
+
+
+def _server_timing(duration, stats):
+    entries = [
+        f'app;dur={duration * 1000:.1f}',
+        f'db;desc="{stats.queries} queries";dur={stats.db_time * 1000:.1f}',
+    ]
+    if stats.render_started is not None:
+        entries.append(f'render;dur={stats.render_time * 1000:.1f}')
+    return ', '.join(entries)
+
+
+def _is_staff(request):
+    # By the time the response is back DRF and jwt_required have replaced
+    # the session user with the one the request authenticated as
+    user = getattr(request, 'user', None)
+    return user is not None and user.is_staff
+
+
+class RequestMetricsMiddleware:
+    """
+    Records per-view timings into the registry and adds Server-Timing for staff
+
+    Place first in MIDDLEWARE so the timings cover the whole stack. Disabled
+    with REQUEST_METRICS=False. Streaming responses are timed up to their
+    first byte and have no size.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_METRICS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        install_query_tracking()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, stats, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, stats, time.perf_counter() - started)
+
+    def process_template_response(self, request, response):
+        # Called right before render(); the callback runs right after it
+        stats = _current.get()
+        if stats is not None:
+            stats.render_started = time.perf_counter()
+
+            def rendered(response):
+                stats.render_time = time.perf_counter() - stats.render_started
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    def finish(self, request, response, stats, duration):
+        match = request.resolver_match
+        view = match.view_name if match is not None else UNMATCHED_VIEW
+        size = None if response.streaming else len(response.content)
+        _registry.observe_request(view, request.method, response.status_code, duration, stats, size)
+        if settings.SERVER_TIMING_HEADER and _is_staff(request):
+            response['Server-Timing'] = _server_timing(duration, stats)
+        return response
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint
+
+    Requires "Authorization: Bearer <METRICS_TOKEN>" when METRICS_TOKEN is
+    set; without a token it is only served with DEBUG on.
+    """
+    token = settings.METRICS_TOKEN
+    if token:
+        # As bytes: compare_digest() rejects str with non-ASCII characters
+        if not compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode()):
+            return HttpResponseForbidden('Invalid metrics token')
+    elif not settings.DEBUG:
+        return HttpResponseForbidden('Set METRICS_TOKEN to enable metrics')
+    return HttpResponse(_registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
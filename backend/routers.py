@@ -0,0 +1,137 @@
+"""
+Read-replica routing
+
+Writes always go to the primary ('default'). Reads go to a replica only
+inside replica_reads() (or a view wrapped with reads_from_replica), which
+the dashboard sync, analytics and export views use; everything else,
+including the write path's reads, stays on the primary. So do cached
+dashboard payloads and the catalog snapshot, which are stamped with
+versions read from the primary (progress.caching, progress.catalog).
+
+A student who wrote progress in the last REPLICA_STICKY_SECONDS is kept on
+the primary (services.write_progress marks them on commit), so their own
+dashboard never lags behind what they just saved. The window must exceed
+the worst replication lag. Stickiness is kept in the cache, so it is shared
+across workers when the cache is.
+
+Replicas are the aliases in DATABASE_READ_REPLICAS; with none configured
+every read goes to the primary.
+
+migrate leaves replicas alone (they get the primary's schema by
+replicating it) and creates only video_progress on the PROGRESS_SHARDS
+aliases (progress.sharding).
+"""
+from asgiref.sync import iscoroutinefunction
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+import itertools
+
+STICKY_KEY = 'replica-sticky:{}'
+
+# Alias reads go to, None for the primary
+_read_alias = ContextVar('read_alias', default=None)
+
+_next_replica = itertools.count()
+
+
+def replicas_enabled():
+    return bool(settings.DATABASE_READ_REPLICAS)
+
+
+def choose_replica():
+    """Replicas in turn"""
+    replicas = settings.DATABASE_READ_REPLICAS
+    return replicas[next(_next_replica) % len(replicas)]
+
+
+def mark_recent_write(student_ids):
+    """Keep these students' reads on the primary for REPLICA_STICKY_SECONDS"""
+    if replicas_enabled() and student_ids:
+        cache.set_many({STICKY_KEY.format(student_id): 1 for student_id in student_ids}, settings.REPLICA_STICKY_SECONDS)
+
+
+def is_sticky(student_id):
+    return cache.get(STICKY_KEY.format(student_id)) is not None
+
+
+async def ais_sticky(student_id):
+    return await cache.aget(STICKY_KEY.format(student_id)) is not None
+
+
+def _read_alias_for(sticky):
+    return None if sticky or not replicas_enabled() else choose_replica()
+
+
+def read_alias(student_id=None):
+    """
+    The alias replica_reads() would route to, for querysets evaluated after
+    the block ends (streaming responses) to pass to .using()
+    """
+    sticky = student_id is not None and replicas_enabled() and is_sticky(student_id)
+    return _read_alias_for(sticky) or DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def _reading_from(alias):
+    token = _read_alias.set(alias)
+    try:
+        yield alias or DEFAULT_DB_ALIAS
+    finally:
+        _read_alias.reset(token)
+
+
+def replica_reads(student_id=None):
+    """
+    Route reads in this block to a replica, unless `student_id` wrote
+    recently; yields the alias chosen
+    """
+    alias = read_alias(student_id)
+    return _reading_from(None if alias == DEFAULT_DB_ALIAS else alias)
+
+
+def primary_reads():
+    """Route reads in this block to the primary, e.g. right after writing"""
+    return _reading_from(None)
+
+
+def reads_from_replica(view):
+    """replica_reads() around a view, sticky on the requesting user; sync or async"""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            user_id = getattr(request.user, 'id', None)
+            sticky = user_id is not None and replicas_enabled() and await ais_sticky(user_id)
+            with _reading_from(_read_alias_for(sticky)):
+                return await view(request, *args, **kwargs)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with replica_reads(getattr(request.user, 'id', None)):
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaRouter:
+    """Primary for writes; the replica chosen by replica_reads() for reads in it"""
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_READ_REPLICAS:
+            return False
+        if db in settings.PROGRESS_SHARDS:
+            return app_label == 'progress' and model_name == 'videoprogress'
+        return None
@@ -4,6 +4,7 @@ Updated for 'backend' project name
 Fixed for Railway deployment and local development
 """
 import os
+import tempfile
 from pathlib import Path
 from decouple import config
 import dj_database_url
@@ -43,6 +44,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'backend.instrumentation.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -50,6 +52,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'progress.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -73,6 +76,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'backend.wsgi.application'
+ASGI_APPLICATION = 'backend.asgi.application'
 
 # Database Configuration
 # Use PostgreSQL on Railway, SQLite for local development
@@ -93,8 +97,158 @@ else:
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
-        }
+            'OPTIONS': {
+                # Take the write lock at BEGIN so concurrent writers queue
+                # on the busy timeout instead of failing with "database is locked"
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': 20,
+            },
+        },
+        # A second local database for exercising the replica router (the
+        # routing tests use it); only read from when listed in
+        # DATABASE_READ_REPLICAS
+        'replica': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db-replica.sqlite3',
+            'OPTIONS': {
+                'timeout': 20,
+            },
+        },
+        # Two local VideoProgress shards for the sharding tests; only used
+        # when listed in PROGRESS_SHARDS
+        **{
+            alias: {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': BASE_DIR / f'db-{alias}.sqlite3',
+                'OPTIONS': {
+                    'transaction_mode': 'IMMEDIATE',
+                    'timeout': 20,
+                },
+            }
+            for alias in ('shard1', 'shard2')
+        },
+    }
+
+# Read replicas: comma-separated database URLs, added as aliases
+# replica1..N. Dashboard sync, analytics and export reads go to them
+# (backend.routers); tests read the primary through them.
+DATABASE_REPLICA_URLS = [url.strip() for url in config('DATABASE_REPLICA_URLS', default='').split(',') if url.strip()]
+DATABASE_READ_REPLICAS = []
+for number, replica_url in enumerate(DATABASE_REPLICA_URLS, start=1):
+    alias = f'replica{number}'
+    DATABASES[alias] = dj_database_url.parse(replica_url, conn_max_age=600, conn_health_checks=True)
+    DATABASES[alias]['TEST'] = {'MIRROR': 'default'}
+    DATABASE_READ_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['backend.routers.ReplicaRouter']
+
+# After writing progress a student reads from the primary for this many
+# seconds; keep it above the worst replication lag
+REPLICA_STICKY_SECONDS = config('REPLICA_STICKY_SECONDS', default=10, cast=int)
+
+# Hash-sharded VideoProgress (progress.sharding): comma-separated database
+# URLs, added as aliases shard1..N. The order is part of the hash, so only
+# ever append; then run "migrate --database shardN" and reshard_progress.
+PROGRESS_SHARD_URLS = [url.strip() for url in config('PROGRESS_SHARD_URLS', default='').split(',') if url.strip()]
+PROGRESS_SHARDS = []
+for number, shard_url in enumerate(PROGRESS_SHARD_URLS, start=1):
+    alias = f'shard{number}'
+    DATABASES[alias] = dj_database_url.parse(shard_url, conn_max_age=600, conn_health_checks=True)
+    PROGRESS_SHARDS.append(alias)
+
+# Admin changelists (backend.admin_pagination): unfiltered lists of tables
+# estimated above this many rows show the estimate instead of a COUNT(*)
+ADMIN_ESTIMATED_COUNT_THRESHOLD = config('ADMIN_ESTIMATED_COUNT_THRESHOLD', default=100000, cast=int)
+# Page the VideoProgress and User changelists by cursor instead of OFFSET
+ADMIN_KEYSET_PAGINATION = config('ADMIN_KEYSET_PAGINATION', default=False, cast=bool)
+
+# Cache Configuration
+# Must be shared by every worker process: dashboard progress versions (and
+# so the dashboard ETags) and replica stickiness live in it, and a worker
+# that misses another's bump keeps serving the old payload. The default
+# FileBasedCache is shared by the workers of one host; use a networked
+# backend (Redis, Memcached) across hosts. LocMemCache is per-process, so
+# only safe with a single worker.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': config('CACHE_LOCATION', default=os.path.join(tempfile.gettempdir(), 'backend-cache')),
+        'OPTIONS': {
+            'MAX_ENTRIES': config('CACHE_MAX_ENTRIES', default=100000, cast=int),
+        },
     }
+}
+
+# Dashboard cache: hard expiry and how long a payload counts as fresh before
+# it is served stale and rebuilt in the background
+DASHBOARD_CACHE_TIMEOUT = config('DASHBOARD_CACHE_TIMEOUT', default=86400, cast=int)
+DASHBOARD_CACHE_FRESH_FOR = config('DASHBOARD_CACHE_FRESH_FOR', default=300, cast=int)
+
+# Dashboard delta sync cursors trail each read by this many seconds; keep it
+# above the longest progress write transaction and the clock skew between
+# workers, or a late commit can be skipped
+DASHBOARD_SYNC_SETTLE_SECONDS = config('DASHBOARD_SYNC_SETTLE_SECONDS', default=5, cast=int)
+
+# When True, progress writes never lower a stored videos_watched, so
+# out-of-order player heartbeats can't move progress backwards. Requests can
+# override it with "monotonic": true/false.
+PROGRESS_MONOTONIC_UPDATES = config('PROGRESS_MONOTONIC_UPDATES', default=False, cast=bool)
+
+# Write-behind mode: buffer progress updates per worker and flush them in bulk
+# every INTERVAL seconds, at FLUSH_AT pending keys and at worker exit
+PROGRESS_WRITE_BEHIND = config('PROGRESS_WRITE_BEHIND', default=False, cast=bool)
+PROGRESS_WRITE_BEHIND_INTERVAL = config('PROGRESS_WRITE_BEHIND_INTERVAL', default=2.0, cast=float)
+PROGRESS_WRITE_BEHIND_FLUSH_AT = config('PROGRESS_WRITE_BEHIND_FLUSH_AT', default=500, cast=int)
+PROGRESS_WRITE_BEHIND_MAX_PENDING = config('PROGRESS_WRITE_BEHIND_MAX_PENDING', default=10000, cast=int)
+
+# Append-only progress event log, compacted daily into per-day totals; raw
+# events older than RETENTION_DAYS are pruned by compact_progress_events
+PROGRESS_EVENT_LOG = config('PROGRESS_EVENT_LOG', default=True, cast=bool)
+PROGRESS_EVENT_RETENTION_DAYS = config('PROGRESS_EVENT_RETENTION_DAYS', default=30, cast=int)
+
+# Per-view request metrics (wall time, DB queries/time, render time, response
+# size) served at /metrics/ in Prometheus format; METRICS_TOKEN is required
+# as a Bearer token there (without one the endpoint only works with DEBUG).
+# SERVER_TIMING_HEADER adds those timings to responses to staff users.
+REQUEST_METRICS = config('REQUEST_METRICS', default=True, cast=bool)
+SERVER_TIMING_HEADER = config('SERVER_TIMING_HEADER', default=True, cast=bool)
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# Staff can profile a request with "X-Profile: cprofile" or "X-Profile: sample"
+# (or ?_profile=...); profiles are downloadable from the admin. A
+# PROFILE_SAMPLE_RATE above 0 also samples that fraction of all requests,
+# keeping the PROFILE_KEEP_SLOWEST slowest per view
+REQUEST_PROFILING = config('REQUEST_PROFILING', default=True, cast=bool)
+PROFILE_SAMPLE_RATE = config('PROFILE_SAMPLE_RATE', default=0.0, cast=float)
+PROFILE_KEEP_SLOWEST = config('PROFILE_KEEP_SLOWEST', default=5, cast=int)
+PROFILE_SAMPLE_INTERVAL = config('PROFILE_SAMPLE_INTERVAL', default=0.005, cast=float)
+
+# Teacher analytics summaries older than this many seconds are refreshed in
+# the background on read (also schedule refresh_progress_summaries)
+ANALYTICS_REFRESH_INTERVAL = config('ANALYTICS_REFRESH_INTERVAL', default=900, cast=int)
+
+# Leaderboards: seconds between syncs of changed rollups into each worker's
+# rankings, and between full rebuilds
+LEADERBOARD_SYNC_INTERVAL = config('LEADERBOARD_SYNC_INTERVAL', default=1.0, cast=float)
+LEADERBOARD_REBUILD_INTERVAL = config('LEADERBOARD_REBUILD_INTERVAL', default=600.0, cast=float)
+
+# Live progress updates (progress.live, /api/progress/live/ under ASGI).
+# LIVE_FANOUT_BACKEND carries them between worker processes; the default
+# only reaches streams in the writing process. Per stream: at most
+# QUEUE_SIZE undelivered events before the client is told to resync, a
+# heartbeat (and account re-check) every HEARTBEAT_SECONDS, and at most
+# MAX_STREAM_SECONDS open however long the token lasts; at most MAX_STREAMS
+# per worker
+LIVE_UPDATES = config('LIVE_UPDATES', default=True, cast=bool)
+LIVE_FANOUT_BACKEND = config('LIVE_FANOUT_BACKEND', default='progress.live.LocalFanout')
+LIVE_STREAM_QUEUE_SIZE = config('LIVE_STREAM_QUEUE_SIZE', default=100, cast=int)
+LIVE_HEARTBEAT_SECONDS = config('LIVE_HEARTBEAT_SECONDS', default=15.0, cast=float)
+LIVE_RETRY_MS = config('LIVE_RETRY_MS', default=3000, cast=int)
+LIVE_MAX_STREAMS = config('LIVE_MAX_STREAMS', default=5000, cast=int)
+LIVE_MAX_STREAM_SECONDS = config('LIVE_MAX_STREAM_SECONDS', default=3600, cast=int)
+
+# Seconds between catalog generation checks in each worker
+CATALOG_CHECK_INTERVAL = config('CATALOG_CHECK_INTERVAL', default=2.0, cast=float)
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -121,10 +275,19 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Custom User Model
 AUTH_USER_MODEL = 'authentication.User'
 
+AUTHENTICATION_BACKENDS = ['authentication.backends.HashingModelBackend']
+
+# Password hashing executor: threads hashing concurrently (0 = inline), how
+# many hashes may be queued or running, and how long one may wait in the queue
+# before the request gets 503 + Retry-After
+AUTH_HASHING_WORKERS = config('AUTH_HASHING_WORKERS', default=2, cast=int)
+AUTH_HASHING_MAX_PENDING = config('AUTH_HASHING_MAX_PENDING', default=64, cast=int)
+AUTH_HASHING_MAX_QUEUE_WAIT = config('AUTH_HASHING_MAX_QUEUE_WAIT', default=2.0, cast=float)
+
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'authentication.authentication.ClaimsJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -146,6 +309,11 @@ SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
 
+# Claims-based JWT auth: how long a worker trusts its cached account state
+# (active, role) before re-reading it, and how many users it keeps
+AUTH_USER_STATE_TTL = config('AUTH_USER_STATE_TTL', default=30.0, cast=float)
+AUTH_USER_STATE_MAX_ENTRIES = config('AUTH_USER_STATE_MAX_ENTRIES', default=10000, cast=int)
+
 # CORS settings - Allow all origins for development
 CORS_ALLOW_ALL_ORIGINS = True
 
@@ -7,6 +7,7 @@ Main URL configuration for the project
 from django.contrib import admin
 from django.urls import path, include
 from django.http import JsonResponse
+from .instrumentation import metrics_view
 
 def api_root(request):
     """Root API endpoint"""
@@ -26,4 +27,5 @@ urlpatterns = [
     path('api/', api_root, name='api-root'),
     path('api/auth/', include('authentication.urls')),
     path('api/progress/', include('progress.urls')),
+    path('metrics/', metrics_view, name='metrics'),
 ]
\ No newline at end of file
@@ -2,7 +2,14 @@
 Django Admin Configuration for Progress
 """
 from django.contrib import admin
-from .models import Subject, Chapter, VideoProgress
+from django.db.models import Case, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Round
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html
+from backend.admin_pagination import FastChangeListMixin
+from .models import Subject, Chapter, VideoProgress, RequestProfile
 
 
 @admin.register(Subject)
@@ -23,16 +30,81 @@ class ChapterAdmin(admin.ModelAdmin):
 
 
 @admin.register(VideoProgress)
-class VideoProgressAdmin(admin.ModelAdmin):
+class VideoProgressAdmin(FastChangeListMixin, admin.ModelAdmin):
     list_display = ['student', 'chapter', 'videos_watched', 'get_total_videos', 'percentage', 'last_watched_at']
     list_filter = ['chapter__subject', 'last_watched_at']
-    search_fields = ['student__name', 'student__email', 'chapter__title']
+    # No joins in the page query: with statistics a planner may start from
+    # users and sort the whole table. The page's students, chapters and
+    # subjects (User.__str__ and Chapter.__str__ need them) are fetched in
+    # one query each instead, see get_queryset().
+    list_select_related = ()
+    # The email prefix match can use users_email_prefix_idx on PostgreSQL
+    search_fields = ['student__email__istartswith', 'student__name', 'chapter__title']
+    search_help_text = 'Student email (or its beginning), student name or chapter title'
     readonly_fields = ['created_at', 'last_watched_at']
+    # Newest first, read in order from vp_last_watched_idx
+    ordering = ['-last_watched_at']
+    
+    def get_queryset(self, request):
+        total_videos = Subquery(Chapter.objects.filter(pk=OuterRef('chapter_id')).order_by().values('total_videos'))
+        return super().get_queryset(request).prefetch_related('student', 'chapter__subject').annotate(
+            total_videos=total_videos,
+            progress_percentage=Case(
+                When(total_videos__gt=0, then=Round(F('videos_watched') * 100.0 / F('total_videos'), 1)),
+                default=Value(0.0),
+            )
+        )
     
     def get_total_videos(self, obj):
-        return obj.chapter.total_videos
+        return obj.total_videos
     get_total_videos.short_description = 'Total Videos'
+    get_total_videos.admin_order_field = 'total_videos'
     
     def percentage(self, obj):
-        return f"{obj.percentage}%"
-    percentage.short_description = 'Progress'
\ No newline at end of file
+        return f"{obj.progress_percentage}%"
+    percentage.short_description = 'Progress'
+    percentage.admin_order_field = 'progress_percentage'
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ['created_at', 'method', 'path', 'view_name', 'status_code', 'duration_ms', 'mode', 'trigger', 'download_link']
+    list_filter = ['trigger', 'mode', 'view_name']
+    search_fields = ['path', 'view_name']
+    exclude = ['data']
+    readonly_fields = [
+        'created_at', 'method', 'path', 'query_string', 'view_name', 'status_code', 'duration_ms',
+        'mode', 'trigger', 'requested_by', 'download_link', 'summary'
+    ]
+    
+    def get_queryset(self, request):
+        # Profiles are listed without loading their data
+        return super().get_queryset(request).defer('data', 'summary')
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def get_urls(self):
+        return [
+            path(
+                '<path:object_id>/download/',
+                self.admin_site.admin_view(self.download_view),
+                name='progress_requestprofile_download'
+            ),
+        ] + super().get_urls()
+    
+    def download_view(self, request, object_id):
+        profile = get_object_or_404(RequestProfile, pk=object_id)
+        if not self.has_view_permission(request, profile):
+            return HttpResponse(status=403)
+        response = HttpResponse(bytes(profile.data), content_type='application/octet-stream')
+        response['Content-Disposition'] = f'attachment; filename="{profile.filename}"'
+        return response
+    
+    def download_link(self, obj):
+        url = reverse('admin:progress_requestprofile_download', args=[obj.pk])
+        return format_html('<a href="{}">{}</a>', url, obj.filename)
+    download_link.short_description = 'Download'
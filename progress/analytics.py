@@ -0,0 +1,228 @@
+"""
+Completion analytics for teachers
+
+Per-chapter and per-subject completion distributions over all active
+students, stored in ChapterCompletionSummary / SubjectCompletionSummary.
+refresh_summaries() rebuilds them from GROUP BY (item, videos_watched)
+counts, so its memory use depends on the catalog size rather than the number
+of students. Run it from cron with the refresh_progress_summaries command;
+reads also trigger a background refresh once summaries are older than
+ANALYTICS_REFRESH_INTERVAL seconds.
+"""
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.db.models import Count
+from django.utils import timezone
+from authentication.models import User
+from backend import routers
+from . import sharding
+from .catalog import get_catalog
+from .models import (
+    VideoProgress, StudentSubjectProgress, ChapterCompletionSummary, SubjectCompletionSummary
+)
+import logging
+
+logger = logging.getLogger(__name__)
+
+REFRESH_LOCK_KEY = 'progress:analytics-refresh'
+
+# Completion buckets by percentage; 0% is 'not_started' and 100% 'completed'
+BUCKETS = ('not_started', '0-25', '25-50', '50-75', '75-100', 'completed')
+
+SUMMARY_FIELDS = ['students', 'not_started', 'completed', 'mean_percentage', 'median_percentage', 'buckets', 'refreshed_at']
+
+_refresh_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='analytics-refresh')
+
+
+def _bucket(percentage):
+    if percentage <= 0:
+        return 'not_started'
+    if percentage >= 100:
+        return 'completed'
+    return BUCKETS[1 + int(percentage // 25)]
+
+
+def summarize(histogram, total_videos, students):
+    """
+    Distribution of completion percentages
+
+    histogram: {videos_watched: number of students} for videos_watched > 0;
+    the remaining students have not started.
+    """
+    counts = defaultdict(int)
+    for watched, count in histogram.items():
+        percentage = min(watched, total_videos) / total_videos * 100 if total_videos > 0 else 0.0
+        counts[percentage] += count
+    counts[0.0] += max(0, students - sum(histogram.values()))
+
+    buckets = dict.fromkeys(BUCKETS, 0)
+    weighted = 0.0
+    for percentage, count in counts.items():
+        buckets[_bucket(percentage)] += count
+        weighted += percentage * count
+
+    return {
+        'students': students,
+        'not_started': buckets['not_started'],
+        'completed': buckets['completed'],
+        'mean_percentage': round(weighted / students, 1) if students else 0.0,
+        'median_percentage': round(_median(counts, students), 1),
+        'buckets': buckets,
+    }
+
+
+def _median(counts, students):
+    if not students:
+        return 0.0
+    # Walk the sorted distinct values to the middle one (or two)
+    middle = ((students - 1) // 2, students // 2)
+    found = []
+    seen = 0
+    for percentage in sorted(counts):
+        seen += counts[percentage]
+        while len(found) < 2 and seen > middle[len(found)]:
+            found.append(percentage)
+    return sum(found) / 2
+
+
+def _histograms(queryset, key, histograms=None):
+    histograms = defaultdict(dict) if histograms is None else histograms
+    rows = (
+        queryset
+        .filter(videos_watched__gt=0)
+        .values_list(key, 'videos_watched')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    for item_id, watched, count in rows.iterator():
+        histograms[item_id][watched] = histograms[item_id].get(watched, 0) + count
+    return histograms
+
+
+def _active_students(queryset):
+    return queryset.filter(student__role='student', student__is_active=True)
+
+
+def _chapter_histograms():
+    if not sharding.enabled():
+        return _histograms(_active_students(VideoProgress.objects.all()), 'chapter_id')
+    # Shards can't join users, so leave out the (few) teachers and inactive
+    # accounts by id and add up the shards' counts
+    others = list(User.objects.exclude(role='student', is_active=True).values_list('id', flat=True))
+    histograms = defaultdict(dict)
+    for alias in settings.PROGRESS_SHARDS:
+        _histograms(VideoProgress.objects.using(alias).exclude(student_id__in=others), 'chapter_id', histograms)
+    return histograms
+
+
+def refresh_summaries():
+    """Recompute every chapter and subject summary; returns the refresh time"""
+    catalog = get_catalog(force_check=True)
+    students = User.objects.filter(role='student', is_active=True).count()
+    chapter_histograms = _chapter_histograms()
+    subject_histograms = _histograms(_active_students(StudentSubjectProgress.objects.all()), 'subject_id')
+    refreshed_at = timezone.now()
+
+    chapter_summaries = []
+    subject_summaries = []
+    for subject in catalog.subjects:
+        subject_summaries.append(SubjectCompletionSummary(
+            subject_id=subject.id,
+            refreshed_at=refreshed_at,
+            **summarize(subject_histograms.get(subject.id, {}), subject.total_videos, students)
+        ))
+        for chapter in subject.chapters:
+            chapter_summaries.append(ChapterCompletionSummary(
+                chapter_id=chapter.id,
+                refreshed_at=refreshed_at,
+                **summarize(chapter_histograms.get(chapter.id, {}), chapter.total_videos, students)
+            ))
+
+    with transaction.atomic():
+        ChapterCompletionSummary.objects.bulk_create(
+            chapter_summaries, update_conflicts=True, unique_fields=['chapter'], update_fields=SUMMARY_FIELDS
+        )
+        SubjectCompletionSummary.objects.bulk_create(
+            subject_summaries, update_conflicts=True, unique_fields=['subject'], update_fields=SUMMARY_FIELDS
+        )
+    return refreshed_at
+
+
+def _refresh_in_background():
+    try:
+        refresh_summaries()
+    except Exception as e:
+        logger.error(f"Analytics refresh error: {str(e)}", exc_info=True)
+    finally:
+        cache.delete(REFRESH_LOCK_KEY)
+        close_old_connections()
+
+
+def _schedule_refresh():
+    # One background refresh at a time across workers
+    if cache.add(REFRESH_LOCK_KEY, 1, 300):
+        _refresh_executor.submit(_refresh_in_background)
+
+
+def _summary_data(summary):
+    if summary is None:
+        return None
+    return {
+        'students': summary.students,
+        'not_started': summary.not_started,
+        'completed': summary.completed,
+        'mean_percentage': summary.mean_percentage,
+        'median_percentage': summary.median_percentage,
+        'buckets': summary.buckets,
+    }
+
+
+def get_class_analytics():
+    """
+    Completion analytics payload, served from the stored summaries
+
+    Refreshes synchronously only when no summary exists yet.
+    """
+    catalog = get_catalog()
+    chapter_summaries = {summary.chapter_id: summary for summary in ChapterCompletionSummary.objects.all()}
+    subject_summaries = {summary.subject_id: summary for summary in SubjectCompletionSummary.objects.all()}
+
+    if not subject_summaries and catalog.subjects:
+        refresh_summaries()
+        # A replica may not have the new summaries yet
+        with routers.primary_reads():
+            return get_class_analytics()
+
+    refreshed_at = min((summary.refreshed_at for summary in subject_summaries.values()), default=None)
+    if refreshed_at is not None and timezone.now() - refreshed_at > timedelta(seconds=settings.ANALYTICS_REFRESH_INTERVAL):
+        _schedule_refresh()
+
+    subjects_data = []
+    for subject in catalog.subjects:
+        subject_summary = subject_summaries.get(subject.id)
+        subjects_data.append({
+            'id': str(subject.id),
+            'subject': subject.display_name,
+            'color': subject.color,
+            'total_videos': subject.total_videos,
+            'summary': _summary_data(subject_summary),
+            'chapters': [
+                {
+                    'id': str(chapter.id),
+                    'title': chapter.title,
+                    'total_videos': chapter.total_videos,
+                    'summary': _summary_data(chapter_summaries.get(chapter.id)),
+                }
+                for chapter in subject.chapters
+            ]
+        })
+
+    return {
+        'refreshed_at': refreshed_at.isoformat() if refreshed_at else None,
+        'buckets': list(BUCKETS),
+        'subjects': subjects_data
+    }
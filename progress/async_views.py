@@ -0,0 +1,177 @@
+"""
+Async Progress and Dashboard Views
+
+Native async counterparts of views.dashboard_view and
+views.update_progress_view for running under backend.asgi. Cached dashboards
+and conditional GETs are served without leaving the event loop; dashboard
+builds use the async ORM, and progress writes (which need a transaction) run
+in a worker thread. live_view streams progress changes as server-sent events
+(progress.live).
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import quote_etag
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from authentication.async_views import jwt_required, parse_json
+from .caching import aget_dashboard, adashboard_etag
+from .catalog import aget_chapter
+from .services import save_progress
+from .views import monotonic_flag
+from . import live
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@require_GET
+@jwt_required
+async def dashboard_view(request):
+    """
+    Get Student Dashboard Data
+    Returns progress and chapters for all subjects
+    Supports If-None-Match: returns 304 before building the payload
+    """
+    try:
+        user = request.user
+
+        # Only students can access dashboard
+        if user.role != 'student':
+            return JsonResponse({
+                'success': False,
+                'message': 'Only students can access dashboard'
+            }, status=403)
+
+        etag, entry = await adashboard_etag(user)
+        etag = quote_etag(etag)
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+
+        response = JsonResponse({
+            'success': True,
+            'data': await aget_dashboard(user, entry)
+        })
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Authorization'])
+        return response
+
+    except Exception as e:
+        logger.error(f"Dashboard error: {str(e)}", exc_info=True)
+        return JsonResponse({
+            'success': False,
+            'message': 'Failed to fetch dashboard data',
+            'error': str(e)
+        }, status=500)
+
+
+@csrf_exempt
+@require_POST
+@jwt_required
+async def update_progress_view(request):
+    """
+    Update video progress for a chapter
+    Expects: { "chapter_id": "uuid", "videos_watched": number, "monotonic": bool (optional) }
+    """
+    try:
+        user = request.user
+        data = parse_json(request)
+        chapter_id = data.get('chapter_id')
+        videos_watched = data.get('videos_watched')
+
+        if not chapter_id or videos_watched is None:
+            return JsonResponse({
+                'success': False,
+                'message': 'chapter_id and videos_watched are required'
+            }, status=400)
+
+        try:
+            videos_watched = int(videos_watched)
+        except (TypeError, ValueError):
+            return JsonResponse({
+                'success': False,
+                'message': 'videos_watched must be a number'
+            }, status=400)
+
+        chapter = await aget_chapter(chapter_id)
+        if chapter is None:
+            return JsonResponse({
+                'success': False,
+                'message': 'Chapter not found'
+            }, status=404)
+
+        # The write path is transactional, so it runs in a worker thread
+        stored = await sync_to_async(save_progress)(user, {chapter: videos_watched}, monotonic_flag(data))
+        videos_watched = stored[chapter.id]
+
+        total_videos = chapter.total_videos
+        percentage = round((videos_watched / total_videos) * 100, 1) if total_videos > 0 else 0
+
+        return JsonResponse({
+            'success': True,
+            'message': 'Progress updated successfully',
+            'data': {
+                'chapter_id': str(chapter.id),
+                'videos_watched': videos_watched,
+                'total_videos': total_videos,
+                'percentage': percentage
+            }
+        })
+
+    except Exception as e:
+        logger.error(f"Update progress error: {str(e)}", exc_info=True)
+        return JsonResponse({
+            'success': False,
+            'message': 'Failed to update progress',
+            'error': str(e)
+        }, status=500)
+
+
+@require_GET
+@jwt_required
+async def live_view(request):
+    """
+    Stream progress changes as server-sent events (ASGI only)
+    Students get their own changes, teachers and staff every student's:
+    "progress" events carry {student_id, chapter_id, subject_id, videos_watched, total_videos, percentage};
+    a "resync" event means updates were dropped and the client should catch up
+    through /api/progress/dashboard/sync/. The stream ends when the token expires, after
+    LIVE_MAX_STREAM_SECONDS, or when the account is deactivated or changes role.
+    """
+    if not live.is_enabled():
+        return JsonResponse({
+            'success': False,
+            'message': 'Live updates are disabled'
+        }, status=404)
+
+    # Under WSGI the stream would be read to the end before anything is sent
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({
+            'success': False,
+            'message': 'Live updates are only served by the ASGI application'
+        }, status=501)
+
+    if live.get_broker().stream_count() >= settings.LIVE_MAX_STREAMS:
+        response = JsonResponse({
+            'success': False,
+            'message': 'Too many open streams, try again later'
+        }, status=503)
+        response['Retry-After'] = str(settings.LIVE_RETRY_MS // 1000 or 1)
+        return response
+
+    response = StreamingHttpResponse(
+        live.EventStream(
+            request.user,
+            until=request.auth['exp'],
+            resync='Last-Event-ID' in request.headers
+        ),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,206 @@
+"""
+Per-student dashboard cache
+
+Payloads are stored per student together with the progress version and
+catalog snapshot generation they were built from. A progress version change (the
+student wrote progress) forces a synchronous rebuild so students always see
+their own writes; a catalog change or an expired soft TTL serves the stale
+payload and rebuilds it in the background (stale-while-revalidate). ETags
+describe the payload that is served, so a stale one never goes out under
+the ETag of its replacement. There is no Last-Modified: HTTP dates have
+one-second resolution, so a write in the same second as the cached copy
+would still answer If-Modified-Since with a 304.
+
+Payloads are always built from the primary: one built on a lagging replica
+would be cached, and validated, under a progress version it doesn't reflect.
+"""
+from asgiref.sync import sync_to_async
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from backend.routers import primary_reads
+from .catalog import get_catalog, aget_catalog
+from .dashboard import build_dashboard, abuild_dashboard
+import hashlib
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_VERSION_KEY = 'progress:version:{}'
+DASHBOARD_KEY = 'progress:dashboard:{}'
+REFRESH_LOCK_KEY = 'progress:dashboard-refresh:{}'
+
+_refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='dashboard-refresh')
+
+
+def _get_version(key):
+    """Read a version counter, initialising it if missing or evicted"""
+    version = cache.get(key)
+    if version is None:
+        # Seed with the clock so an evicted counter never repeats an old value
+        version = time.time_ns()
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+async def _aget_version(key):
+    version = await cache.aget(key)
+    if version is None:
+        version = time.time_ns()
+        if not await cache.aadd(key, version, None):
+            version = await cache.aget(key, version)
+    return version
+
+
+def _bump(key):
+    cache.set(key, time.time_ns(), None)
+
+
+def _bump_now_and_on_commit(key):
+    # Bump immediately so the writer's next read misses, and again after
+    # commit so a rebuild racing the open transaction can't stick.
+    _bump(key)
+    transaction.on_commit(lambda: _bump(key))
+
+
+def get_progress_version(student_id):
+    return _get_version(PROGRESS_VERSION_KEY.format(student_id))
+
+
+async def aget_progress_version(student_id):
+    return await _aget_version(PROGRESS_VERSION_KEY.format(student_id))
+
+
+def bump_progress_version(student_id):
+    """Invalidate a student's cached dashboard"""
+    _bump_now_and_on_commit(PROGRESS_VERSION_KEY.format(student_id))
+
+
+def _etag(student_id, progress_version, catalog_generation):
+    key = f"{student_id}:{progress_version}:{catalog_generation}"
+    return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+
+def _entry(progress_version, catalog, data):
+    return {
+        'progress_version': progress_version,
+        'catalog_generation': catalog.generation,
+        'built_at': time.time(),
+        'data': data,
+    }
+
+
+def _is_current(entry, progress_version):
+    """Whether a cached entry can be served at all; otherwise it is rebuilt first"""
+    return entry is not None and entry['progress_version'] == progress_version
+
+
+def _is_fresh(entry, catalog):
+    return (
+        entry['catalog_generation'] == catalog.generation
+        and time.time() - entry['built_at'] < settings.DASHBOARD_CACHE_FRESH_FOR
+    )
+
+
+def _entry_etag(student_id, progress_version, entry, catalog):
+    # Without an entry the payload will be rebuilt from the current versions
+    generation = entry['catalog_generation'] if entry is not None else catalog.generation
+    return _etag(student_id, progress_version, generation)
+
+
+def refresh_dashboard(user):
+    """Rebuild and store a student's dashboard payload"""
+    progress_version = get_progress_version(user.id)
+    with primary_reads():
+        catalog = get_catalog()
+        data = build_dashboard(user, catalog)
+    cache.set(DASHBOARD_KEY.format(user.id), _entry(progress_version, catalog, data), settings.DASHBOARD_CACHE_TIMEOUT)
+    return data
+
+
+async def arefresh_dashboard(user):
+    progress_version = await aget_progress_version(user.id)
+    with primary_reads():
+        catalog = await aget_catalog()
+        data = await abuild_dashboard(user, catalog)
+    await cache.aset(DASHBOARD_KEY.format(user.id), _entry(progress_version, catalog, data), settings.DASHBOARD_CACHE_TIMEOUT)
+    return data
+
+
+def _refresh_in_background(user):
+    try:
+        refresh_dashboard(user)
+    except Exception as e:
+        logger.error(f"Dashboard refresh error: {str(e)}", exc_info=True)
+    finally:
+        cache.delete(REFRESH_LOCK_KEY.format(user.id))
+        close_old_connections()
+
+
+def _schedule_refresh(user):
+    # Only one background rebuild per student at a time
+    if cache.add(REFRESH_LOCK_KEY.format(user.id), 1, 30):
+        _refresh_executor.submit(_refresh_in_background, user)
+
+
+def _lookup(user):
+    """
+    (progress version, cached entry) for a student, the entry None when it
+    must be rebuilt first; queues the rebuild of a stale one
+    """
+    progress_version = get_progress_version(user.id)
+    entry = cache.get(DASHBOARD_KEY.format(user.id))
+    if not _is_current(entry, progress_version):
+        return progress_version, None
+    if not _is_fresh(entry, get_catalog()):
+        _schedule_refresh(user)
+    return progress_version, entry
+
+
+async def _alookup(user):
+    progress_version = await aget_progress_version(user.id)
+    entry = await cache.aget(DASHBOARD_KEY.format(user.id))
+    if not _is_current(entry, progress_version):
+        return progress_version, None
+    if not _is_fresh(entry, await aget_catalog()):
+        await sync_to_async(_schedule_refresh)(user)
+    return progress_version, entry
+
+
+def dashboard_etag(user):
+    """
+    (etag, entry) for a student's dashboard, without building it
+
+    Pass `entry` on to get_dashboard() so the payload is the one the ETag
+    describes. A stale payload keeps its own ETag until the background
+    rebuild replaces it; the rebuild is queued here too, so a client that
+    only ever gets 304s still moves on to the new payload.
+    """
+    progress_version, entry = _lookup(user)
+    return _entry_etag(user.id, progress_version, entry, get_catalog()), entry
+
+
+async def adashboard_etag(user):
+    """dashboard_etag() for async views"""
+    progress_version, entry = await _alookup(user)
+    return _entry_etag(user.id, progress_version, entry, await aget_catalog()), entry
+
+
+def get_dashboard(user, entry=None):
+    """
+    Get a student's dashboard payload, served from cache when possible
+    `entry` is the one dashboard_etag() returned, if it was called
+    """
+    if entry is None:
+        _, entry = _lookup(user)
+    return entry['data'] if entry is not None else refresh_dashboard(user)
+
+
+async def aget_dashboard(user, entry=None):
+    """get_dashboard() for async views"""
+    if entry is None:
+        _, entry = await _alookup(user)
+    return entry['data'] if entry is not None else await arefresh_dashboard(user)
@@ -0,0 +1,170 @@
+"""
+In-process catalog snapshot
+
+Subjects and chapters change only through the admin, so each worker keeps an
+immutable snapshot of them in memory. Catalog edits bump the single-row
+CatalogVersion generation in the same transaction; workers compare it at most
+once every CATALOG_CHECK_INTERVAL seconds and reload when it moved, so
+invalidation crosses gunicorn workers through the database alone. Both are
+always read from the primary, even inside replica_reads(): a lagging replica
+would hand back an older generation than the worker already has.
+"""
+from asgiref.sync import sync_to_async
+from dataclasses import dataclass
+from types import MappingProxyType
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from backend.routers import primary_reads
+from .models import Subject, Chapter, CatalogVersion
+import threading
+import time
+import uuid
+
+
+@dataclass(frozen=True)
+class ChapterInfo:
+    id: uuid.UUID
+    subject_id: uuid.UUID
+    title: str
+    order: int
+    total_videos: int
+    updated_at: object
+    created_at: object
+
+
+@dataclass(frozen=True)
+class SubjectInfo:
+    id: uuid.UUID
+    name: str
+    display_name: str
+    color: str
+    order: int
+    chapters: tuple
+    total_videos: int
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    generation: int
+    subjects: tuple
+    subjects_by_id: MappingProxyType
+    chapters: MappingProxyType
+
+    def get_chapter(self, chapter_id):
+        """Look up a chapter by UUID or UUID string, None if unknown"""
+        try:
+            chapter_id = chapter_id if isinstance(chapter_id, uuid.UUID) else uuid.UUID(str(chapter_id))
+        except ValueError:
+            return None
+        return self.chapters.get(chapter_id)
+
+
+_lock = threading.Lock()
+_snapshot = None
+_checked_at = 0.0
+
+
+def _current_generation():
+    generation = CatalogVersion.objects.filter(pk=1).values_list('generation', flat=True).first()
+    return generation or 0
+
+
+def _load(generation):
+    chapters_by_subject = {}
+    chapters = {}
+    rows = Chapter.objects.order_by('order').values_list(
+        'id', 'subject_id', 'title', 'order', 'total_videos', 'updated_at', 'created_at'
+    )
+    for row in rows:
+        chapter = ChapterInfo(*row)
+        chapters[chapter.id] = chapter
+        chapters_by_subject.setdefault(chapter.subject_id, []).append(chapter)
+
+    subjects = []
+    rows = Subject.objects.order_by('order').values_list('id', 'name', 'display_name', 'color', 'order')
+    for subject_id, name, display_name, color, order in rows:
+        subject_chapters = tuple(chapters_by_subject.get(subject_id, ()))
+        subjects.append(SubjectInfo(
+            id=subject_id,
+            name=name,
+            display_name=display_name,
+            color=color,
+            order=order,
+            chapters=subject_chapters,
+            total_videos=sum(chapter.total_videos for chapter in subject_chapters),
+        ))
+
+    return CatalogSnapshot(
+        generation=generation,
+        subjects=tuple(subjects),
+        subjects_by_id=MappingProxyType({subject.id: subject for subject in subjects}),
+        chapters=MappingProxyType(chapters),
+    )
+
+
+def get_catalog(force_check=False):
+    """
+    Get the current catalog snapshot, reloading it if the generation moved on
+    """
+    global _snapshot, _checked_at
+
+    snapshot = _snapshot
+    if (snapshot is not None and not force_check
+            and time.monotonic() - _checked_at < settings.CATALOG_CHECK_INTERVAL):
+        return snapshot
+
+    with _lock, primary_reads():
+        # Read the generation before the rows: a concurrent edit can only
+        # make the data newer than its stamp, which the next check corrects.
+        generation = _current_generation()
+        if _snapshot is None or generation > _snapshot.generation:
+            _snapshot = _load(generation)
+        _checked_at = time.monotonic()
+        return _snapshot
+
+
+async def aget_catalog():
+    """get_catalog() for async views; only leaves the event loop to reload"""
+    snapshot = _snapshot
+    if snapshot is not None and time.monotonic() - _checked_at < settings.CATALOG_CHECK_INTERVAL:
+        return snapshot
+    return await sync_to_async(get_catalog)()
+
+
+def get_chapter(chapter_id):
+    """
+    Look up a chapter, re-checking the generation once on a miss so chapters
+    added in another worker are found without waiting for the next check
+    """
+    chapter = get_catalog().get_chapter(chapter_id)
+    if chapter is None:
+        chapter = get_catalog(force_check=True).get_chapter(chapter_id)
+    return chapter
+
+
+async def aget_chapter(chapter_id):
+    chapter = (await aget_catalog()).get_chapter(chapter_id)
+    if chapter is None:
+        chapter = (await sync_to_async(get_catalog)(force_check=True)).get_chapter(chapter_id)
+    return chapter
+
+
+def invalidate():
+    """Drop this worker's snapshot so the next read reloads it"""
+    global _snapshot
+    with _lock:
+        _snapshot = None
+
+
+def bump_generation():
+    """Record a catalog edit for every worker"""
+    updated = CatalogVersion.objects.filter(pk=1).update(
+        generation=F('generation') + 1,
+        updated_at=timezone.now()
+    )
+    if not updated:
+        CatalogVersion.objects.get_or_create(pk=1, defaults={'generation': 1})
+    invalidate()
+    transaction.on_commit(invalidate)
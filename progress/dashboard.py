@@ -0,0 +1,83 @@
+"""
+Dashboard assembly for the student dashboard
+
+Builds the `progress`/`subjects` payload from the in-process catalog snapshot,
+the student's per-subject rollup rows and their per-chapter progress rows.
+"""
+from .catalog import get_catalog
+from .models import StudentSubjectProgress
+from .sharding import student_rows
+from .writebehind import merge_pending
+
+
+def _rollup_rows(user):
+    # subject_id -> videos_watched from the rollup table
+    return StudentSubjectProgress.objects.filter(student_id=user.id).values_list('subject_id', 'videos_watched')
+
+
+def _progress_rows(user):
+    # chapter_id -> videos_watched for this student, from their shard
+    return student_rows(user.id).values_list('chapter_id', 'videos_watched')
+
+
+def build_dashboard(user, catalog=None):
+    """
+    Build dashboard data for a student
+
+    Returns: {progress: [...], subjects: [...]}
+    """
+    catalog = catalog or get_catalog()
+    rollup_map = dict(_rollup_rows(user))
+    progress_map = dict(_progress_rows(user))
+    return assemble_dashboard(user, catalog, rollup_map, progress_map)
+
+
+async def abuild_dashboard(user, catalog):
+    """build_dashboard() for async views, using the async ORM"""
+    rollup_map = {subject_id: watched async for subject_id, watched in _rollup_rows(user)}
+    progress_map = {chapter_id: watched async for chapter_id, watched in _progress_rows(user)}
+    return assemble_dashboard(user, catalog, rollup_map, progress_map)
+
+
+def assemble_dashboard(user, catalog, rollup_map, progress_map):
+    """Shape the payload from the catalog and the student's rows"""
+    # Updates still waiting in the write-behind buffer
+    merge_pending(user.id, progress_map, rollup_map, catalog)
+
+    progress_data = []
+    subjects_data = []
+
+    for subject in catalog.subjects:
+        progress_data.append(subject_progress(subject, rollup_map.get(subject.id, 0)))
+        subjects_data.append({
+            'subject': subject.display_name,
+            'chapters': [chapter_progress(chapter, progress_map.get(chapter.id, 0)) for chapter in subject.chapters]
+        })
+
+    return {
+        'progress': progress_data,
+        'subjects': subjects_data
+    }
+
+
+def subject_progress(subject, videos_watched):
+    """A subject's entry in the dashboard's `progress` list"""
+    total_videos = subject.total_videos
+    percentage = round((videos_watched / total_videos * 100), 1) if total_videos > 0 else 0
+    return {
+        'subject': subject.display_name,
+        'videos_watched': videos_watched,
+        'total_videos': total_videos,
+        'percentage': percentage,
+        'color': subject.color
+    }
+
+
+def chapter_progress(chapter, watched):
+    """A chapter's entry in a dashboard subject's `chapters` list"""
+    return {
+        'id': str(chapter.id),
+        'title': chapter.title,
+        'total_videos': chapter.total_videos,
+        'watched_videos': watched
+    }
@@ -0,0 +1,168 @@
+"""
+Streaming export of VideoProgress
+
+Rows are read with values_list() and .iterator(chunk_size=...) (a server-side
+cursor on PostgreSQL), joined with the student and chapter in the same
+query, and encoded as NDJSON or CSV one chunk at a time, so memory stays
+constant whatever the table size. Used by views.export_progress_view and the
+export_progress command.
+
+With PROGRESS_SHARDS the shards are read one after another, and each chunk's
+students are looked up with one query and its chapters in the catalog
+snapshot instead of joined.
+"""
+from datetime import datetime, time, timedelta
+from itertools import islice
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from authentication.models import User
+from . import sharding
+from .catalog import get_catalog
+from .models import VideoProgress
+import csv
+import io
+
+EXPORT_CHUNK_SIZE = 2000
+
+OUTPUT_CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+COLUMNS = (
+    'student_id', 'student_email', 'student_name', 'subject', 'chapter_id', 'chapter_title',
+    'videos_watched', 'total_videos', 'percentage', 'last_watched_at',
+)
+
+FIELDS = (
+    'student_id', 'student__email', 'student__name', 'chapter__subject__name', 'chapter_id', 'chapter__title',
+    'videos_watched', 'chapter__total_videos', 'last_watched_at',
+)
+
+
+def parse_bound(value, end=False):
+    """
+    ISO date or datetime -> aware datetime, None if empty
+
+    A bare date as an upper bound covers that whole day. Raises ValueError
+    when the value is not a date.
+    """
+    if not value:
+        return None
+    day = parse_date(value)
+    if day is not None:
+        moment = datetime.combine(day + timedelta(days=1) if end else day, time.min)
+    else:
+        moment = parse_datetime(value)
+        if moment is None:
+            raise ValueError(f"Invalid date: {value}")
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment, timezone.get_default_timezone())
+    return moment
+
+
+def export_queryset(subject=None, since=None, until=None, using=None):
+    """
+    VideoProgress rows as FIELDS tuples, read from database `using`
+
+    subject filters by Subject.name; since/until bound last_watched_at
+    (since inclusive, until exclusive).
+    """
+    queryset = VideoProgress.objects.using(using).order_by()
+    if subject:
+        queryset = queryset.filter(chapter__subject__name=subject)
+    if since:
+        queryset = queryset.filter(last_watched_at__gte=since)
+    if until:
+        queryset = queryset.filter(last_watched_at__lt=until)
+    return queryset.values_list(*FIELDS)
+
+
+def sharded_rows(subject=None, since=None, until=None, chunk_size=EXPORT_CHUNK_SIZE, using=None):
+    """export_queryset() rows from every shard; students are read from database `using`"""
+    catalog = get_catalog()
+    chapter_ids = None
+    if subject:
+        chapter_ids = [chapter.id for info in catalog.subjects if info.name == subject for chapter in info.chapters]
+
+    for alias in settings.PROGRESS_SHARDS:
+        queryset = VideoProgress.objects.using(alias).order_by()
+        if chapter_ids is not None:
+            queryset = queryset.filter(chapter_id__in=chapter_ids)
+        if since:
+            queryset = queryset.filter(last_watched_at__gte=since)
+        if until:
+            queryset = queryset.filter(last_watched_at__lt=until)
+        rows = queryset.values_list('student_id', 'chapter_id', 'videos_watched', 'last_watched_at').iterator(chunk_size=chunk_size)
+
+        while chunk := list(islice(rows, chunk_size)):
+            students = {
+                student_id: (email, name)
+                for student_id, email, name in User.objects.using(using).filter(
+                    id__in={row[0] for row in chunk}
+                ).values_list('id', 'email', 'name')
+            }
+            for student_id, chapter_id, videos_watched, last_watched_at in chunk:
+                student = students.get(student_id)
+                chapter = catalog.chapters.get(chapter_id)
+                # Dropped by the join too: the student or chapter was deleted
+                if student is None or chapter is None:
+                    continue
+                yield (
+                    student_id, *student, catalog.subjects_by_id[chapter.subject_id].name, chapter_id, chapter.title,
+                    videos_watched, chapter.total_videos, last_watched_at,
+                )
+
+
+def export_rows(subject=None, since=None, until=None, chunk_size=EXPORT_CHUNK_SIZE, using=None):
+    """Yield one tuple per VideoProgress row, in COLUMNS order (arguments as export_queryset)"""
+    if sharding.enabled():
+        rows = sharded_rows(subject, since, until, chunk_size, using)
+    else:
+        rows = export_queryset(subject, since, until, using).iterator(chunk_size=chunk_size)
+    for row in rows:
+        (student_id, email, name, subject_name, chapter_id, title,
+         videos_watched, total_videos, last_watched_at) = row
+        percentage = round((videos_watched / total_videos) * 100, 1) if total_videos > 0 else 0
+        yield (
+            str(student_id), email, name, subject_name, str(chapter_id), title,
+            videos_watched, total_videos, percentage, last_watched_at.isoformat(),
+        )
+
+
+def _chunked(lines, chunk_size):
+    # Fewer, larger writes than one per row
+    buffer = []
+    for line in lines:
+        buffer.append(line)
+        if len(buffer) >= chunk_size:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+def ndjson_lines(rows):
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for row in rows:
+        yield encoder.encode(dict(zip(COLUMNS, row))) + '\n'
+
+
+def csv_lines(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    yield buffer.getvalue()
+    for row in rows:
+        buffer.seek(0)
+        buffer.truncate(0)
+        writer.writerow(row)
+        yield buffer.getvalue()
+
+
+def stream_export(output, rows, chunk_size=EXPORT_CHUNK_SIZE):
+    """Encoded chunks of `rows` for output 'ndjson' or 'csv'"""
+    lines = csv_lines(rows) if output == 'csv' else ndjson_lines(rows)
+    return _chunked(lines, chunk_size)
@@ -0,0 +1,166 @@
+"""
+Progress history: append-only event log and daily compaction
+
+Every write_progress() call that changes a value appends ProgressEvent rows
+with one bulk INSERT in the same transaction. compact_events() rolls
+complete days of events into DailyProgress (per student, chapter and day)
+and prune_events() deletes raw events older than the retention window once
+their days are compacted; run both daily with compact_progress_events.
+History reads use DailyProgress for compacted days and aggregate the few
+raw events of the days after that on the fly.
+"""
+from datetime import datetime, time, timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from .models import ProgressEvent, DailyProgress, EventCompaction
+
+EVENT_BATCH_SIZE = 1000
+
+
+def record_events(changes):
+    """Append {(student_id, chapter_id): (videos_watched, delta)} for non-zero deltas"""
+    now = timezone.now()
+    events = [
+        ProgressEvent(student_id=student_id, chapter_id=chapter_id, videos_watched=videos_watched, delta=delta, created_at=now)
+        for (student_id, chapter_id), (videos_watched, delta) in changes.items()
+        if delta
+    ]
+    ProgressEvent.objects.bulk_create(events, batch_size=EVENT_BATCH_SIZE)
+    return len(events)
+
+
+def _start_of(day):
+    return timezone.make_aware(datetime.combine(day, time.min), timezone.get_default_timezone())
+
+
+def _daily_totals(events):
+    return (
+        events
+        .annotate(day=TruncDate('created_at'))
+        .values_list('student_id', 'chapter_id', 'day')
+        .annotate(
+            videos_gained=Sum('delta', filter=Q(delta__gt=0), default=0),
+            net_change=Sum('delta'),
+            events=Count('id'),
+        )
+        .order_by()
+    )
+
+
+def compacted_through():
+    return EventCompaction.objects.filter(pk=1).values_list('compacted_through', flat=True).first()
+
+
+def compact_events(through=None):
+    """
+    Roll events up to and including `through` (default yesterday) into
+    DailyProgress; returns the number of daily rows written
+
+    The last compacted day is recomputed too, for events committed late.
+    Re-running is safe: days are overwritten, not added to.
+    """
+    through = through or timezone.localdate() - timedelta(days=1)
+    start = compacted_through()
+    if start is not None and through < start:
+        return 0
+    events = ProgressEvent.objects.filter(created_at__lt=_start_of(through + timedelta(days=1)))
+    if start is not None:
+        events = events.filter(created_at__gte=_start_of(start))
+
+    written = 0
+    with transaction.atomic():
+        batch = []
+        for student_id, chapter_id, day, gained, net, count in _daily_totals(events).iterator(chunk_size=EVENT_BATCH_SIZE):
+            batch.append(DailyProgress(
+                student_id=student_id, chapter_id=chapter_id, day=day,
+                videos_gained=gained, net_change=net, events=count
+            ))
+            if len(batch) >= EVENT_BATCH_SIZE:
+                written += _upsert_daily(batch)
+                batch = []
+        written += _upsert_daily(batch)
+        EventCompaction.objects.update_or_create(pk=1, defaults={'compacted_through': through})
+    return written
+
+
+def _upsert_daily(rows):
+    DailyProgress.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=['student', 'chapter', 'day'],
+        update_fields=['videos_gained', 'net_change', 'events'],
+    )
+    return len(rows)
+
+
+def prune_events(retention_days=None):
+    """
+    Delete raw events older than the retention window; events of the last
+    compacted day and later are always kept. Returns the number deleted.
+    """
+    if retention_days is None:
+        retention_days = settings.PROGRESS_EVENT_RETENTION_DAYS
+    through = compacted_through()
+    if through is None:
+        return 0
+    keep_from = min(timezone.localdate() - timedelta(days=retention_days), through)
+    expired = ProgressEvent.objects.filter(created_at__lt=_start_of(keep_from))
+
+    deleted = 0
+    while True:
+        ids = list(expired.values_list('id', flat=True)[:EVENT_BATCH_SIZE])
+        if not ids:
+            return deleted
+        deleted += ProgressEvent.objects.filter(id__in=ids).delete()[0]
+
+
+def get_history(student_id, days, catalog):
+    """
+    A student's activity for the last `days` days, oldest first
+
+    Returns [{date, videos_gained, net_change, chapters: [...]}, ...] with an
+    entry for every day, active or not.
+    """
+    today = timezone.localdate()
+    since = today - timedelta(days=days - 1)
+    through = compacted_through()
+
+    rows = []
+    if through is not None and through >= since:
+        rows += DailyProgress.objects.filter(
+            student_id=student_id, day__gte=since, day__lte=through
+        ).values_list('student_id', 'chapter_id', 'day', 'videos_gained', 'net_change', 'events')
+    raw_from = since if through is None or through < since else through + timedelta(days=1)
+    rows += _daily_totals(ProgressEvent.objects.filter(student_id=student_id, created_at__gte=_start_of(raw_from)))
+
+    by_day = {}
+    for _, chapter_id, day, gained, net, count in rows:
+        by_day.setdefault(day, []).append((chapter_id, gained, net, count))
+
+    history = []
+    for offset in range(days):
+        day = since + timedelta(days=offset)
+        chapters = []
+        for chapter_id, gained, net, count in by_day.get(day, []):
+            chapter = catalog.chapters.get(chapter_id)
+            if chapter is None:
+                continue
+            subject = catalog.subjects_by_id.get(chapter.subject_id)
+            chapters.append({
+                'chapter_id': str(chapter_id),
+                'title': chapter.title,
+                'subject': subject.display_name if subject else None,
+                'videos_gained': gained,
+                'net_change': net,
+                'updates': count
+            })
+        history.append({
+            'date': day.isoformat(),
+            'videos_gained': sum(chapter['videos_gained'] for chapter in chapters),
+            'net_change': sum(chapter['net_change'] for chapter in chapters),
+            'chapters': chapters
+        })
+    return history
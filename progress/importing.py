@@ -0,0 +1,298 @@
+"""
+Bulk import of rosters (users) and chapter catalogs
+
+Records are read from CSV or NDJSON files in streaming batches and written
+with one statement per batch. Roster passwords are hashed on a process pool
+while the previous batch is being written; on PostgreSQL roster batches are
+loaded with COPY into a temporary table and merged with
+INSERT ... ON CONFLICT, elsewhere with bulk_create(). Existing users (by
+email) and chapters (by subject and title) are skipped or updated.
+Used by the bulk_import command.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from django.contrib.auth.hashers import make_password
+from django.db import connections, router, transaction
+from django.utils import timezone
+from authentication.authentication import revoke_all_user_states
+from authentication.models import User
+from .models import Subject, Chapter
+from . import catalog
+import csv
+import io
+import json
+import os
+import time
+import uuid
+
+IMPORT_BATCH_SIZE = 1000
+
+
+class ImportReport:
+    """Counts and timing for one import"""
+
+    def __init__(self, method):
+        self.method = method
+        self.read = 0
+        # Rows inserted or updated, and existing rows left as they were
+        self.written = 0
+        self.skipped = 0
+        self.errors = []
+        self.started = time.perf_counter()
+
+    def error(self, line, message):
+        self.errors.append(f"line {line}: {message}")
+
+    def as_dict(self, max_errors=20):
+        elapsed = time.perf_counter() - self.started
+        return {
+            'method': self.method,
+            'rows_read': self.read,
+            'rows_written': self.written,
+            'rows_skipped': self.skipped,
+            'rows_rejected': len(self.errors),
+            'elapsed_s': round(elapsed, 2),
+            'rows_per_sec': round(self.read / elapsed, 1) if elapsed > 0 else 0.0,
+            'errors': self.errors[:max_errors],
+        }
+
+
+def read_records(path):
+    """Yield (line_number, dict) from a .csv or .ndjson/.jsonl file"""
+    with open(path, encoding='utf-8', newline='') as source:
+        if path.endswith('.csv'):
+            reader = csv.DictReader(source)
+            for record in reader:
+                yield reader.line_num, record
+        else:
+            for number, line in enumerate(source, start=1):
+                if line.strip():
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        record = None
+                    yield number, record if isinstance(record, dict) else None
+
+
+def batches(records, size):
+    records = iter(records)
+    while True:
+        batch = list(islice(records, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _text(record, key):
+    value = record.get(key)
+    return str(value).strip() if value is not None else ''
+
+
+def _hash_passwords(passwords):
+    # Runs in a pool process
+    return [make_password(password) for password in passwords]
+
+
+def _init_hash_worker():
+    import django
+    django.setup()
+
+
+def _copy_users(connection, users, update):
+    """COPY a batch into a temp table and merge it into users; returns the rows inserted or updated"""
+    qn = connection.ops.quote_name
+    table = qn(User._meta.db_table)
+    columns = ['id', 'password', 'email', 'name', 'role', 'is_active', 'is_staff', 'is_superuser', 'date_joined']
+    column_list = ', '.join(qn(column) for column in columns)
+
+    data = io.StringIO()
+    writer = csv.writer(data)
+    for user in users:
+        writer.writerow([
+            user.id, user.password, user.email, user.name, user.role,
+            't', 'f', 'f', user.date_joined.isoformat(),
+        ])
+    data.seek(0)
+
+    if update:
+        conflict = f"DO UPDATE SET {qn('name')} = EXCLUDED.{qn('name')}, {qn('role')} = EXCLUDED.{qn('role')}"
+    else:
+        conflict = 'DO NOTHING'
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"CREATE TEMP TABLE import_users (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP")
+        copy_sql = f"COPY import_users ({column_list}) FROM STDIN WITH (FORMAT csv)"
+        if hasattr(cursor.cursor, 'copy_expert'):
+            # psycopg2
+            cursor.cursor.copy_expert(copy_sql, data)
+        else:
+            # psycopg 3
+            with cursor.cursor.copy(copy_sql) as copy:
+                copy.write(data.getvalue())
+        cursor.execute(
+            f"INSERT INTO {table} ({column_list}) SELECT {column_list} FROM import_users "
+            f"ON CONFLICT ({qn('email')}) {conflict}"
+        )
+        return cursor.rowcount
+
+
+def _write_users(using, users, update):
+    """Write a batch; returns the number of rows inserted or updated"""
+    connection = connections[using]
+    with transaction.atomic(using=using):
+        if connection.vendor == 'postgresql':
+            return _copy_users(connection, users, update)
+        if update:
+            User.objects.using(using).bulk_create(
+                users, update_conflicts=True, unique_fields=['email'], update_fields=['name', 'role']
+            )
+            return len(users)
+        # bulk_create() can't say which rows it ignored, so leave out the
+        # existing ones up front; ignore_conflicts still covers a race
+        existing = set(
+            User.objects.using(using).filter(email__in=[user.email for user in users]).values_list('email', flat=True)
+        )
+        new_users = [user for user in users if user.email not in existing]
+        User.objects.using(using).bulk_create(new_users, ignore_conflicts=True)
+        return len(new_users)
+
+
+def import_roster(path, batch_size=IMPORT_BATCH_SIZE, hash_workers=None, update=False):
+    """
+    Create users from records with email, name and optional role and password
+
+    Users without a password get an unusable one. With `update`, existing
+    users' name and role are overwritten (never their password); otherwise
+    they are skipped. Returns an ImportReport.
+    """
+    using = router.db_for_write(User)
+    report = ImportReport('copy' if connections[using].vendor == 'postgresql' else 'bulk_create')
+    roles = dict(User.ROLE_CHOICES)
+    hash_workers = os.cpu_count() if hash_workers is None else hash_workers
+    pool = None
+    if hash_workers > 0:
+        pool = ProcessPoolExecutor(max_workers=hash_workers, initializer=_init_hash_worker)
+
+    def prepare(batch):
+        users = {}
+        for line, record in batch:
+            report.read += 1
+            if record is None:
+                report.error(line, 'not a JSON object')
+                continue
+            email = User.objects.normalize_email(_text(record, 'email')).lower()
+            name = _text(record, 'name')
+            role = _text(record, 'role') or 'student'
+            if not email or '@' not in email:
+                report.error(line, 'email is required')
+            elif not name:
+                report.error(line, 'name is required')
+            elif role not in roles:
+                report.error(line, f'role must be one of {", ".join(roles)}')
+            else:
+                # The last record for an email wins
+                user = User(id=uuid.uuid4(), email=email, name=name, role=role, date_joined=timezone.now())
+                users[email] = (user, _text(record, 'password') or None)
+        users = list(users.values())
+        passwords = [password for _, password in users if password]
+        if pool is None:
+            return users, [_hash_passwords(passwords)]
+        # One slice per worker so the whole pool hashes each batch
+        step = -(-len(passwords) // hash_workers) or 1
+        return users, [pool.submit(_hash_passwords, passwords[i:i + step]) for i in range(0, len(passwords), step)]
+
+    def write(users, hashed):
+        hashes = (value for part in hashed for value in (part if isinstance(part, list) else part.result()))
+        for user, password in users:
+            user.password = next(hashes) if password else make_password(None)
+        written = _write_users(using, [user for user, _ in users], update)
+        report.written += written
+        report.skipped += len(users) - written
+
+    try:
+        pending = None
+        for batch in batches(read_records(path), batch_size):
+            # Hash this batch while the previous one is written
+            prepared = prepare(batch)
+            if pending:
+                write(*pending)
+            pending = prepared
+        if pending:
+            write(*pending)
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+
+    if update:
+        revoke_all_user_states()
+    return report
+
+
+def import_catalog(path, batch_size=IMPORT_BATCH_SIZE, update=False):
+    """
+    Create chapters from records with subject, title, total_videos and
+    optional order and subject_display_name
+
+    Missing subjects are created. With `update`, existing chapters' order
+    and total_videos are overwritten; otherwise they are skipped.
+    Returns an ImportReport.
+    """
+    report = ImportReport('bulk_create')
+    subject_names = dict(Subject.SUBJECT_CHOICES)
+    subjects = dict(Subject.objects.values_list('name', 'id'))
+
+    for batch in batches(read_records(path), batch_size):
+        chapters = {}
+        for line, record in batch:
+            report.read += 1
+            if record is None:
+                report.error(line, 'not a JSON object')
+                continue
+            name = _text(record, 'subject').lower()
+            title = _text(record, 'title')
+            try:
+                total_videos = int(_text(record, 'total_videos'))
+                order = int(_text(record, 'order') or 0)
+            except ValueError:
+                report.error(line, 'total_videos and order must be numbers')
+                continue
+            if name not in subject_names:
+                report.error(line, f'subject must be one of {", ".join(subject_names)}')
+            elif not title:
+                report.error(line, 'title is required')
+            elif total_videos < 0:
+                report.error(line, 'total_videos must not be negative')
+            else:
+                if name not in subjects:
+                    subjects[name] = Subject.objects.get_or_create(
+                        name=name,
+                        defaults={'display_name': _text(record, 'subject_display_name') or subject_names[name]}
+                    )[0].id
+                chapters[(name, title)] = Chapter(
+                    subject_id=subjects[name], title=title, order=order, total_videos=total_videos
+                )
+
+        with transaction.atomic():
+            if update:
+                Chapter.objects.bulk_create(
+                    list(chapters.values()), update_conflicts=True,
+                    unique_fields=['subject', 'title'], update_fields=['order', 'total_videos', 'updated_at']
+                )
+                written = len(chapters)
+            else:
+                # As in _write_users(), existing chapters are left out up front
+                existing = set(Chapter.objects.filter(
+                    subject_id__in={chapter.subject_id for chapter in chapters.values()},
+                    title__in={title for _, title in chapters},
+                ).values_list('subject_id', 'title'))
+                new_chapters = [
+                    chapter for chapter in chapters.values() if (chapter.subject_id, chapter.title) not in existing
+                ]
+                Chapter.objects.bulk_create(new_chapters, ignore_conflicts=True)
+                written = len(new_chapters)
+            # bulk_create skips the post_save handlers that do this
+            catalog.bump_generation()
+        report.written += written
+        report.skipped += len(chapters) - written
+
+    return report
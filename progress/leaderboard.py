@@ -0,0 +1,231 @@
+"""
+Per-subject leaderboards
+
+Each worker keeps, per subject, every student's rollup score and a Fenwick
+tree of how many students have each score, so a student's rank (1 + the
+number of students with a higher score) is a prefix sum: O(log max_score),
+whatever the number of students. Scores are bounded by the subject's
+total_videos, so the tree stays tiny; students who have not started (score
+0) are unranked, and so are teachers and deactivated accounts.
+
+The structure is loaded from StudentSubjectProgress on first use and kept
+current from rollup rows whose updated_at moved, re-read at most every
+LEADERBOARD_SYNC_INTERVAL seconds and right after this worker writes
+progress. It is rebuilt from scratch every LEADERBOARD_REBUILD_INTERVAL
+seconds to drop deleted and deactivated students. Queries run outside the
+lock that lookups take, so a slow one never holds up ranking. Top-N lists
+come straight from the (subject, -videos_watched, student) index.
+"""
+from array import array
+from datetime import timedelta
+from django.conf import settings
+from .models import StudentSubjectProgress
+import threading
+import time
+
+# Rows committed late can carry an updated_at slightly behind the watermark
+SYNC_OVERLAP = timedelta(seconds=5)
+
+
+class FenwickTree:
+    """Counts per score 1..size-1 with O(log size) updates and suffix counts"""
+
+    def __init__(self, size):
+        self.size = size
+        self.tree = array('q', bytes(8 * size))
+
+    def add(self, score, delta):
+        while score < self.size:
+            self.tree[score] += delta
+            score += score & -score
+
+    def prefix(self, score):
+        """Number of entries with a score in 1..score"""
+        total = 0
+        score = min(score, self.size - 1)
+        while score > 0:
+            total += self.tree[score]
+            score -= score & -score
+        return total
+
+
+class SubjectRanking:
+    """Scores of one subject, indexed by the leaderboard's student slots"""
+
+    def __init__(self, size=256):
+        self.scores = array('i')
+        self.counts = FenwickTree(size)
+        self.ranked = 0
+
+    def _grow(self, score):
+        size = self.counts.size
+        while size <= score:
+            size *= 2
+        counts = FenwickTree(size)
+        for slot_score in self.scores:
+            if slot_score > 0:
+                counts.add(slot_score, 1)
+        self.counts = counts
+
+    def set(self, slot, score):
+        missing = slot + 1 - len(self.scores)
+        if missing > 0:
+            self.scores.frombytes(bytes(self.scores.itemsize * missing))
+        previous = self.scores[slot]
+        if previous == score:
+            return
+        if score >= self.counts.size:
+            self.scores[slot] = score
+            self._grow(score)
+            self.ranked += (score > 0) - (previous > 0)
+            return
+        if previous > 0:
+            self.counts.add(previous, -1)
+            self.ranked -= 1
+        if score > 0:
+            self.counts.add(score, 1)
+            self.ranked += 1
+        self.scores[slot] = score
+
+    def score(self, slot):
+        return self.scores[slot] if slot < len(self.scores) else 0
+
+    def rank_of_score(self, score):
+        """Competition rank for a score, None for 0 (not started)"""
+        if score <= 0:
+            return None
+        return 1 + self.ranked - self.counts.prefix(score)
+
+
+class Leaderboard:
+    """All subjects' rankings for this worker"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._slots = {}
+        self._rankings = {}
+        self._watermark = None
+        self._loaded_at = None
+        self._synced_at = 0.0
+        self._stale = False
+
+    def _apply(self, rows, slots, rankings, watermark):
+        for student_id, subject_id, videos_watched, updated_at in rows:
+            slot = slots.setdefault(student_id.int, len(slots))
+            ranking = rankings.get(subject_id)
+            if ranking is None:
+                ranking = rankings[subject_id] = SubjectRanking()
+            ranking.set(slot, videos_watched)
+            if watermark is None or updated_at > watermark:
+                watermark = updated_at
+        return watermark
+
+    def _rollups(self):
+        return StudentSubjectProgress.objects.filter(student__role='student', student__is_active=True)
+
+    def _rows(self, queryset):
+        return queryset.values_list('student_id', 'subject_id', 'videos_watched', 'updated_at').iterator(chunk_size=10000)
+
+    def load(self):
+        """Rebuild every ranking from the rollup table, then swap it in"""
+        slots = {}
+        rankings = {}
+        watermark = self._apply(self._rows(self._rollups()), slots, rankings, None)
+        with self._lock:
+            self._slots = slots
+            self._rankings = rankings
+            self._watermark = watermark
+            self._loaded_at = self._synced_at = time.monotonic()
+            self._stale = False
+
+    def invalidate(self):
+        """Reload everything on the next lookup"""
+        with self._lock:
+            self._loaded_at = None
+
+    def sync(self):
+        """Pick up rollups changed since the last sync (or reload when due)"""
+        now = time.monotonic()
+        if self._loaded_at is None or now - self._loaded_at > settings.LEADERBOARD_REBUILD_INTERVAL:
+            # Only one thread rebuilds; the others keep serving the old rankings
+            if self._load_lock.acquire(blocking=self._loaded_at is None):
+                try:
+                    if self._loaded_at is None or now - self._loaded_at > settings.LEADERBOARD_REBUILD_INTERVAL:
+                        self.load()
+                finally:
+                    self._load_lock.release()
+            return
+
+        if not self._stale and now - self._synced_at < settings.LEADERBOARD_SYNC_INTERVAL:
+            return
+        # One sync at a time, so an older batch is never applied over a newer
+        # one; the others keep serving the current rankings
+        if not self._sync_lock.acquire(blocking=False):
+            return
+        try:
+            with self._lock:
+                self._stale = False
+                self._synced_at = now
+                loaded_at, watermark = self._loaded_at, self._watermark
+            changed = self._rollups()
+            if watermark is not None:
+                changed = changed.filter(updated_at__gte=watermark - SYNC_OVERLAP)
+            rows = list(self._rows(changed))
+            with self._lock:
+                # A reload in the meantime read these rows already
+                if self._loaded_at == loaded_at:
+                    self._watermark = self._apply(rows, self._slots, self._rankings, self._watermark)
+        finally:
+            self._sync_lock.release()
+
+    def mark_stale(self):
+        """Re-read changed rollups on the next lookup (called after progress writes)"""
+        self._stale = True
+
+    def rank(self, subject_id, student_id):
+        """(rank, videos_watched, students_ranked) for a student in a subject"""
+        self.sync()
+        with self._lock:
+            ranking = self._rankings.get(subject_id)
+            if ranking is None:
+                return None, 0, 0
+            slot = self._slots.get(student_id.int)
+            score = ranking.score(slot) if slot is not None else 0
+            return ranking.rank_of_score(score), score, ranking.ranked
+
+    def rank_of_score(self, subject_id, score):
+        with self._lock:
+            ranking = self._rankings.get(subject_id)
+            return ranking.rank_of_score(score) if ranking is not None else None
+
+    def top(self, subject_id, limit=10):
+        """Top `limit` students who have started, ties broken by student id"""
+        self.sync()
+        rows = (
+            self._rollups()
+            .filter(subject_id=subject_id, videos_watched__gt=0)
+            .order_by('-videos_watched', 'student_id')
+            .values_list('student_id', 'student__name', 'videos_watched')[:limit]
+        )
+        return [
+            {
+                'rank': self.rank_of_score(subject_id, videos_watched),
+                'student_id': student_id,
+                'name': name,
+                'videos_watched': videos_watched,
+            }
+            for student_id, name, videos_watched in rows
+        ]
+
+
+_leaderboard = Leaderboard()
+
+
+def get_leaderboard():
+    return _leaderboard
+
+
+def mark_stale():
+    _leaderboard.mark_stale()
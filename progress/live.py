@@ -0,0 +1,296 @@
+"""
+Live progress updates over server-sent events
+
+write_progress() publishes every changed value once its transaction commits,
+to the student's channel and to the class channel that teachers and staff
+subscribe to. publish() hands messages to the fan-out named by
+LIVE_FANOUT_BACKEND, which delivers them to the Broker in every worker
+process. The default LocalFanout only reaches this process: it stands in for
+a cross-process transport (Redis pub/sub, PostgreSQL LISTEN/NOTIFY) that
+would implement the same constructor and publish(), calling deliver() from
+its listener for messages from every process.
+
+The Broker keeps each open stream's frames on the stream's event loop.
+Publishers in any thread reach each loop with a single
+call_soon_threadsafe(), and each message's SSE frame is encoded once for all
+of its streams. A stream's queue holds at most LIVE_STREAM_QUEUE_SIZE frames;
+a client that falls further behind has its queue replaced by one "resync"
+event, telling it to catch up through the dashboard sync endpoint, so a slow
+reader costs neither memory nor publisher time. Idle streams get a comment
+frame every LIVE_HEARTBEAT_SECONDS so proxies keep them open.
+
+A stream ends when the token expires or after LIVE_MAX_STREAM_SECONDS,
+whichever comes first. Every LIVE_HEARTBEAT_SECONDS it also re-checks the
+account, like every authenticated request does, and ends when the user was
+deactivated or revoked, or their role no longer gives the same channels; the
+client reconnects and is authenticated again.
+
+Streams hold no database connection while open.
+"""
+from collections import deque
+from django.conf import settings
+from django.utils.module_loading import import_string
+from authentication.authentication import aget_user_state
+import asyncio
+import itertools
+import json
+import threading
+import time
+
+STUDENT_CHANNEL = 'student:{}'
+CLASS_CHANNEL = 'class'
+
+HEARTBEAT_FRAME = b': heartbeat\n\n'
+
+
+def is_enabled():
+    return settings.LIVE_UPDATES
+
+
+def sse_frame(event, data=None, event_id=None):
+    """One SSE event; `data` is sent as a single line of JSON"""
+    lines = [f'id: {event_id}'] if event_id is not None else []
+    lines.append(f'event: {event}')
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return ('\n'.join(lines) + '\n\n').encode()
+
+
+RESYNC_FRAME = sse_frame('resync', {})
+
+
+class Subscription:
+    """One open stream's bounded frame queue, only touched on its event loop"""
+
+    def __init__(self, channels, max_queued):
+        self.channels = tuple(channels)
+        self.max_queued = max_queued
+        self.loop = asyncio.get_running_loop()
+        self.subscribed = False
+        self.frames = deque()
+        # Set from the overflow until the client has been sent the resync
+        self.lagged = False
+        self.dropped = 0
+        self._ready = asyncio.Event()
+
+    def put(self, frame):
+        if self.lagged:
+            self.dropped += 1
+            return
+        if len(self.frames) >= self.max_queued:
+            self.dropped += len(self.frames) + 1
+            self.frames.clear()
+            self.frames.append(RESYNC_FRAME)
+            self.lagged = True
+        else:
+            self.frames.append(frame)
+        self._ready.set()
+
+    async def get(self, timeout):
+        """The next frame, None after `timeout` seconds without one"""
+        if not self.frames:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        frame = self.frames.popleft()
+        if frame is RESYNC_FRAME:
+            self.lagged = False
+        return frame
+
+
+def _put_all(subscriptions, frame):
+    for subscription in subscriptions:
+        subscription.put(frame)
+
+
+class Broker:
+    """This process's channel -> open streams registry"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._channels = {}
+        self._ids = itertools.count(1)
+        self._streams = 0
+        self._published = 0
+        self._delivered = 0
+
+    def subscribe(self, channels, max_queued=None):
+        """A Subscription to `channels`, bound to the running event loop"""
+        subscription = Subscription(channels, max_queued or settings.LIVE_STREAM_QUEUE_SIZE)
+        with self._lock:
+            subscription.subscribed = True
+            for channel in subscription.channels:
+                self._channels.setdefault(channel, set()).add(subscription)
+            self._streams += 1
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            if not subscription.subscribed:
+                return
+            subscription.subscribed = False
+            for channel in subscription.channels:
+                subscribers = self._channels[channel]
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._channels[channel]
+            self._streams -= 1
+
+    def stream_count(self):
+        return self._streams
+
+    def deliver(self, channel, message):
+        """Queue a message on this process's streams for `channel`; callable from any thread"""
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+            self._published += 1
+            self._delivered += len(subscribers)
+        if not subscribers:
+            return 0
+        frame = sse_frame('progress', message, next(self._ids))
+        by_loop = {}
+        for subscription in subscribers:
+            by_loop.setdefault(subscription.loop, []).append(subscription)
+        for loop, subscriptions in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(_put_all, subscriptions, frame)
+            except RuntimeError:
+                # The loop is closed, and its streams with it
+                for subscription in subscriptions:
+                    self.unsubscribe(subscription)
+        return len(subscribers)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'streams': self._streams,
+                'channels': len(self._channels),
+                'published': self._published,
+                'delivered': self._delivered,
+            }
+
+
+class LocalFanout:
+    """Fan-out within this process only; a stand-in for a cross-process transport"""
+
+    def __init__(self, deliver):
+        self.deliver = deliver
+
+    def publish(self, channel, message):
+        self.deliver(channel, message)
+
+
+_lock = threading.Lock()
+_broker = Broker()
+_fanout = None
+
+
+def get_broker():
+    return _broker
+
+
+def get_fanout():
+    """The LIVE_FANOUT_BACKEND instance, created on first use"""
+    global _fanout
+    if _fanout is None:
+        with _lock:
+            if _fanout is None:
+                _fanout = import_string(settings.LIVE_FANOUT_BACKEND)(_broker.deliver)
+    return _fanout
+
+
+def reset_fanout():
+    """Drop the fan-out so the next publish() builds it from settings again"""
+    global _fanout
+    with _lock:
+        _fanout = None
+
+
+def publish(channel, message):
+    if is_enabled():
+        get_fanout().publish(channel, message)
+
+
+def publish_changes(changes, chapters):
+    """
+    Publish {(student_id, chapter_id): (videos_watched, delta)} entries that
+    changed, given {chapter_id: chapter}
+    """
+    for (student_id, chapter_id), (videos_watched, delta) in changes.items():
+        if not delta:
+            continue
+        chapter = chapters[chapter_id]
+        total_videos = chapter.total_videos
+        message = {
+            'student_id': str(student_id),
+            'chapter_id': str(chapter_id),
+            'subject_id': str(chapter.subject_id),
+            'videos_watched': videos_watched,
+            'total_videos': total_videos,
+            'percentage': round((videos_watched / total_videos) * 100, 1) if total_videos > 0 else 0,
+        }
+        publish(STUDENT_CHANNEL.format(student_id), message)
+        publish(CLASS_CHANNEL, message)
+
+
+def _channels(user_id, role, is_staff):
+    if role == 'teacher' or is_staff:
+        return [CLASS_CHANNEL]
+    return [STUDENT_CHANNEL.format(user_id)]
+
+
+def channels_for(user):
+    """Students follow their own progress, teachers and staff the whole class"""
+    return _channels(user.id, user.role, user.is_staff)
+
+
+class EventStream:
+    """
+    SSE frames for `user` until the `until` timestamp (the token's expiry),
+    for a StreamingHttpResponse
+
+    Subscribes on first iteration. Django calls close() once the response is
+    over, including when the client went away while a frame was being sent,
+    which never reaches the generator.
+    """
+
+    def __init__(self, user, until, resync=False):
+        self.user_id = user.id
+        self.channels = channels_for(user)
+        self.until = min(until, time.time() + settings.LIVE_MAX_STREAM_SECONDS)
+        self.resync = resync
+        self.subscription = None
+
+    async def allowed(self):
+        """Whether the account is still active and entitled to the same channels"""
+        state = await aget_user_state(self.user_id)
+        if state is None or not state.is_active:
+            return False
+        return _channels(self.user_id, state.role, state.is_staff) == self.channels
+
+    async def __aiter__(self):
+        self.subscription = _broker.subscribe(self.channels)
+        heartbeat = settings.LIVE_HEARTBEAT_SECONDS
+        try:
+            yield f'retry: {settings.LIVE_RETRY_MS}\n\n'.encode()
+            if self.resync:
+                # Reconnected: whatever was sent meanwhile is gone
+                yield RESYNC_FRAME
+            check_at = time.monotonic() + heartbeat
+            while True:
+                remaining = self.until - time.time()
+                if remaining <= 0:
+                    return
+                frame = await self.subscription.get(max(0.0, min(check_at - time.monotonic(), remaining)))
+                if time.monotonic() >= check_at:
+                    if not await self.allowed():
+                        return
+                    check_at = time.monotonic() + heartbeat
+                yield frame if frame is not None else HEARTBEAT_FRAME
+        finally:
+            self.close()
+
+    def close(self):
+        if self.subscription is not None:
+            _broker.unsubscribe(self.subscription)
@@ -0,0 +1,305 @@
+"""
+Load generator and benchmark for the API
+
+Seeds --users students (sharing one password), --subjects subjects of
+--chapters chapters and --progress progress rows per student, then drives
+the register, login, verify, dashboard and update flows with --concurrency
+threads. By default requests go through the Django test client in this
+process, which also counts queries per request; with --target they go over
+HTTP to a running server (e.g. gunicorn) that uses the same database.
+Reports throughput and latency percentiles per flow as JSON with sorted
+keys, so runs on two commits can be diffed. Fixtures are removed afterwards
+unless --keep is given:
+    python manage.py bench_api --users 2000 --requests 500 --concurrency 4 --output before.json
+    gunicorn backend.wsgi -w 4 &
+    python manage.py bench_api --target http://127.0.0.1:8000 --flows verify,dashboard,update
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from http.client import HTTPConnection, HTTPSConnection, HTTPException
+from urllib.parse import urlsplit
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.test import Client
+from django.urls import reverse
+from authentication.models import User
+from authentication.views import get_tokens_for_user
+from progress import catalog, sharding
+from progress.models import Subject, Chapter, VideoProgress
+from progress.services import rebuild_rollups
+from .bench_progress_contention import percentile
+import django
+import json
+import platform
+import random
+import statistics
+import subprocess
+import time
+import uuid
+
+FLOWS = ('register', 'login', 'verify', 'dashboard', 'update')
+
+BENCH_PASSWORD = 'Bench-Passw0rd!'
+
+SEED_BATCH_SIZE = 1000
+
+
+class InProcessClient:
+    """Requests through the test client on this thread's database connection"""
+
+    def __init__(self):
+        self.client = Client()
+        self.queries = 0
+
+    def count_query(self, execute, sql, params, many, context):
+        # Cheaper than CaptureQueriesContext, which logs every statement
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+    def request(self, method, path, body, headers):
+        self.queries = 0
+        with connection.execute_wrapper(self.count_query):
+            if method == 'GET':
+                response = self.client.get(path, headers=headers)
+            else:
+                response = self.client.post(path, data=body, content_type='application/json', headers=headers)
+        return response.status_code, self.queries
+
+    def close(self):
+        close_old_connections()
+
+
+class HttpClient:
+    """Requests over one keep-alive HTTP connection; queries are not counted"""
+
+    def __init__(self, target):
+        parts = urlsplit(target)
+        connection_class = HTTPSConnection if parts.scheme == 'https' else HTTPConnection
+        self.connection = connection_class(parts.hostname, parts.port, timeout=30)
+        self.prefix = parts.path.rstrip('/')
+
+    def request(self, method, path, body, headers):
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode()
+            headers = {**headers, 'Content-Type': 'application/json'}
+        try:
+            self.connection.request(method, self.prefix + path, body=payload, headers=headers)
+            response = self.connection.getresponse()
+            response.read()
+            return response.status, None
+        except (OSError, HTTPException):
+            # Reconnects on the next request
+            self.connection.close()
+            return None, None
+
+    def close(self):
+        self.connection.close()
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, timeout=5, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def summarize(latencies, queries, failures, elapsed):
+    return {
+        'requests': len(latencies),
+        'failures': len(failures),
+        'failure_statuses': {str(status): failures.count(status) for status in set(failures)},
+        'requests_per_sec': round(len(latencies) / elapsed, 1) if elapsed > 0 else 0.0,
+        'latency_ms': {
+            'mean': round(statistics.fmean(latencies), 2) if latencies else 0.0,
+            'p50': round(percentile(latencies, 50), 2),
+            'p95': round(percentile(latencies, 95), 2),
+            'p99': round(percentile(latencies, 99), 2),
+            'max': round(max(latencies, default=0.0), 2),
+        },
+        'queries_per_request': round(statistics.fmean(queries), 2) if queries else None,
+    }
+
+
+class Command(BaseCommand):
+    help = 'Seed data, drive the API flows and report throughput and latency as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='Seeded students')
+        parser.add_argument('--subjects', type=int, default=3)
+        parser.add_argument('--chapters', type=int, default=10, help='Chapters per subject')
+        parser.add_argument('--progress', type=int, default=10, help='Progress rows per student')
+        parser.add_argument('--sessions', type=int, default=100, help='Seeded students that send requests')
+        parser.add_argument('--flows', default=','.join(FLOWS), help=f'Comma-separated, from {", ".join(FLOWS)}')
+        parser.add_argument('--requests', type=int, default=500, help='Timed requests per flow')
+        parser.add_argument('--warmup', type=int, default=20, help='Untimed requests per flow first')
+        parser.add_argument('--concurrency', type=int, default=1, help='Client threads')
+        parser.add_argument('--target', help='Base URL of a running server instead of the test client')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the dataset')
+        parser.add_argument('--label', default='', help='Free text stored in the report')
+        parser.add_argument('--output', help='Write the JSON report here instead of stdout')
+        parser.add_argument('--keep', action='store_true', help='Leave the seeded data in place')
+
+    def seed(self, tag, options):
+        rng = random.Random(options['seed'])
+        password = make_password(BENCH_PASSWORD)
+        users = [
+            User(email=f'bench-{tag}-{number}@example.com', name=f'Bench Student {number}', password=password)
+            for number in range(options['users'])
+        ]
+        User.objects.bulk_create(users, batch_size=SEED_BATCH_SIZE)
+
+        subjects = Subject.objects.bulk_create([
+            Subject(name=f'bench-{tag}-{number}', display_name=f'Bench {number}', order=100 + number)
+            for number in range(options['subjects'])
+        ])
+        chapters = Chapter.objects.bulk_create([
+            Chapter(subject=subject, title=f'Chapter {number}', order=number, total_videos=rng.randint(5, 40))
+            for subject in subjects for number in range(options['chapters'])
+        ], batch_size=SEED_BATCH_SIZE)
+        catalog.bump_generation()
+
+        rows = 0
+        per_user = min(options['progress'], len(chapters))
+        batch = []
+        for user in users:
+            for chapter in rng.sample(chapters, per_user):
+                batch.append(VideoProgress(
+                    student=user, chapter=chapter, videos_watched=rng.randint(0, chapter.total_videos)
+                ))
+            if len(batch) >= SEED_BATCH_SIZE:
+                sharding.bulk_create(batch)
+                rows += len(batch)
+                batch = []
+        sharding.bulk_create(batch)
+        rows += len(batch)
+        rebuild_rollups([subject.id for subject in subjects])
+
+        sessions = [
+            (user, {'Authorization': f"Bearer {get_tokens_for_user(user)['access']}"})
+            for user in users[:max(1, options['sessions'])]
+        ] if users else []
+        return {
+            'subjects': subjects,
+            'chapters': chapters,
+            'sessions': sessions,
+            'dataset': {
+                'users': len(users),
+                'subjects': len(subjects),
+                'chapters': len(chapters),
+                'progress_rows': rows,
+            },
+        }
+
+    def build_request(self, flow, i, tag, fixtures):
+        """(method, path, body, headers, expected status) for request i of a flow"""
+        if flow == 'register':
+            body = {
+                'name': f'Bench Registered {i}',
+                'email': f'bench-{tag}-registered-{i}@example.com',
+                'password': BENCH_PASSWORD,
+                'confirm_password': BENCH_PASSWORD,
+                'role': 'student',
+            }
+            return 'POST', reverse('authentication:register'), body, {}, 201
+        user, headers = fixtures['sessions'][i % len(fixtures['sessions'])]
+        if flow == 'login':
+            body = {'email': user.email, 'password': BENCH_PASSWORD}
+            return 'POST', reverse('authentication:login'), body, {}, 200
+        if flow == 'verify':
+            return 'GET', reverse('authentication:verify'), None, headers, 200
+        if flow == 'dashboard':
+            return 'GET', reverse('progress:dashboard'), None, headers, 200
+        chapter = fixtures['chapters'][i % len(fixtures['chapters'])]
+        body = {'chapter_id': str(chapter.id), 'videos_watched': i % (chapter.total_videos + 1)}
+        return 'POST', reverse('progress:update'), body, headers, 200
+
+    def run_flow(self, flow, tag, fixtures, options):
+        target = options['target']
+        concurrency = max(1, options['concurrency'])
+        latencies = []
+        queries = []
+        failures = []
+
+        def worker(indexes):
+            client = HttpClient(target) if target else InProcessClient()
+            try:
+                for i in indexes:
+                    method, path, body, headers, expected = self.build_request(flow, i, tag, fixtures)
+                    started = time.perf_counter()
+                    status_code, count = client.request(method, path, body, headers)
+                    elapsed = (time.perf_counter() - started) * 1000
+                    # Warmup requests are numbered after the timed ones
+                    if i >= options['requests']:
+                        continue
+                    latencies.append(elapsed)
+                    if count is not None:
+                        queries.append(count)
+                    if status_code != expected:
+                        failures.append(status_code)
+            finally:
+                client.close()
+
+        worker(range(options['requests'], options['requests'] + options['warmup']))
+        started = time.perf_counter()
+        if concurrency == 1:
+            worker(range(options['requests']))
+        else:
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                list(pool.map(worker, [range(index, options['requests'], concurrency) for index in range(concurrency)]))
+        return summarize(latencies, queries, failures, time.perf_counter() - started)
+
+    def handle(self, *args, **options):
+        flows = [flow.strip() for flow in options['flows'].split(',') if flow.strip()]
+        unknown = set(flows) - set(FLOWS)
+        if unknown:
+            raise CommandError(f"Unknown flows: {', '.join(sorted(unknown))}")
+        if options['users'] < 1 and set(flows) - {'register'}:
+            raise CommandError('--users must be at least 1 for flows other than register')
+        if options['subjects'] * options['chapters'] < 1 and 'update' in flows:
+            raise CommandError('--subjects and --chapters must be at least 1 for the update flow')
+
+        tag = uuid.uuid4().hex[:8]
+        started_at = datetime.now(timezone.utc)
+        seed_started = time.perf_counter()
+        fixtures = self.seed(tag, options)
+        seed_elapsed = time.perf_counter() - seed_started
+        try:
+            report = {
+                'meta': {
+                    'label': options['label'],
+                    'commit': git_commit(),
+                    'started_at': started_at.isoformat(),
+                    'target': options['target'] or 'in-process',
+                    'database': connection.vendor,
+                    'python': platform.python_version(),
+                    'django': django.get_version(),
+                },
+                'config': {
+                    'requests': options['requests'],
+                    'warmup': options['warmup'],
+                    'concurrency': options['concurrency'],
+                    'sessions': len(fixtures['sessions']),
+                    'seed': options['seed'],
+                },
+                'dataset': {**fixtures['dataset'], 'seed_s': round(seed_elapsed, 2)},
+                'flows': {flow: self.run_flow(flow, tag, fixtures, options) for flow in flows},
+            }
+        finally:
+            if not options['keep']:
+                User.objects.filter(email__startswith=f'bench-{tag}-').delete()
+                Subject.objects.filter(pk__in=[subject.pk for subject in fixtures['subjects']]).delete()
+                catalog.bump_generation()
+
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as destination:
+                destination.write(output + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+        else:
+            self.stdout.write(output)
@@ -0,0 +1,145 @@
+"""
+Sync-worker vs async throughput for the dashboard at high connection counts
+
+Sends GET dashboard requests for a pool of students through the sync view on
+a fixed pool of --workers threads (one request per worker at a time, like
+sync gunicorn workers) and through the async view with --connections
+requests in flight on one event loop. Dashboards are rebuilt from the
+database on every request, and --db-latency-ms adds a sleep to every query
+to stand in for a slow or remote database. Runs against the configured
+database (migrate first) and removes its fixtures afterwards:
+    python manage.py bench_async --requests 2000 --workers 8 --connections 200 --db-latency-ms 5
+"""
+from asgiref.sync import ThreadSensitiveContext
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from authentication.models import User
+from authentication.views import get_tokens_for_user
+from progress.models import Subject, Chapter
+from .bench_progress_contention import percentile
+import asyncio
+import json
+import statistics
+import time
+import uuid
+
+
+def summarize(latencies, elapsed, failures):
+    return {
+        'requests': len(latencies),
+        'failures': failures,
+        'requests_per_sec': round(len(latencies) / elapsed, 1),
+        'latency_ms': {
+            'mean': round(statistics.fmean(latencies), 2) if latencies else 0.0,
+            'p50': round(percentile(latencies, 50), 2),
+            'p99': round(percentile(latencies, 99), 2),
+        },
+    }
+
+
+class Command(BaseCommand):
+    help = 'Compare sync-worker and async dashboard throughput'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--students', type=int, default=50)
+        parser.add_argument('--workers', type=int, default=8, help='Sync worker threads')
+        parser.add_argument('--connections', type=int, default=200, help='Concurrent async requests')
+        parser.add_argument('--db-latency-ms', type=float, default=0.0, help='Added to every query')
+
+    def run_sync(self, headers, requests, workers):
+        url = reverse('progress:dashboard')
+        latencies = []
+        failures = []
+
+        def worker(index):
+            client = Client()
+            try:
+                for i in range(index, requests, workers):
+                    started = time.perf_counter()
+                    response = client.get(url, headers=headers[i % len(headers)])
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    if response.status_code != 200:
+                        failures.append(response.status_code)
+            finally:
+                close_old_connections()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(worker, range(workers)))
+        return summarize(latencies, time.perf_counter() - started, len(failures))
+
+    async def run_async(self, headers, requests, connections_count):
+        url = reverse('progress:async-dashboard')
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(connections_count)
+        latencies = []
+        failures = []
+
+        async def one(i):
+            async with semaphore:
+                # Per-request sync thread, as ASGIHandler does for each request
+                async with ThreadSensitiveContext():
+                    started = time.perf_counter()
+                    response = await client.get(url, headers=headers[i % len(headers)])
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    if response.status_code != 200:
+                        failures.append(response.status_code)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        return summarize(latencies, time.perf_counter() - started, len(failures))
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        students = [
+            User.objects.create_user(email=f'bench-{tag}-{i}@example.com', name='Bench Student')
+            for i in range(options['students'])
+        ]
+        subject = Subject.objects.create(name=f'bench-{tag}', display_name=f'Bench {tag}')
+        for order in range(10):
+            Chapter.objects.create(subject=subject, title=f'Bench {order}', order=order, total_videos=10)
+        headers = [
+            {'Authorization': f"Bearer {get_tokens_for_user(student)['access']}"}
+            for student in students
+        ]
+
+        delay = options['db_latency_ms'] / 1000
+
+        def slow_query(execute, sql, params, many, context):
+            time.sleep(delay)
+            return execute(sql, params, many, context)
+
+        def install_delay(sender, connection, **kwargs):
+            # Connections are per thread; wrap each one as it connects. The
+            # signal fires again on every reconnect, so wrap only once.
+            if slow_query not in connection.execute_wrappers:
+                connection.execute_wrappers.append(slow_query)
+
+        try:
+            with ExitStack() as stack:
+                # A zero timeout stores nothing, so every request rebuilds from the database
+                stack.enter_context(override_settings(DASHBOARD_CACHE_TIMEOUT=0))
+                if delay:
+                    connection_created.connect(install_delay)
+                    stack.callback(connection_created.disconnect, install_delay)
+                    stack.enter_context(connection.execute_wrapper(slow_query))
+                report = {
+                    'students': options['students'],
+                    'db_latency_ms': options['db_latency_ms'],
+                    'sync': {'workers': options['workers'], **self.run_sync(headers, options['requests'], options['workers'])},
+                    'async': {
+                        'connections': options['connections'],
+                        **asyncio.run(self.run_async(headers, options['requests'], options['connections'])),
+                    },
+                }
+            self.stdout.write(json.dumps(report, indent=2))
+        finally:
+            subject.delete()
+            User.objects.filter(pk__in=[student.pk for student in students]).delete()
@@ -0,0 +1,111 @@
+"""
+Leaderboard benchmark at a large student count
+
+Fills one subject's in-memory ranking with --students synthetic students,
+then times score updates and rank lookups against counting higher scores
+on demand (what ranking from VideoProgress amounts to). With --with-db the
+students and their rollups are also written to the configured database
+(migrate first) to time the full load and the indexed top-N query; those
+fixtures are removed afterwards:
+    python manage.py bench_leaderboard --students 1000000 [--with-db]
+"""
+from datetime import datetime, timezone as dt_timezone
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from authentication.models import User
+from progress.leaderboard import Leaderboard, SubjectRanking
+from progress.models import Subject, StudentSubjectProgress
+from .bench_progress_contention import percentile
+import json
+import random
+import resource
+import time
+import uuid
+
+
+def timed(fn, samples):
+    latencies = []
+    for args in samples:
+        started = time.perf_counter()
+        fn(*args)
+        latencies.append((time.perf_counter() - started) * 1e6)
+    return {
+        'p50_us': round(percentile(latencies, 50), 2),
+        'p99_us': round(percentile(latencies, 99), 2),
+    }
+
+
+class Command(BaseCommand):
+    help = 'Benchmark leaderboard updates, rank lookups and top-N'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=1000000)
+        parser.add_argument('--max-score', type=int, default=300)
+        parser.add_argument('--operations', type=int, default=20000)
+        parser.add_argument('--with-db', action='store_true')
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        students, max_score = options['students'], options['max_score']
+        scores = [rng.randint(0, max_score) for _ in range(students)]
+
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        started = time.perf_counter()
+        ranking = SubjectRanking()
+        for slot, score in enumerate(scores):
+            ranking.set(slot, score)
+        report = {
+            'students': students,
+            'build_s': round(time.perf_counter() - started, 2),
+            'max_rss_growth_mb': round((resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) / 1024, 1),
+        }
+
+        operations = options['operations']
+        updates = [(rng.randrange(students), rng.randint(0, max_score)) for _ in range(operations)]
+        report['update'] = timed(ranking.set, updates)
+        for slot, score in updates:
+            scores[slot] = score
+
+        lookups = [(rng.randrange(students),) for _ in range(operations)]
+        report['rank'] = timed(lambda slot: ranking.rank_of_score(ranking.score(slot)), lookups)
+        report['rank_by_counting'] = timed(
+            lambda slot: 1 + sum(1 for score in scores if score > scores[slot]),
+            lookups[:20]
+        )
+
+        if options['with_db']:
+            report['database'] = self.bench_database(scores)
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def bench_database(self, scores):
+        tag = uuid.uuid4().hex[:8]
+        subject = Subject.objects.create(name=f'bench-{tag}', display_name=f'Bench {tag}')
+        now = datetime.now(dt_timezone.utc)
+        users = [User(email=f'bench-{tag}-{i}@example.com', name=f'Student {i}', password='!') for i in range(len(scores))]
+        try:
+            with transaction.atomic():
+                User.objects.bulk_create(users, batch_size=5000)
+                StudentSubjectProgress.objects.bulk_create(
+                    [
+                        StudentSubjectProgress(student=user, subject=subject, videos_watched=score, updated_at=now)
+                        for user, score in zip(users, scores)
+                    ],
+                    batch_size=5000
+                )
+
+            board = Leaderboard()
+            started = time.perf_counter()
+            board.load()
+            load_s = time.perf_counter() - started
+
+            started = time.perf_counter()
+            top = board.top(subject.id, 10)
+            top_ms = (time.perf_counter() - started) * 1000
+            return {
+                'load_s': round(load_s, 2),
+                'top_10_ms': round(top_ms, 2),
+                'top_ranks': [entry['rank'] for entry in top],
+            }
+        finally:
+            subject.delete()
+            User.objects.filter(email__startswith=f'bench-{tag}-').delete()
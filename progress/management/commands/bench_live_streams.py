@@ -0,0 +1,228 @@
+"""
+Concurrent server-sent event streams in one worker
+
+For each count in --streams, opens that many teacher streams on
+/api/progress/live/ through the ASGI application in this process (the full
+middleware stack and JWT check), all following the class channel, so every
+message fans out to every stream. A second thread then publishes --messages
+messages through progress.live, one every --interval seconds, as the write
+path does after commit, and each stream records how long every message took
+to reach it. --slow of the streams take --slow-ms to accept each frame, as a
+client on a poor connection would; they should get a resync event rather
+than an ever-growing queue. Reports connect time, memory per open stream
+(resident set growth), delivery latency and frames/sec as JSON:
+    python manage.py bench_live_streams --streams 100,1000,5000 --messages 50 --slow 10
+The reading side runs on the same event loop and CPU as the server, so the
+figures are a lower bound for a worker of its own.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.test.utils import override_settings
+from django.urls import reverse
+from authentication.models import User
+from authentication.views import get_tokens_for_user
+from backend.asgi import application
+from progress import live
+from .bench_api import git_commit
+from .bench_progress_contention import percentile
+import asyncio
+import json
+import os
+import statistics
+import time
+import uuid
+
+
+def resident_kb():
+    """Resident set size of this process in KiB, None where /proc is missing"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+    except (OSError, ValueError):
+        return None
+
+
+class Stream:
+    """One client reading the SSE stream from the ASGI app"""
+
+    def __init__(self, token, slow_seconds=0.0):
+        self.token = token
+        self.slow_seconds = slow_seconds
+        self.status = None
+        self.latencies = []
+        self.resyncs = 0
+        self.frames = 0
+        self.last_received = None
+        self._requested = False
+        self._closed = asyncio.Event()
+
+    async def receive(self):
+        if not self._requested:
+            self._requested = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await self._closed.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(self, message):
+        if message['type'] == 'http.response.start':
+            self.status = message['status']
+            return
+        body = message.get('body', b'')
+        if not body:
+            return
+        self.frames += 1
+        if b'event: progress' in body:
+            sent = json.loads(body.split(b'data: ', 1)[1])['sent']
+            self.last_received = time.perf_counter()
+            self.latencies.append((self.last_received - sent) * 1000)
+        elif b'event: resync' in body:
+            self.resyncs += 1
+        if self.slow_seconds:
+            await asyncio.sleep(self.slow_seconds)
+
+    def run(self, path):
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': b'',
+            'root_path': '',
+            'headers': [(b'host', b'localhost'), (b'authorization', f'Bearer {self.token}'.encode())],
+            'client': ('127.0.0.1', 0),
+            'server': ('localhost', 80),
+        }
+        return application(scope, self.receive, self.send)
+
+    def close(self):
+        self._closed.set()
+
+
+class Command(BaseCommand):
+    help = 'Measure how many live progress streams one worker holds and how fast it fans out to them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--streams', default='100,1000', help='Comma-separated stream counts to compare')
+        parser.add_argument('--messages', type=int, default=50, help='Messages published per stream count')
+        parser.add_argument('--interval', type=float, default=0.05, help='Seconds between messages')
+        parser.add_argument('--slow', type=int, default=0, help='Streams that accept frames slowly')
+        parser.add_argument('--slow-ms', type=float, default=200.0, help='Time a slow stream takes per frame')
+        parser.add_argument('--output', help='Write the JSON report here instead of stdout')
+
+    async def run(self, tokens, options):
+        path = reverse('progress:live')
+        broker = live.get_broker()
+        slow = min(options['slow'], len(tokens))
+        streams = [
+            Stream(token, options['slow_ms'] / 1000 if index < slow else 0.0)
+            for index, token in enumerate(tokens)
+        ]
+
+        resident_before = resident_kb()
+        started = time.perf_counter()
+        tasks = [asyncio.ensure_future(stream.run(path)) for stream in streams]
+        while broker.stream_count() < len(streams):
+            failed = [stream.status for stream in streams if stream.status not in (None, 200)]
+            if failed:
+                raise CommandError(f'{len(failed)} streams refused, status {failed[0]}')
+            await asyncio.sleep(0.01)
+        connect_seconds = time.perf_counter() - started
+        # Let the first frames go out before measuring memory
+        await asyncio.sleep(0.2)
+        resident_after = resident_kb()
+
+        def publisher():
+            for number in range(options['messages']):
+                live.publish(live.CLASS_CHANNEL, {'seq': number, 'sent': time.perf_counter()})
+                time.sleep(options['interval'])
+
+        loop = asyncio.get_running_loop()
+        publish_started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            await loop.run_in_executor(pool, publisher)
+        fast = streams[slow:]
+        deadline = time.perf_counter() + 30
+        while any(len(stream.latencies) < options['messages'] for stream in fast) and time.perf_counter() < deadline:
+            await asyncio.sleep(0.01)
+        finished = max((stream.last_received or publish_started for stream in fast), default=publish_started)
+
+        for stream in streams:
+            stream.close()
+        await asyncio.gather(*tasks)
+
+        latencies = [latency for stream in fast for latency in stream.latencies]
+        delivered = sum(len(stream.latencies) for stream in streams)
+        elapsed = finished - publish_started
+        per_stream_kb = None
+        if resident_before is not None and streams:
+            per_stream_kb = round((resident_after - resident_before) / len(streams), 1)
+        return {
+            'connect_s': round(connect_seconds, 2),
+            'connects_per_sec': round(len(streams) / connect_seconds, 1) if connect_seconds > 0 else None,
+            'resident_kb_per_stream': per_stream_kb,
+            'delivered': delivered,
+            'missing': len(fast) * options['messages'] - len(latencies),
+            'frames_per_sec': round(delivered / elapsed, 1) if elapsed > 0 else None,
+            'latency_ms': {
+                'mean': round(statistics.fmean(latencies), 2) if latencies else 0.0,
+                'p50': round(percentile(latencies, 50), 2),
+                'p99': round(percentile(latencies, 99), 2),
+                'max': round(max(latencies, default=0.0), 2),
+            },
+            'slow_streams': {
+                'streams': slow,
+                'resyncs': sum(stream.resyncs for stream in streams[:slow]),
+                'progress_frames': sum(len(stream.latencies) for stream in streams[:slow]),
+            },
+            'open_after_disconnect': broker.stream_count(),
+        }
+
+    def handle(self, *args, **options):
+        try:
+            counts = [int(count) for count in options['streams'].split(',') if count.strip()]
+        except ValueError:
+            raise CommandError(f"Invalid --streams: {options['streams']}")
+        if not counts or min(counts) < 1:
+            raise CommandError('--streams needs counts of at least 1')
+
+        tag = uuid.uuid4().hex[:8]
+        teachers = User.objects.bulk_create([
+            User(email=f'bench-{tag}-{number}@example.com', name='Bench Teacher', role='teacher',
+                 password=make_password(None))
+            for number in range(max(counts))
+        ], batch_size=1000)
+        tokens = [get_tokens_for_user(teacher)['access'] for teacher in teachers]
+
+        results = {}
+        try:
+            with override_settings(LIVE_UPDATES=True, LIVE_MAX_STREAMS=max(counts)):
+                for count in counts:
+                    results[str(count)] = asyncio.run(self.run(tokens[:count], options))
+                    close_old_connections()
+        finally:
+            User.objects.filter(email__startswith=f'bench-{tag}-').delete()
+
+        report = {
+            'meta': {'commit': git_commit()},
+            'config': {
+                'messages': options['messages'],
+                'interval_s': options['interval'],
+                'slow': options['slow'],
+                'slow_ms': options['slow_ms'],
+                'queue_size': settings.LIVE_STREAM_QUEUE_SIZE,
+            },
+            'streams': results,
+        }
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as destination:
+                destination.write(output + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+        else:
+            self.stdout.write(output)
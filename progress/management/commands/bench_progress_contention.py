@@ -0,0 +1,92 @@
+"""
+Contention benchmark for the progress write path
+
+Hammers a single (student, chapter) row from many threads and reports
+IntegrityErrors, other failures and latency percentiles. Runs against the
+configured database (migrate first) and removes its fixtures afterwards:
+    python manage.py bench_progress_contention --threads 200 --updates 5 --monotonic
+"""
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+from django.db import IntegrityError, close_old_connections
+from authentication.models import User
+from progress.models import Subject, Chapter, VideoProgress, StudentSubjectProgress
+from progress.services import record_progress
+import json
+import random
+import statistics
+import time
+import uuid
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark concurrent progress updates to the same row'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=200)
+        parser.add_argument('--updates', type=int, default=5, help='Updates per thread')
+        parser.add_argument('--total-videos', type=int, default=100)
+        parser.add_argument('--monotonic', action='store_true')
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        student = User.objects.create_user(email=f'bench-{tag}@example.com', name='Bench Student')
+        subject = Subject.objects.create(name=f'bench-{tag}', display_name=f'Bench {tag}')
+        chapter = Chapter.objects.create(subject=subject, title='Bench', total_videos=options['total_videos'])
+
+        latencies = []
+        errors = {'integrity': 0, 'other': 0}
+        posted = []
+
+        def worker(_):
+            try:
+                for _ in range(options['updates']):
+                    value = random.randint(0, options['total_videos'])
+                    started = time.perf_counter()
+                    try:
+                        record_progress(student, chapter, value, monotonic=options['monotonic'])
+                        posted.append(value)
+                    except IntegrityError:
+                        errors['integrity'] += 1
+                    except Exception:
+                        errors['other'] += 1
+                    latencies.append((time.perf_counter() - started) * 1000)
+            finally:
+                close_old_connections()
+
+        try:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+                list(pool.map(worker, range(options['threads'])))
+            elapsed = time.perf_counter() - started
+
+            stored = VideoProgress.objects.get(student=student, chapter=chapter).videos_watched
+            rollup = StudentSubjectProgress.objects.get(student=student, subject=subject).videos_watched
+            report = {
+                'threads': options['threads'],
+                'updates': len(latencies),
+                'monotonic': options['monotonic'],
+                'integrity_errors': errors['integrity'],
+                'other_errors': errors['other'],
+                'updates_per_sec': round(len(latencies) / elapsed, 1),
+                'latency_ms': {
+                    'mean': round(statistics.fmean(latencies), 2) if latencies else 0.0,
+                    'p50': round(percentile(latencies, 50), 2),
+                    'p99': round(percentile(latencies, 99), 2),
+                    'max': round(max(latencies, default=0.0), 2),
+                },
+                'stored_videos_watched': stored,
+                'rollup_consistent': stored == rollup,
+                'monotonic_holds': not options['monotonic'] or stored == max(posted, default=0),
+            }
+            self.stdout.write(json.dumps(report, indent=2))
+        finally:
+            subject.delete()
+            student.delete()
@@ -0,0 +1,144 @@
+"""
+Write throughput of hash-sharded VideoProgress storage
+
+For each shard count in --shards, creates that many throwaway SQLite
+databases in --dir holding only the video_progress table, and has --writers
+threads upsert progress for --students random students (one transaction per
+write, routed by progress.sharding) until --writes writes are done. SQLite
+allows one writer per database file, so with one shard every writer queues
+on the same lock, as they would on one primary's disk; the report shows how
+writes/sec grow with the shard count:
+    python manage.py bench_progress_shards --shards 1,2,4 --writers 8 --writes 4000 --dir /var/tmp
+Only the VideoProgress upsert is measured: rollups and events stay on the
+primary and do not shard. Put --dir on a real disk, not tmpfs, or commits
+cost nothing and there is little lock time to spread.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from progress.models import VideoProgress
+from progress.services import upsert_progress
+from progress.sharding import shard_for
+from .bench_api import git_commit
+from .bench_progress_contention import percentile
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+import uuid
+
+
+def add_shard(alias, path):
+    """Register a SQLite alias at `path` and create video_progress in it"""
+    connections.settings[alias] = connections.configure_settings({
+        DEFAULT_DB_ALIAS: {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': path,
+            'OPTIONS': {'transaction_mode': 'IMMEDIATE', 'timeout': 60},
+        }
+    })[DEFAULT_DB_ALIAS]
+    with connections[alias].schema_editor() as editor:
+        editor.create_model(VideoProgress)
+
+
+def remove_shard(alias):
+    connections[alias].close()
+    del connections[alias]
+    del connections.settings[alias]
+
+
+class Command(BaseCommand):
+    help = 'Measure VideoProgress write throughput against the number of shards'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shards', default='1,2,4', help='Comma-separated shard counts to compare')
+        parser.add_argument('--writers', type=int, default=8, help='Writer threads')
+        parser.add_argument('--writes', type=int, default=2000, help='Writes per shard count')
+        parser.add_argument('--students', type=int, default=1000)
+        parser.add_argument('--chapters', type=int, default=30)
+        parser.add_argument('--dir', help='Directory for the shard files (default: a temporary directory)')
+        parser.add_argument('--output', help='Write the JSON report here instead of stdout')
+
+    def run(self, aliases, students, chapters, options):
+        writers = max(1, options['writers'])
+        latencies = []
+        per_shard = dict.fromkeys(aliases, 0)
+
+        def worker(count):
+            rng = random.Random()
+            try:
+                for _ in range(count):
+                    student_id = rng.choice(students)
+                    alias = shard_for(student_id, aliases)
+                    started = time.perf_counter()
+                    with transaction.atomic(using=alias):
+                        upsert_progress({(student_id, rng.choice(chapters)): rng.randint(0, 50)}, using=alias)
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    per_shard[alias] += 1
+            finally:
+                connections.close_all()
+
+        counts = [options['writes'] // writers + (index < options['writes'] % writers) for index in range(writers)]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=writers) as pool:
+            list(pool.map(worker, counts))
+        elapsed = time.perf_counter() - started
+        return {
+            'writes': len(latencies),
+            'writes_per_sec': round(len(latencies) / elapsed, 1) if elapsed > 0 else 0.0,
+            'latency_ms': {
+                'mean': round(statistics.fmean(latencies), 2) if latencies else 0.0,
+                'p50': round(percentile(latencies, 50), 2),
+                'p95': round(percentile(latencies, 95), 2),
+                'p99': round(percentile(latencies, 99), 2),
+            },
+            'writes_per_shard': per_shard,
+        }
+
+    def handle(self, *args, **options):
+        try:
+            shard_counts = [int(count) for count in options['shards'].split(',') if count.strip()]
+        except ValueError:
+            raise CommandError(f"Invalid --shards: {options['shards']}")
+        if not shard_counts or min(shard_counts) < 1:
+            raise CommandError('--shards needs counts of at least 1')
+
+        rng = random.Random(0)
+        students = [uuid.UUID(int=rng.getrandbits(128), version=4) for _ in range(max(1, options['students']))]
+        chapters = [uuid.UUID(int=rng.getrandbits(128), version=4) for _ in range(max(1, options['chapters']))]
+
+        results = {}
+        with tempfile.TemporaryDirectory(dir=options['dir'], prefix='bench-shards-') as directory:
+            for count in shard_counts:
+                aliases = [f'bench_shard_{count}_{number}' for number in range(1, count + 1)]
+                for alias in aliases:
+                    add_shard(alias, os.path.join(directory, f'{alias}.sqlite3'))
+                try:
+                    results[str(count)] = self.run(aliases, students, chapters, options)
+                finally:
+                    for alias in aliases:
+                        remove_shard(alias)
+
+        baseline = results[str(shard_counts[0])]['writes_per_sec']
+        for result in results.values():
+            result['speedup'] = round(result['writes_per_sec'] / baseline, 2) if baseline else None
+
+        report = {
+            'meta': {'commit': git_commit(), 'database': 'sqlite'},
+            'config': {
+                'writers': options['writers'],
+                'writes': options['writes'],
+                'students': len(students),
+                'chapters': len(chapters),
+            },
+            'shards': results,
+        }
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as destination:
+                destination.write(output + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+        else:
+            self.stdout.write(output)
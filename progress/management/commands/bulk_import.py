@@ -0,0 +1,36 @@
+"""
+Import a roster of users or a chapter catalog from CSV or NDJSON
+
+Rosters need email and name columns (role and password optional); catalogs
+need subject, title and total_videos (order and subject_display_name
+optional). Existing rows are skipped unless --update is given:
+    python manage.py bulk_import roster students.csv --hash-workers 4
+    python manage.py bulk_import catalog chapters.ndjson --update
+"""
+from django.core.management.base import BaseCommand
+from progress.importing import IMPORT_BATCH_SIZE, import_catalog, import_roster
+import json
+
+
+class Command(BaseCommand):
+    help = 'Bulk import users or chapters and report rows/sec'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=['roster', 'catalog'])
+        parser.add_argument('path', help='.csv, or .ndjson / .jsonl with one object per line')
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+        parser.add_argument('--update', action='store_true', help='Overwrite existing rows instead of skipping them')
+        parser.add_argument(
+            '--hash-workers', type=int, default=None,
+            help='Password hashing processes (default: CPU count, 0 = hash in this process)'
+        )
+
+    def handle(self, *args, **options):
+        if options['kind'] == 'roster':
+            report = import_roster(
+                options['path'], batch_size=options['batch_size'],
+                hash_workers=options['hash_workers'], update=options['update']
+            )
+        else:
+            report = import_catalog(options['path'], batch_size=options['batch_size'], update=options['update'])
+        self.stdout.write(json.dumps(report.as_dict(), indent=2))
@@ -0,0 +1,28 @@
+"""
+Roll progress events into daily totals and prune old raw events
+
+Schedule daily, after midnight:
+    python manage.py compact_progress_events [--through 2026-10-17] [--retention-days 30]
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from progress.history import compact_events, prune_events
+
+
+class Command(BaseCommand):
+    help = 'Compact ProgressEvent rows into DailyProgress and prune expired events'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--through', help='Last day to compact (default: yesterday)')
+        parser.add_argument('--retention-days', type=int, default=None)
+
+    def handle(self, *args, **options):
+        through = None
+        if options['through']:
+            through = parse_date(options['through'])
+            if through is None:
+                raise CommandError(f"Invalid date: {options['through']}")
+
+        written = compact_events(through)
+        deleted = prune_events(options['retention_days'])
+        self.stdout.write(self.style.SUCCESS(f"Compacted {written} daily rows, pruned {deleted} events"))
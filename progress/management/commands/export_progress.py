@@ -0,0 +1,37 @@
+"""
+Stream VideoProgress rows to a file or stdout as NDJSON or CSV
+
+Memory stays constant whatever the table size:
+    python manage.py export_progress --output csv --subject physics --since 2026-01-01 --file progress.csv
+"""
+from django.core.management.base import BaseCommand, CommandError
+from progress.export import EXPORT_CHUNK_SIZE, OUTPUT_CONTENT_TYPES, export_rows, parse_bound, stream_export
+
+
+class Command(BaseCommand):
+    help = 'Export video progress joined with student and chapter data'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', choices=sorted(OUTPUT_CONTENT_TYPES), default='ndjson')
+        parser.add_argument('--subject', help='Subject name')
+        parser.add_argument('--since', help='ISO date or datetime, inclusive')
+        parser.add_argument('--until', help='ISO date (whole day included) or datetime, exclusive')
+        parser.add_argument('--file', help='Write here instead of stdout')
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            since = parse_bound(options['since'])
+            until = parse_bound(options['until'], end=True)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        rows = export_rows(options['subject'], since, until, chunk_size=options['chunk_size'])
+        chunks = stream_export(options['output'], rows, chunk_size=options['chunk_size'])
+        if options['file']:
+            with open(options['file'], 'w', encoding='utf-8', newline='') as destination:
+                for chunk in chunks:
+                    destination.write(chunk)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
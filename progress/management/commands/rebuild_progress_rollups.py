@@ -0,0 +1,32 @@
+"""
+Recompute per-student subject rollups from VideoProgress
+
+Run after bulk edits to VideoProgress or Chapter.total_videos, or to repair drift:
+    python manage.py rebuild_progress_rollups [--subject physics ...]
+"""
+from django.core.management.base import BaseCommand, CommandError
+from progress.models import Subject
+from progress.services import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute StudentSubjectProgress rollups from VideoProgress'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--subject', action='append', dest='subjects',
+            help='Subject name to rebuild (repeatable, default: all)'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        subject_ids = None
+        if options['subjects']:
+            subjects = dict(Subject.objects.filter(name__in=options['subjects']).values_list('name', 'id'))
+            missing = set(options['subjects']) - set(subjects)
+            if missing:
+                raise CommandError(f"Unknown subject(s): {', '.join(sorted(missing))}")
+            subject_ids = list(subjects.values())
+
+        changed = rebuild_rollups(subject_ids, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rollups: {changed} changed"))
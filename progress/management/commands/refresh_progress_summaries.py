@@ -0,0 +1,16 @@
+"""
+Recompute the teacher analytics completion summaries
+
+Schedule periodically (e.g. every 15 minutes from cron):
+    python manage.py refresh_progress_summaries
+"""
+from django.core.management.base import BaseCommand
+from progress.analytics import refresh_summaries
+
+
+class Command(BaseCommand):
+    help = 'Recompute chapter and subject completion summaries'
+
+    def handle(self, *args, **options):
+        refreshed_at = refresh_summaries()
+        self.stdout.write(self.style.SUCCESS(f"Refreshed completion summaries at {refreshed_at.isoformat()}"))
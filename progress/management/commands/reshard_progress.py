@@ -0,0 +1,46 @@
+"""
+Move VideoProgress rows onto their students' shards
+
+Run after turning sharding on (rows still on the primary) and after
+appending a shard to PROGRESS_SHARD_URLS (about 1/N of the students move),
+then rebuilds the rollups (writes during the move can leave them off):
+    python manage.py reshard_progress [--dry-run] [--drain old_shard]
+Until it finishes, moving students' dashboards miss rows still on their old
+shard, and their writes in that window are kept over the copied rows.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from progress.services import rebuild_rollups
+from progress.sharding import RESHARD_BATCH_SIZE, reshard
+
+
+class Command(BaseCommand):
+    help = 'Move VideoProgress rows to the shard their student hashes to'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Count the rows that would move')
+        parser.add_argument(
+            '--drain', action='append', default=[],
+            help='Also move every row off this database alias, e.g. a shard being retired (repeatable)'
+        )
+        parser.add_argument('--batch-size', type=int, default=RESHARD_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if not settings.PROGRESS_SHARDS:
+            raise CommandError('PROGRESS_SHARDS is empty; set PROGRESS_SHARD_URLS first')
+        unknown = [alias for alias in options['drain'] if alias not in connections.databases]
+        if unknown:
+            raise CommandError(f"Unknown database alias(es): {', '.join(unknown)}")
+
+        sources = [DEFAULT_DB_ALIAS, *settings.PROGRESS_SHARDS, *options['drain']]
+        moved = reshard(sources=sources, batch_size=options['batch_size'], dry_run=options['dry_run'])
+        for (source, target), rows in sorted(moved.items()):
+            self.stdout.write(f"{source} -> {target}: {rows} rows")
+
+        total = sum(moved.values())
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f"Would move {total} rows"))
+            return
+        changed = rebuild_rollups(batch_size=options['batch_size']) if total else 0
+        self.stdout.write(self.style.SUCCESS(f"Moved {total} rows, {changed} rollups changed"))
@@ -0,0 +1,53 @@
+# Generated by Django 6.0 on 2026-10-18 02:57
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def backfill_rollups(apps, schema_editor):
+    VideoProgress = apps.get_model('progress', 'VideoProgress')
+    StudentSubjectProgress = apps.get_model('progress', 'StudentSubjectProgress')
+    alias = schema_editor.connection.alias
+    totals = (
+        VideoProgress.objects.using(alias)
+        .values('student_id', 'chapter__subject_id')
+        .annotate(total=Sum('videos_watched'))
+        .order_by()
+    )
+    StudentSubjectProgress.objects.using(alias).bulk_create([
+        StudentSubjectProgress(
+            student_id=row['student_id'],
+            subject_id=row['chapter__subject_id'],
+            videos_watched=row['total'],
+        )
+        for row in totals.iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('progress', '0002_catalog_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentSubjectProgress',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('videos_watched', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subject_progress', to=settings.AUTH_USER_MODEL)),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='student_progress', to='progress.subject')),
+            ],
+            options={
+                'db_table': 'student_subject_progress',
+                'unique_together': {('student', 'subject')},
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop, hints={'model_name': 'studentsubjectprogress'}),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 6.0 on 2026-10-18 09:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('progress', '0003_student_subject_progress'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChapterCompletionSummary',
+            fields=[
+                ('students', models.IntegerField(default=0)),
+                ('not_started', models.IntegerField(default=0)),
+                ('completed', models.IntegerField(default=0)),
+                ('mean_percentage', models.FloatField(default=0)),
+                ('median_percentage', models.FloatField(default=0)),
+                ('buckets', models.JSONField(default=dict)),
+                ('refreshed_at', models.DateTimeField()),
+                ('chapter', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='completion_summary', serialize=False, to='progress.chapter')),
+            ],
+            options={
+                'db_table': 'chapter_completion_summary',
+            },
+        ),
+        migrations.CreateModel(
+            name='SubjectCompletionSummary',
+            fields=[
+                ('students', models.IntegerField(default=0)),
+                ('not_started', models.IntegerField(default=0)),
+                ('completed', models.IntegerField(default=0)),
+                ('mean_percentage', models.FloatField(default=0)),
+                ('median_percentage', models.FloatField(default=0)),
+                ('buckets', models.JSONField(default=dict)),
+                ('refreshed_at', models.DateTimeField()),
+                ('subject', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='completion_summary', serialize=False, to='progress.subject')),
+            ],
+            options={
+                'db_table': 'subject_completion_summary',
+            },
+        ),
+    ]
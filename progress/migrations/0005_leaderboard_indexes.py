@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-18 10:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('progress', '0004_completion_summaries'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='studentsubjectprogress',
+            index=models.Index(fields=['subject', '-videos_watched', 'student'], name='ssp_subject_rank_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studentsubjectprogress',
+            index=models.Index(fields=['updated_at'], name='ssp_updated_at_idx'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 6.0 on 2026-10-18 11:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('progress', '0005_leaderboard_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventCompaction',
+            fields=[
+                ('id', models.IntegerField(default=1, editable=False, primary_key=True, serialize=False)),
+                ('compacted_through', models.DateField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'event_compaction',
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyProgress',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('day', models.DateField()),
+                ('videos_gained', models.IntegerField(default=0)),
+                ('net_change', models.IntegerField(default=0)),
+                ('events', models.IntegerField(default=0)),
+                ('chapter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_progress', to='progress.chapter')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_progress', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'daily_progress',
+                'indexes': [models.Index(fields=['student', 'day'], name='daily_progress_student_idx')],
+                'unique_together': {('student', 'chapter', 'day')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ProgressEvent',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('videos_watched', models.IntegerField()),
+                ('delta', models.IntegerField()),
+                ('created_at', models.DateTimeField(db_index=True)),
+                ('chapter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='progress_events', to='progress.chapter')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='progress_events', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'progress_events',
+                'indexes': [models.Index(fields=['student', 'created_at'], name='progress_event_student_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 6.0 on 2026-10-18 12:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('progress', '0006_progress_event_log'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chapter',
+            index=models.Index(fields=['subject', 'order', 'title'], name='chapter_subject_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='videoprogress',
+            index=models.Index(fields=['student', 'chapter', 'videos_watched'], name='vp_student_covering_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='videoprogress',
+            index=models.Index(fields=['chapter', 'last_watched_at'], name='vp_chapter_watched_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='videoprogress',
+            index=models.Index(fields=['last_watched_at'], name='vp_last_watched_idx'),
+        ),
+        # Drop the single-column foreign key indexes only once the composites exist
+        migrations.AlterField(
+            model_name='chapter',
+            name='subject',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='chapters', to='progress.subject'),
+        ),
+        migrations.AlterField(
+            model_name='videoprogress',
+            name='chapter',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='progress', to='progress.chapter'),
+        ),
+        migrations.AlterField(
+            model_name='videoprogress',
+            name='student',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='video_progress', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-18 17:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('progress', '0010_video_progress_sync_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='videoprogress',
+            name='vp_student_covering_idx',
+        ),
+        migrations.AddIndex(
+            model_name='videoprogress',
+            index=models.Index(fields=['student', 'chapter', 'videos_watched', 'last_watched_at', 'created_at'], name='vp_student_covering_idx'),
+        ),
+    ]
@@ -40,7 +40,8 @@ class Subject(models.Model):
 class Chapter(models.Model):
     """Chapter model for each subject"""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name='chapters')
+    # chapter_subject_order_idx leads with subject
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name='chapters', db_index=False)
     title = models.CharField(max_length=200)
     order = models.IntegerField(default=0)
     total_videos = models.IntegerField(default=0)
@@ -51,6 +52,10 @@ class Chapter(models.Model):
         db_table = 'chapters'
         ordering = ['subject', 'order', 'title']
         unique_together = ['subject', 'title']
+        indexes = [
+            # Chapters of a subject in display order, without a sort
+            models.Index(fields=['subject', 'order', 'title'], name='chapter_subject_order_idx'),
+        ]
     
     def __str__(self):
         return f"{self.subject.display_name} - {self.title}"
@@ -59,12 +64,20 @@ class Chapter(models.Model):
 class VideoProgress(models.Model):
     """Track video watch progress for each student"""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    # The composite indexes below lead with these columns, so the
+    # single-column foreign key indexes would be redundant. Only the primary
+    # has the database constraints: PROGRESS_SHARDS databases hold no users
+    # or chapters (progress.sharding, migration 0009).
     student = models.ForeignKey(
         settings.AUTH_USER_MODEL, 
         on_delete=models.CASCADE, 
-        related_name='video_progress'
+        related_name='video_progress',
+        db_index=False,
+        db_constraint=False
+    )
+    chapter = models.ForeignKey(
+        Chapter, on_delete=models.CASCADE, related_name='progress', db_index=False, db_constraint=False
     )
-    chapter = models.ForeignKey(Chapter, on_delete=models.CASCADE, related_name='progress')
     videos_watched = models.IntegerField(default=0)
     last_watched_at = models.DateTimeField(auto_now=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -72,6 +85,19 @@ class VideoProgress(models.Model):
     class Meta:
         db_table = 'video_progress'
         unique_together = ['student', 'chapter']
+        indexes = [
+            # Dashboard, delta sync and write path: a student's rows, answered
+            # from the index alone (including what sync needs to find changed
+            # and deleted rows)
+            models.Index(
+                fields=['student', 'chapter', 'videos_watched', 'last_watched_at', 'created_at'],
+                name='vp_student_covering_idx'
+            ),
+            # Rows of a subject's chapters, optionally within a last_watched_at range (admin, export)
+            models.Index(fields=['chapter', 'last_watched_at'], name='vp_chapter_watched_idx'),
+            # Admin date filter and export date range across all subjects
+            models.Index(fields=['last_watched_at'], name='vp_last_watched_idx'),
+        ]
     
     def __str__(self):
         return f"{self.student.name} - {self.chapter.title} ({self.videos_watched}/{self.chapter.total_videos})"
@@ -80,4 +106,181 @@ class VideoProgress(models.Model):
     def percentage(self):
         if self.chapter.total_videos == 0:
             return 0
-        return round((self.videos_watched / self.chapter.total_videos) * 100, 1)
\ No newline at end of file
+        return round((self.videos_watched / self.chapter.total_videos) * 100, 1)
+
+
+class StudentSubjectProgress(models.Model):
+    """Per-student rollup of videos watched in each subject"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    student = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='subject_progress'
+    )
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name='student_progress')
+    videos_watched = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'student_subject_progress'
+        unique_together = ['student', 'subject']
+        indexes = [
+            # Leaderboard top-N and incremental sync
+            models.Index(fields=['subject', '-videos_watched', 'student'], name='ssp_subject_rank_idx'),
+            models.Index(fields=['updated_at'], name='ssp_updated_at_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.student_id} - {self.subject_id} ({self.videos_watched})"
+
+
+class CatalogVersion(models.Model):
+    """Single-row generation counter, bumped on every Subject/Chapter edit"""
+    id = models.IntegerField(primary_key=True, default=1, editable=False)
+    generation = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'catalog_version'
+    
+    def __str__(self):
+        return f"Catalog generation {self.generation}"
+
+
+class CompletionSummary(models.Model):
+    """Completion distribution across all students, refreshed by analytics.refresh_summaries()"""
+    students = models.IntegerField(default=0)
+    not_started = models.IntegerField(default=0)
+    completed = models.IntegerField(default=0)
+    mean_percentage = models.FloatField(default=0)
+    median_percentage = models.FloatField(default=0)
+    # Bucket label -> number of students, see analytics.BUCKETS
+    buckets = models.JSONField(default=dict)
+    refreshed_at = models.DateTimeField()
+    
+    class Meta:
+        abstract = True
+
+
+class ChapterCompletionSummary(CompletionSummary):
+    chapter = models.OneToOneField(Chapter, on_delete=models.CASCADE, primary_key=True, related_name='completion_summary')
+    
+    class Meta:
+        db_table = 'chapter_completion_summary'
+    
+    def __str__(self):
+        return f"{self.chapter_id} summary ({self.students} students)"
+
+
+class SubjectCompletionSummary(CompletionSummary):
+    subject = models.OneToOneField(Subject, on_delete=models.CASCADE, primary_key=True, related_name='completion_summary')
+    
+    class Meta:
+        db_table = 'subject_completion_summary'
+    
+    def __str__(self):
+        return f"{self.subject_id} summary ({self.students} students)"
+
+
+class ProgressEvent(models.Model):
+    """Append-only log of videos_watched changes, pruned after compaction"""
+    id = models.BigAutoField(primary_key=True)
+    student = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='progress_events')
+    chapter = models.ForeignKey(Chapter, on_delete=models.CASCADE, related_name='progress_events')
+    videos_watched = models.IntegerField()
+    # Change from the previously stored value
+    delta = models.IntegerField()
+    created_at = models.DateTimeField(db_index=True)
+    
+    class Meta:
+        db_table = 'progress_events'
+        indexes = [
+            models.Index(fields=['student', 'created_at'], name='progress_event_student_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.student_id} - {self.chapter_id} {self.delta:+d} at {self.created_at}"
+
+
+class DailyProgress(models.Model):
+    """Per-student, per-chapter, per-day totals compacted from ProgressEvent"""
+    id = models.BigAutoField(primary_key=True)
+    student = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='daily_progress')
+    chapter = models.ForeignKey(Chapter, on_delete=models.CASCADE, related_name='daily_progress')
+    day = models.DateField()
+    videos_gained = models.IntegerField(default=0)
+    net_change = models.IntegerField(default=0)
+    events = models.IntegerField(default=0)
+    
+    class Meta:
+        db_table = 'daily_progress'
+        unique_together = ['student', 'chapter', 'day']
+        indexes = [
+            models.Index(fields=['student', 'day'], name='daily_progress_student_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.student_id} - {self.chapter_id} on {self.day} (+{self.videos_gained})"
+
+
+class EventCompaction(models.Model):
+    """Single row: last day whose events are compacted into DailyProgress"""
+    id = models.IntegerField(primary_key=True, default=1, editable=False)
+    compacted_through = models.DateField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'event_compaction'
+    
+    def __str__(self):
+        return f"Events compacted through {self.compacted_through}"
+
+
+class RequestProfile(models.Model):
+    """A profiled request, stored by profiling.ProfilingMiddleware"""
+    MODE_CHOICES = (
+        ('cprofile', 'cProfile (pstats)'),
+        ('sample', 'Stack sampler (collapsed stacks)'),
+    )
+    
+    TRIGGER_CHOICES = (
+        ('requested', 'Requested by staff'),
+        ('sampled', 'Random sample'),
+    )
+    
+    id = models.BigAutoField(primary_key=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=500)
+    query_string = models.TextField(blank=True)
+    view_name = models.CharField(max_length=200, blank=True)
+    status_code = models.IntegerField()
+    duration_ms = models.FloatField()
+    mode = models.CharField(max_length=10, choices=MODE_CHOICES)
+    trigger = models.CharField(max_length=10, choices=TRIGGER_CHOICES)
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    # Top functions (cprofile) or stacks (sample), shown in the admin
+    summary = models.TextField(blank=True)
+    # pstats (marshal) for cprofile, collapsed stacks for sample
+    data = models.BinaryField()
+    
+    class Meta:
+        db_table = 'request_profiles'
+        ordering = ['-created_at']
+        indexes = [
+            # Keeping the slowest sampled profiles per view
+            models.Index(fields=['view_name', 'trigger', '-duration_ms'], name='request_profile_slowest_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms}ms, {self.mode})"
+    
+    @property
+    def filename(self):
+        return f"profile-{self.id}.{'prof' if self.mode == 'cprofile' else 'folded'}"
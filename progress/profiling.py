@@ -0,0 +1,260 @@
+"""
+On-demand request profiling
+
+Staff can profile a single request by sending "X-Profile: cprofile" (a
+deterministic cProfile run, stored as pstats) or "X-Profile: sample" (a
+stack sampler, stored as collapsed stacks for flamegraph.pl or speedscope),
+or the same value in a ?_profile= query parameter. Staff is checked against
+the session user or the request's JWT; for anyone else the flag is ignored.
+The stored RequestProfile's id comes back in X-Profile-Id, and the profile
+can be downloaded from the admin.
+
+With PROFILE_SAMPLE_RATE above 0 that fraction of all requests is also
+profiled with the sampler, keeping only the PROFILE_KEEP_SLOWEST slowest
+profiles per view.
+
+Under ASGI the event loop thread is profiled, so ORM work that async views
+run through sync_to_async does not show up.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from collections import Counter
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from rest_framework.exceptions import AuthenticationFailed
+from authentication.authentication import ClaimsJWTAuthentication
+from .models import RequestProfile
+import cProfile
+import io
+import logging
+import marshal
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_PARAM = '_profile'
+
+SUMMARY_LINES = 40
+
+
+class CProfiler:
+    """Deterministic profile of the calling thread, stored as pstats"""
+    mode = 'cprofile'
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+
+    def dump(self):
+        # The format pstats.Stats() and snakeviz load from a file
+        self.profile.create_stats()
+        return marshal.dumps(self.profile.stats)
+
+    def summary(self):
+        out = io.StringIO()
+        pstats.Stats(self.profile, stream=out).sort_stats('cumulative').print_stats(SUMMARY_LINES)
+        return out.getvalue()
+
+
+class StackSampler:
+    """Samples the calling thread's stack from a helper thread every `interval` seconds"""
+    mode = 'sample'
+
+    def __init__(self, interval=None):
+        self.interval = interval or settings.PROFILE_SAMPLE_INTERVAL
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+        self._target = None
+
+    def start(self):
+        self._target = threading.get_ident()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if frames:
+                self.stacks[';'.join(reversed(frames))] += 1
+
+    def dump(self):
+        """Collapsed stacks, one "frame;frame;... count" line per stack"""
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common()).encode()
+
+    def summary(self):
+        total = sum(self.stacks.values())
+        lines = [f'{total} samples every {self.interval * 1000:g}ms']
+        for stack, count in self.stacks.most_common(SUMMARY_LINES):
+            lines.append(f'{count:6d}  {stack.rsplit(";", 1)[-1]}  <-  {stack}')
+        return '\n'.join(lines)
+
+
+PROFILERS = {profiler.mode: profiler for profiler in (CProfiler, StackSampler)}
+
+
+def staff_user(request):
+    """The staff user making the request (session or JWT), or None"""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated and user.is_staff:
+        return user
+    try:
+        result = ClaimsJWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return None
+    if result is not None and result[0].is_staff:
+        return result[0]
+    return None
+
+
+def _profile_flag(request):
+    return request.headers.get(PROFILE_HEADER) or request.GET.get(PROFILE_PARAM)
+
+
+def _requested(request, flag):
+    """(mode, user) when a staff user asked for a profile, else (None, None)"""
+    user = staff_user(request)
+    if user is None:
+        return None, None
+    flag = flag.lower()
+    return (flag if flag in PROFILERS else CProfiler.mode), user
+
+
+def _sampled():
+    rate = settings.PROFILE_SAMPLE_RATE
+    return rate > 0 and random.random() < rate
+
+
+def _among_slowest(view_name, duration_ms, keep):
+    kept = (
+        RequestProfile.objects
+        .filter(view_name=view_name, trigger='sampled')
+        .order_by('-duration_ms')
+        .values_list('duration_ms', flat=True)
+    )
+    threshold = kept[keep - 1:keep].first()
+    return threshold is None or duration_ms > threshold
+
+
+def save_profile(request, response, profiler, trigger, duration, user=None):
+    """Store a finished profile; sampled ones only if among the slowest for their view"""
+    match = request.resolver_match
+    view_name = match.view_name if match is not None else ''
+    duration_ms = round(duration * 1000, 2)
+    keep = settings.PROFILE_KEEP_SLOWEST
+    if trigger == 'sampled' and not _among_slowest(view_name, duration_ms, keep):
+        return None
+
+    profile = RequestProfile.objects.create(
+        method=request.method,
+        path=request.path[:500],
+        query_string=request.META.get('QUERY_STRING', ''),
+        view_name=view_name,
+        status_code=response.status_code,
+        duration_ms=duration_ms,
+        mode=profiler.mode,
+        trigger=trigger,
+        requested_by_id=user.pk if user is not None else None,
+        summary=profiler.summary(),
+        data=profiler.dump(),
+    )
+    if trigger == 'sampled':
+        dropped = (
+            RequestProfile.objects
+            .filter(view_name=view_name, trigger='sampled')
+            .order_by('-duration_ms')
+            .values_list('id', flat=True)[keep:]
+        )
+        RequestProfile.objects.filter(id__in=list(dropped)).delete()
+    return profile
+
+
+class ProfilingMiddleware:
+    """
+    Runs flagged staff requests (and random samples) under a profiler
+
+    Place after AuthenticationMiddleware. Requests without the flag cost a
+    header lookup (and a random() call when sampling is on). Disabled with
+    REQUEST_PROFILING=False.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_PROFILING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        mode, user, trigger = None, None, None
+        flag = _profile_flag(request)
+        if flag:
+            mode, user = _requested(request, flag)
+            trigger = 'requested'
+        if mode is None and _sampled():
+            mode, trigger = StackSampler.mode, 'sampled'
+        if mode is None:
+            return self.get_response(request)
+
+        profiler = PROFILERS[mode]()
+        started = time.perf_counter()
+        profiler.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.stop()
+        return self.store(request, response, profiler, trigger, time.perf_counter() - started, user)
+
+    async def __acall__(self, request):
+        mode, user, trigger = None, None, None
+        flag = _profile_flag(request)
+        if flag:
+            mode, user = await sync_to_async(_requested)(request, flag)
+            trigger = 'requested'
+        if mode is None and _sampled():
+            mode, trigger = StackSampler.mode, 'sampled'
+        if mode is None:
+            return await self.get_response(request)
+
+        profiler = PROFILERS[mode]()
+        started = time.perf_counter()
+        profiler.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            profiler.stop()
+        return await sync_to_async(self.store)(request, response, profiler, trigger, time.perf_counter() - started, user)
+
+    def store(self, request, response, profiler, trigger, duration, user):
+        try:
+            profile = save_profile(request, response, profiler, trigger, duration, user)
+        except Exception as e:
+            logger.error(f"Profile save error: {str(e)}", exc_info=True)
+            return response
+        if profile is not None and trigger == 'requested':
+            response['X-Profile-Id'] = str(profile.id)
+        return response
@@ -0,0 +1,318 @@
+"""
+Progress write path
+
+Keeps VideoProgress and the per-subject StudentSubjectProgress rollup in step.
+A write first creates-or-locks the student's rollup rows for the subjects it
+touches, which serialises concurrent writers for the same (student, subject).
+VideoProgress is then written with one INSERT ... ON CONFLICT DO UPDATE
+statement, and the change in videos_watched is added to the rollup by delta,
+all in one transaction.
+
+With PROGRESS_SHARDS (progress.sharding) VideoProgress rows are written on
+the students' shards, in transactions nested in the primary's, so a failure
+anywhere before the end rolls back both; the shards commit just before the
+primary does.
+"""
+from contextlib import ExitStack
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+from backend import routers
+from . import caching, history, leaderboard, live, sharding, writebehind
+from .models import Chapter, VideoProgress, StudentSubjectProgress
+import uuid
+
+
+UPSERT_CHUNK_SIZE = 500
+
+
+def _lock_rollups(pairs):
+    """Create-or-lock (student_id, subject_id) rollup rows, in a fixed order to avoid deadlocks"""
+    StudentSubjectProgress.objects.bulk_create(
+        [
+            StudentSubjectProgress(student_id=student_id, subject_id=subject_id)
+            for student_id, subject_id in sorted(pairs, key=lambda pair: (str(pair[0]), str(pair[1])))
+        ],
+        update_conflicts=True,
+        unique_fields=['student', 'subject'],
+        update_fields=['updated_at'],
+    )
+
+
+def _apply_rollup_deltas(deltas):
+    for (student_id, subject_id), delta in deltas.items():
+        if delta:
+            StudentSubjectProgress.objects.filter(
+                student_id=student_id,
+                subject_id=subject_id
+            ).update(videos_watched=F('videos_watched') + delta)
+
+
+def upsert_progress(values, monotonic=False, using=None):
+    """
+    Write {(student_id, chapter_id): videos_watched} in one statement
+
+    Conflicts on (student, chapter) update the existing row in place, so
+    concurrent first writes never raise IntegrityError. With `monotonic` the
+    stored value never decreases. Rows go to database `using` (default: the
+    router's choice), which must be the students' shard when sharded.
+    Returns {(student_id, chapter_id): stored}.
+    """
+    using = using or router.db_for_write(VideoProgress)
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    opts = VideoProgress._meta
+    table = qn(opts.db_table)
+
+    def prep(field_name, value):
+        return opts.get_field(field_name).get_db_prep_value(value, connection)
+
+    now = timezone.now()
+    params = []
+    for (student_id, chapter_id), videos_watched in values.items():
+        params += [
+            prep('id', uuid.uuid4()),
+            prep('student', student_id),
+            prep('chapter', chapter_id),
+            videos_watched,
+            prep('last_watched_at', now),
+            prep('created_at', now),
+        ]
+
+    if monotonic:
+        new_value = (
+            f"CASE WHEN {table}.{qn('videos_watched')} > EXCLUDED.{qn('videos_watched')} "
+            f"THEN {table}.{qn('videos_watched')} ELSE EXCLUDED.{qn('videos_watched')} END"
+        )
+    else:
+        new_value = f"EXCLUDED.{qn('videos_watched')}"
+
+    columns = ', '.join(qn(column) for column in (
+        'id', 'student_id', 'chapter_id', 'videos_watched', 'last_watched_at', 'created_at'
+    ))
+    rows = ', '.join(['(%s, %s, %s, %s, %s, %s)'] * len(values))
+    sql = (
+        f"INSERT INTO {table} ({columns}) VALUES {rows} "
+        f"ON CONFLICT ({qn('student_id')}, {qn('chapter_id')}) DO UPDATE SET "
+        f"{qn('videos_watched')} = {new_value}, "
+        f"{qn('last_watched_at')} = EXCLUDED.{qn('last_watched_at')} "
+        f"RETURNING {qn('student_id')}, {qn('chapter_id')}, {qn('videos_watched')}"
+    )
+
+    student_field = opts.get_field('student').target_field
+    chapter_field = opts.get_field('chapter').target_field
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return {
+            (student_field.to_python(student_id), chapter_field.to_python(chapter_id)): stored
+            for student_id, chapter_id, stored in cursor.fetchall()
+        }
+
+
+def write_progress(updates, monotonic=None):
+    """
+    Write progress for any number of students in a single transaction
+
+    `updates` maps (student_id, chapter) -> videos_watched, where chapter is a
+    catalog ChapterInfo (or anything with id, subject_id and total_videos).
+    Values are clamped to the chapter's total_videos.
+    Returns {(student_id, chapter_id): stored videos_watched}.
+    """
+    if not updates:
+        return {}
+    if monotonic is None:
+        monotonic = settings.PROGRESS_MONOTONIC_UPDATES
+
+    values = {
+        (student_id, chapter.id): max(0, min(videos_watched, chapter.total_videos))
+        for (student_id, chapter), videos_watched in updates.items()
+    }
+    subjects = {chapter.id: chapter.subject_id for _, chapter in updates}
+    student_ids = {student_id for student_id, _ in values}
+
+    # {None: values} unless sharded
+    shards = sharding.split(values)
+
+    with transaction.atomic(using=router.db_for_write(StudentSubjectProgress)), ExitStack() as shard_transactions:
+        _lock_rollups({(student_id, subjects[chapter_id]) for student_id, chapter_id in values})
+        for alias in shards:
+            if alias is not None:
+                shard_transactions.enter_context(transaction.atomic(using=alias))
+
+        previous = {}
+        stored = {}
+        for alias, shard_values in shards.items():
+            # Stable while the rollup rows are locked
+            rows = VideoProgress.objects.using(alias).filter(
+                student_id__in={student_id for student_id, _ in shard_values},
+                chapter_id__in={chapter_id for _, chapter_id in shard_values}
+            ).values_list('student_id', 'chapter_id', 'videos_watched')
+            previous.update(((student_id, chapter_id), watched) for student_id, chapter_id, watched in rows)
+
+            items = list(shard_values.items())
+            for offset in range(0, len(items), UPSERT_CHUNK_SIZE):
+                stored.update(upsert_progress(dict(items[offset:offset + UPSERT_CHUNK_SIZE]), monotonic, alias))
+
+        deltas = {}
+        changes = {}
+        for (student_id, chapter_id), videos_watched in stored.items():
+            change = videos_watched - previous.get((student_id, chapter_id), 0)
+            changes[(student_id, chapter_id)] = (videos_watched, change)
+            key = (student_id, subjects[chapter_id])
+            deltas[key] = deltas.get(key, 0) + change
+        _apply_rollup_deltas(deltas)
+        if settings.PROGRESS_EVENT_LOG:
+            history.record_events(changes)
+
+        # Raw upserts skip post_save, so invalidate dashboards here
+        for student_id in student_ids:
+            caching.bump_progress_version(student_id)
+        transaction.on_commit(leaderboard.mark_stale)
+        transaction.on_commit(lambda: routers.mark_recent_write(student_ids))
+        if live.is_enabled():
+            chapters = {chapter.id: chapter for _, chapter in updates}
+            # The data is committed either way, so a failing fan-out only logs
+            transaction.on_commit(lambda: live.publish_changes(changes, chapters), robust=True)
+
+    return stored
+
+
+def record_progress_batch(student, updates, monotonic=None):
+    """
+    Write several chapters' progress for one student in a single transaction
+
+    `updates` maps chapter -> videos_watched. Returns {chapter_id: stored videos_watched}.
+    """
+    stored = write_progress(
+        {(student.id, chapter): videos_watched for chapter, videos_watched in updates.items()},
+        monotonic
+    )
+    return {chapter_id: videos_watched for (_, chapter_id), videos_watched in stored.items()}
+
+
+def save_progress(student, updates, monotonic=None):
+    """
+    Write {chapter: videos_watched} now, or buffer it in write-behind mode
+
+    Returns {chapter_id: videos_watched as stored (or as it will be stored)}.
+    """
+    if writebehind.is_enabled():
+        return writebehind.submit(student, updates, monotonic)
+    return record_progress_batch(student, updates, monotonic)
+
+
+def record_progress(student, chapter, videos_watched, monotonic=None):
+    """
+    Set a student's videos_watched for a chapter and update the rollup
+
+    Returns the stored videos_watched, which differs from the requested value
+    when it was clamped or when a monotonic write kept a higher value.
+    """
+    return record_progress_batch(student, {chapter: videos_watched}, monotonic)[chapter.id]
+
+
+def refresh_rollups(student_id, chapter_ids):
+    """
+    Set a student's rollups for the chapters' subjects from their stored rows
+
+    For VideoProgress changes that bypass write_progress(): ORM saves and
+    deletes, from the admin for instance.
+    """
+    subject_ids = set(Chapter.objects.filter(pk__in=chapter_ids).values_list('subject_id', flat=True))
+    if not subject_ids:
+        return
+    by_subject = {}
+    for chapter_id, subject_id in Chapter.objects.filter(subject_id__in=subject_ids).values_list('id', 'subject_id'):
+        by_subject.setdefault(subject_id, []).append(chapter_id)
+
+    with transaction.atomic(using=router.db_for_write(StudentSubjectProgress)):
+        # Locked first, as write_progress() does, so a concurrent delta isn't lost
+        _lock_rollups({(student_id, subject_id) for subject_id in subject_ids})
+        for subject_id in subject_ids:
+            total = sharding.student_rows(student_id).filter(
+                chapter_id__in=by_subject[subject_id]
+            ).aggregate(total=Sum('videos_watched'))['total']
+            StudentSubjectProgress.objects.filter(
+                student_id=student_id,
+                subject_id=subject_id
+            ).update(videos_watched=total or 0)
+    caching.bump_progress_version(student_id)
+
+
+def _progress_totals(subject_ids, batch_size):
+    """(student_id, subject_id, videos watched) from VideoProgress"""
+    if not sharding.enabled():
+        progress = VideoProgress.objects.all()
+        if subject_ids is not None:
+            progress = progress.filter(chapter__subject_id__in=subject_ids)
+        yield from (
+            progress
+            .values_list('student_id', 'chapter__subject_id')
+            .annotate(total=Sum('videos_watched'))
+            .order_by()
+            .iterator(chunk_size=batch_size)
+        )
+        return
+
+    # Shards have no chapters table to join, so total one subject's chapters
+    # at a time. A student's rows are all on one shard.
+    chapters = Chapter.objects.all()
+    if subject_ids is not None:
+        chapters = chapters.filter(subject_id__in=subject_ids)
+    by_subject = {}
+    for chapter_id, subject_id in chapters.values_list('id', 'subject_id'):
+        by_subject.setdefault(subject_id, []).append(chapter_id)
+    for alias in sharding.progress_aliases():
+        for subject_id, chapter_ids in by_subject.items():
+            totals = (
+                VideoProgress.objects.using(alias)
+                .filter(chapter_id__in=chapter_ids)
+                .values_list('student_id')
+                .annotate(total=Sum('videos_watched'))
+                .order_by()
+            )
+            for student_id, total in totals.iterator(chunk_size=batch_size):
+                yield student_id, subject_id, total
+
+
+def rebuild_rollups(subject_ids=None, batch_size=1000):
+    """
+    Recompute StudentSubjectProgress from VideoProgress in bulk
+
+    Only rollups whose value changed are written, and those students' cached
+    dashboards are invalidated. Returns the number of rollups changed.
+    """
+    rollups = StudentSubjectProgress.objects.all()
+    if subject_ids is not None:
+        rollups = rollups.filter(subject_id__in=subject_ids)
+
+    current = {
+        (student_id, subject_id): videos_watched
+        for student_id, subject_id, videos_watched
+        in rollups.values_list('student_id', 'subject_id', 'videos_watched').iterator(chunk_size=batch_size)
+    }
+
+    changed = []
+    for student_id, subject_id, total in _progress_totals(subject_ids, batch_size):
+        if current.pop((student_id, subject_id), None) != total:
+            changed.append(StudentSubjectProgress(student_id=student_id, subject_id=subject_id, videos_watched=total))
+
+    # Rollups left over have no progress rows behind them any more
+    for (student_id, subject_id), videos_watched in current.items():
+        if videos_watched:
+            changed.append(StudentSubjectProgress(student_id=student_id, subject_id=subject_id, videos_watched=0))
+
+    with transaction.atomic():
+        StudentSubjectProgress.objects.bulk_create(
+            changed,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=['student', 'subject'],
+            update_fields=['videos_watched', 'updated_at'],
+        )
+
+    for student_id in {rollup.student_id for rollup in changed}:
+        caching.bump_progress_version(student_id)
+
+    return len(changed)
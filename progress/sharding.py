@@ -0,0 +1,171 @@
+"""
+Hash-sharded VideoProgress storage
+
+VideoProgress is the one table that grows with students x chapters. With
+PROGRESS_SHARDS set, each student's rows live in one of those database
+aliases, picked by a jump consistent hash of student_id; every other table
+(users, catalog, rollups, events) stays on the primary. Appending an N+1th
+shard re-homes only about 1/(N+1) of the students, and reshard() (the
+reshard_progress command) moves their rows, along with rows left on the
+primary from before sharding was turned on.
+
+Routers never see the student a query filters on, so sharded reads and
+writes pick the alias themselves with .using(shard_for(student_id)). Shards
+hold no users or chapters, so nothing joins across them: code that reads
+VideoProgress for many students (rollup rebuild, analytics, export) goes
+shard by shard and looks the rest up on the primary. For the same reason the
+video_progress foreign keys have no database constraints on the shards (the
+primary keeps them); deleting a user or chapter deletes its shard rows
+through progress.signals.
+
+Without PROGRESS_SHARDS, shard_for() returns None, which .using() treats as
+"ask the router", so every read and write goes where it did before.
+"""
+from collections import Counter
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from .models import VideoProgress
+import hashlib
+import uuid
+
+RESHARD_BATCH_SIZE = 1000
+
+# Copied verbatim by reshard(), so last_watched_at keeps its value
+COPY_FIELDS = ('id', 'student_id', 'chapter_id', 'videos_watched', 'last_watched_at', 'created_at')
+
+
+def enabled():
+    return bool(settings.PROGRESS_SHARDS)
+
+
+def jump_hash(key, buckets):
+    """Jump consistent hash (Lamping & Veach, 2014) of a 64-bit key into range(buckets)"""
+    bucket, candidate = -1, 0
+    while candidate < buckets:
+        bucket = candidate
+        key = (key * 2862933555777941143 + 1) & 0xFFFFFFFFFFFFFFFF
+        candidate = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+def _key(student_id):
+    if not isinstance(student_id, uuid.UUID):
+        student_id = uuid.UUID(str(student_id))
+    return int.from_bytes(hashlib.blake2b(student_id.bytes, digest_size=8).digest(), 'big')
+
+
+def shard_for(student_id, shards=None):
+    """
+    Alias holding the student's VideoProgress rows, None when not sharded
+
+    `shards` defaults to PROGRESS_SHARDS. Its order is part of the hash, so
+    shards may only ever be appended.
+    """
+    shards = settings.PROGRESS_SHARDS if shards is None else shards
+    if not shards:
+        return None
+    return shards[jump_hash(_key(student_id), len(shards))]
+
+
+def progress_aliases():
+    """Aliases that together hold every VideoProgress row ([None]: the router's choice)"""
+    return list(settings.PROGRESS_SHARDS) or [None]
+
+
+def split(values):
+    """{(student_id, ...): value} -> {alias: {(student_id, ...): value}} by the student's shard"""
+    groups = {}
+    for key, value in values.items():
+        groups.setdefault(shard_for(key[0]), {})[key] = value
+    return groups
+
+
+def student_rows(student_id):
+    """The student's VideoProgress rows, on their shard"""
+    return VideoProgress.objects.using(shard_for(student_id)).filter(student_id=student_id)
+
+
+def bulk_create(rows, **kwargs):
+    """VideoProgress.objects.bulk_create() with each row sent to its student's shard"""
+    by_shard = {}
+    for row in rows:
+        by_shard.setdefault(shard_for(row.student_id), []).append(row)
+    created = []
+    for alias, shard_rows in by_shard.items():
+        created += VideoProgress.objects.using(alias).bulk_create(shard_rows, **kwargs)
+    return created
+
+
+def delete_rows(**filters):
+    """
+    Delete matching VideoProgress rows on every shard; returns the number deleted
+
+    No signals are sent: the user or chapter delete calling this fixes rollups
+    and dashboards for all the rows at once.
+    """
+    total = 0
+    for alias in settings.PROGRESS_SHARDS:
+        rows = VideoProgress.objects.using(alias).filter(**filters)
+        total += rows._raw_delete(alias)
+    return total
+
+
+def _copy_rows(alias, rows):
+    """Insert COPY_FIELDS tuples as they are, skipping rows the shard already has"""
+    connection = connections[alias]
+    qn = connection.ops.quote_name
+    fields = [VideoProgress._meta.get_field(name) for name in COPY_FIELDS]
+    params = []
+    for row in rows:
+        params += [field.get_db_prep_value(value, connection) for field, value in zip(fields, row)]
+    placeholders = '(' + ', '.join(['%s'] * len(fields)) + ')'
+    # A row already on the target was written after the student moved there,
+    # so it is newer than the one being copied
+    sql = (
+        f"INSERT INTO {qn(VideoProgress._meta.db_table)} ({', '.join(qn(field.column) for field in fields)}) "
+        f"VALUES {', '.join([placeholders] * len(rows))} ON CONFLICT DO NOTHING"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def reshard(shards=None, sources=None, batch_size=RESHARD_BATCH_SIZE, dry_run=False):
+    """
+    Move VideoProgress rows to their student's shard under `shards`
+
+    Scans `sources` (default: the primary and every shard; add a retired
+    shard here to drain it) in batches of primary keys. Each batch is copied
+    to its target before being deleted from its source, so an interrupted run
+    can simply be repeated. Returns Counter({(source, target): rows}).
+    """
+    shards = list(settings.PROGRESS_SHARDS if shards is None else shards)
+    if sources is None:
+        sources = [DEFAULT_DB_ALIAS] + shards
+    moved = Counter()
+    for source in dict.fromkeys(sources):
+        last_id = None
+        while True:
+            batch = VideoProgress.objects.using(source).order_by('id')
+            if last_id is not None:
+                batch = batch.filter(id__gt=last_id)
+            rows = list(batch.values_list(*COPY_FIELDS)[:batch_size])
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            by_target = {}
+            for row in rows:
+                target = shard_for(row[1], shards)
+                if target != source:
+                    by_target.setdefault(target, []).append(row)
+            for target, target_rows in by_target.items():
+                moved[(source, target)] += len(target_rows)
+                if dry_run:
+                    continue
+                with transaction.atomic(using=target):
+                    _copy_rows(target, target_rows)
+                # Raw delete: the rows still exist on the target, so there
+                # are no rollups or dashboards to fix and no signals to send
+                with transaction.atomic(using=source):
+                    VideoProgress.objects.using(source).filter(id__in=[row[0] for row in target_rows])._raw_delete(source)
+    return moved
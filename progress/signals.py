@@ -0,0 +1,94 @@
+"""
+Signal handlers for progress models
+
+write_progress() keeps the StudentSubjectProgress rollups in step itself.
+Everything else that changes VideoProgress (ORM saves and deletes, the admin,
+deleting or moving a chapter) has its rollups corrected here.
+"""
+from django.db.models import QuerySet
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from authentication.models import User
+from .models import Subject, Chapter, VideoProgress
+from .caching import bump_progress_version
+from . import catalog, services, sharding
+
+
+def _started_on(origin, model):
+    """Whether a delete started on `model` rather than cascading from another model"""
+    return isinstance(origin, model) or (isinstance(origin, QuerySet) and origin.model is model)
+
+
+def _stored_value(model, instance, field, using):
+    """`field` as currently stored for an instance about to be saved, None for a new one"""
+    if instance._state.adding:
+        return None
+    return model._default_manager.using(using).filter(pk=instance.pk).values_list(field, flat=True).first()
+
+
+@receiver([post_save, post_delete], sender=VideoProgress)
+def video_progress_changed(sender, instance, **kwargs):
+    """Invalidate the student's cached dashboard"""
+    bump_progress_version(instance.student_id)
+
+
+@receiver(pre_save, sender=VideoProgress)
+def video_progress_saving(sender, instance, raw=False, using=None, **kwargs):
+    """Remember the stored chapter, in case the save moves the row to another subject"""
+    instance._stored_chapter_id = None if raw else _stored_value(VideoProgress, instance, 'chapter_id', using)
+
+
+@receiver(post_save, sender=VideoProgress)
+def video_progress_saved(sender, instance, raw=False, **kwargs):
+    """Recompute the rollups an ORM save touched"""
+    if raw:
+        return
+    chapter_ids = {instance.chapter_id, getattr(instance, '_stored_chapter_id', None)} - {None}
+    services.refresh_rollups(instance.student_id, chapter_ids)
+
+
+@receiver(post_delete, sender=VideoProgress)
+def video_progress_deleted(sender, instance, origin=None, **kwargs):
+    """Recompute the rollup of a deleted row; cascades are handled by their model's handler"""
+    if _started_on(origin, VideoProgress):
+        services.refresh_rollups(instance.student_id, [instance.chapter_id])
+
+
+@receiver([post_save, post_delete], sender=Subject)
+@receiver([post_save, post_delete], sender=Chapter)
+def catalog_changed(sender, instance, **kwargs):
+    """Reload catalog snapshots and cached dashboards after admin edits"""
+    catalog.bump_generation()
+
+
+@receiver(pre_save, sender=Chapter)
+def chapter_saving(sender, instance, raw=False, using=None, **kwargs):
+    instance._stored_subject_id = None if raw else _stored_value(Chapter, instance, 'subject_id', using)
+
+
+@receiver(post_save, sender=Chapter)
+def chapter_saved(sender, instance, **kwargs):
+    """A chapter moved to another subject takes its progress with it"""
+    stored_subject_id = getattr(instance, '_stored_subject_id', None)
+    if stored_subject_id is not None and stored_subject_id != instance.subject_id:
+        services.rebuild_rollups([stored_subject_id, instance.subject_id])
+
+
+@receiver(post_delete, sender=User)
+def student_deleted(sender, instance, **kwargs):
+    """Shards are outside the delete cascade, so remove the student's rows there"""
+    if sharding.enabled():
+        sharding.delete_rows(student_id=instance.pk)
+
+
+@receiver(post_delete, sender=Chapter)
+def chapter_deleted(sender, instance, origin=None, **kwargs):
+    """
+    As student_deleted, for a chapter's rows on every shard, then take the
+    chapter's progress out of its subject's rollups (a deleted subject's
+    rollups go with it)
+    """
+    if sharding.enabled():
+        sharding.delete_rows(chapter_id=instance.pk)
+    if not _started_on(origin, Subject):
+        services.rebuild_rollups([instance.subject_id])
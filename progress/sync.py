@@ -0,0 +1,210 @@
+"""
+Delta sync for the student dashboard
+
+A client that already holds the dashboard polls sync_dashboard() with the
+cursor from its previous call and gets back only what changed since: the
+chapters whose progress (VideoProgress.last_watched_at) or catalog entry
+(Chapter.updated_at) moved, the subject totals those touch, and a new cursor.
+Without a cursor, or with one that can no longer be applied, the reply is the
+full state with "full": true and the client replaces what it holds.
+
+Cursors are signed, opaque strings. Their watermarks trail the read by
+DASHBOARD_SYNC_SETTLE_SECONDS, so a row stamped just before a read but
+committed just after it is sent on the next poll; rows from the last few
+seconds may therefore arrive twice. The catalog side is answered from the
+in-process snapshot: when its generation has not moved nothing is looked at,
+and chapter deletes, which leave no updated_at behind, are detected from a
+digest of the chapter ids in the cursor and answered with the full state.
+Deleted progress rows leave nothing behind either, so the cursor also holds
+a digest of the chapters the student had rows for; when the rows created by
+then no longer match it, one was deleted and the reply is the full state
+too. The student's rows are read whole for it, in one query, and the changed
+ones picked out here.
+"""
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.core import signing
+from django.utils import timezone
+from .catalog import get_catalog
+from .dashboard import chapter_progress, subject_progress
+from .models import StudentSubjectProgress
+from .sharding import student_rows
+from . import writebehind
+import hashlib
+
+CURSOR_SALT = 'progress.sync'
+
+# Read for every sync, from vp_student_covering_idx alone
+PROGRESS_FIELDS = ('chapter_id', 'videos_watched', 'last_watched_at', 'created_at')
+
+# (snapshot, latest chapter updated_at, digest) for the last snapshot seen
+_catalog_state = (None, None, None)
+
+
+def _timestamp(value):
+    return value.isoformat() if value is not None else None
+
+
+def _parse_timestamp(value):
+    return datetime.fromisoformat(value) if value is not None else None
+
+
+def _digest_ids(ids):
+    return hashlib.blake2b(b''.join(sorted(value.bytes for value in ids)), digest_size=8).hexdigest()
+
+
+def _digest(chapters):
+    return _digest_ids(chapter.id for chapter in chapters)
+
+
+def _catalog_digest(catalog):
+    """(latest chapter updated_at, digest of every chapter id) for the snapshot"""
+    global _catalog_state
+    snapshot, latest, digest = _catalog_state
+    if snapshot is not catalog:
+        chapters = catalog.chapters.values()
+        latest = max((chapter.updated_at for chapter in chapters), default=None)
+        digest = _digest(chapters)
+        _catalog_state = (catalog, latest, digest)
+    return latest, digest
+
+
+def _make_cursor(user, catalog, read_at, rows_digest):
+    settle = timedelta(seconds=settings.DASHBOARD_SYNC_SETTLE_SECONDS)
+    latest, digest = _catalog_digest(catalog)
+    return signing.dumps({
+        'user': str(user.id),
+        'progress': _timestamp(read_at - settle),
+        'generation': catalog.generation,
+        'latest': _timestamp(latest),
+        'catalog': _timestamp(latest - settle if latest is not None else None),
+        # Every chapter was created by `latest`, so a delete shows as a
+        # different digest of the chapters created by then
+        'digest': digest,
+        'read_at': _timestamp(read_at),
+        'rows': rows_digest,
+    }, salt=CURSOR_SALT, compress=True)
+
+
+def _read_cursor(cursor, user):
+    """The cursor's fields, None when it is missing, invalid or someone else's"""
+    if not cursor:
+        return None
+    try:
+        state = signing.loads(cursor, salt=CURSOR_SALT)
+        if state['user'] != str(user.id):
+            return None
+        for field in ('progress', 'latest', 'catalog', 'read_at'):
+            state[field] = _parse_timestamp(state[field])
+        return state
+    except (signing.BadSignature, KeyError, TypeError, ValueError):
+        return None
+
+
+def _changed_chapters(state, catalog):
+    """
+    Catalog chapters changed since the cursor, or None when a chapter was
+    deleted and the delta can't express it
+    """
+    if state['generation'] == catalog.generation:
+        return []
+    chapters = catalog.chapters.values()
+    if state['latest'] is None:
+        return list(chapters)
+    if _digest(chapter for chapter in chapters if chapter.created_at <= state['latest']) != state['digest']:
+        return None
+    return [chapter for chapter in chapters if chapter.updated_at > state['catalog']]
+
+
+def _subject_entry(subject, videos_watched):
+    return {**subject_progress(subject, videos_watched), 'subject_id': str(subject.id), 'order': subject.order}
+
+
+def _chapter_entry(chapter, watched):
+    return {**chapter_progress(chapter, watched), 'subject_id': str(chapter.subject_id), 'order': chapter.order}
+
+
+def _rollups(user):
+    return dict(StudentSubjectProgress.objects.filter(student_id=user.id).values_list('subject_id', 'videos_watched'))
+
+
+def _progress_rows(user):
+    """The student's (chapter_id, videos_watched, last_watched_at, created_at) rows"""
+    return list(student_rows(user.id).values_list(*PROGRESS_FIELDS))
+
+
+def _rows_digest(rows, read_at):
+    """
+    Digest of the chapters of the rows created by `read_at`; a later one
+    can't have been deleted since, and a clock-skewed or late commit that
+    lands on the wrong side of it only costs a full sync
+    """
+    return _digest_ids(chapter_id for chapter_id, _, _, created_at in rows if created_at <= read_at)
+
+
+def _full_state(user, catalog, rows):
+    progress_map = {chapter_id: watched for chapter_id, watched, _, _ in rows}
+    rollup_map = _rollups(user)
+    writebehind.merge_pending(user.id, progress_map, rollup_map, catalog)
+    return {
+        'full': True,
+        'progress': [_subject_entry(subject, rollup_map.get(subject.id, 0)) for subject in catalog.subjects],
+        'chapters': [
+            _chapter_entry(chapter, progress_map.get(chapter.id, 0))
+            for subject in catalog.subjects for chapter in subject.chapters
+        ],
+    }
+
+
+def _delta(user, catalog, state, catalog_changes, rows):
+    pending = writebehind.get_buffer().pending_for(user.id) if writebehind.is_enabled() else {}
+    # Buffered chapters need their stored value to adjust the subject totals,
+    # and chapters new to the client need theirs whenever they were written
+    also = {chapter.id for chapter in catalog_changes} | set(pending)
+    progress_map = {
+        chapter_id: watched for chapter_id, watched, last_watched_at, _ in rows
+        if last_watched_at > state['progress'] or chapter_id in also
+    }
+
+    chapter_ids = (set(progress_map) | also) & set(catalog.chapters)
+    if not chapter_ids and state['generation'] == catalog.generation:
+        return {'full': False, 'progress': [], 'chapters': []}
+
+    rollup_map = _rollups(user)
+    writebehind.merge_pending(user.id, progress_map, rollup_map, catalog)
+    if state['generation'] != catalog.generation:
+        # Totals and subject names may have changed with the catalog
+        subjects = catalog.subjects
+    else:
+        subject_ids = {catalog.chapters[chapter_id].subject_id for chapter_id in chapter_ids}
+        subjects = [subject for subject in catalog.subjects if subject.id in subject_ids]
+    return {
+        'full': False,
+        'progress': [_subject_entry(subject, rollup_map.get(subject.id, 0)) for subject in subjects],
+        'chapters': [
+            _chapter_entry(chapter, progress_map.get(chapter.id, 0))
+            for subject in catalog.subjects for chapter in subject.chapters
+            if chapter.id in chapter_ids
+        ],
+    }
+
+
+def sync_dashboard(user, cursor=None):
+    """
+    Dashboard changes for a student since `cursor`
+
+    Returns: {cursor, full, progress: [...], chapters: [...]}, where progress
+    entries are dashboard subject entries and chapters dashboard chapter
+    entries, both with subject_id and order added.
+    """
+    read_at = timezone.now()
+    catalog = get_catalog()
+    state = _read_cursor(cursor, user)
+    catalog_changes = _changed_chapters(state, catalog) if state is not None else None
+    rows = _progress_rows(user)
+    # Same rows as before, unless one was deleted
+    if catalog_changes is None or _rows_digest(rows, state['read_at']) != state['rows']:
+        data = _full_state(user, catalog, rows)
+    else:
+        data = _delta(user, catalog, state, catalog_changes, rows)
+    return {'cursor': _make_cursor(user, catalog, read_at, _rows_digest(rows, read_at)), **data}
@@ -1,3 +1,1648 @@
-from django.test import TestCase
+"""
+Tests for progress API
+"""
+from asgiref.sync import sync_to_async
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from unittest import mock, skipUnless
+from django.conf import settings
+from django.contrib import admin
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection, connections
+from django.db.models import QuerySet
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework.test import APITestCase
+from authentication.models import User
+from authentication.views import get_tokens_for_user
+from backend import instrumentation, routers
+from .models import (
+    Subject, Chapter, VideoProgress, CatalogVersion, StudentSubjectProgress, ProgressEvent, DailyProgress,
+    RequestProfile, SubjectCompletionSummary
+)
+from .admin import VideoProgressAdmin
+from .services import record_progress
+from . import caching, catalog, dashboard, export, leaderboard, live, services, sharding, sync, writebehind
+import asyncio
+import csv
+import json
+import os
+import pstats
+import random
+import re
+import tempfile
+import time
+import uuid
 
-# Create your tests here.
+
+class ProgressTestCase(APITestCase):
+    """Seeds a small catalog and a logged-in student"""
+
+    def setUp(self):
+        cache.clear()
+        # Background dashboard rebuilds run inline, on the test's connection,
+        # so none outlives the test or contends for its database
+        for patcher in (
+            mock.patch.object(caching._refresh_executor, 'submit', side_effect=lambda fn, *args: fn(*args)),
+            mock.patch.object(caching, 'close_old_connections'),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.student = User.objects.create_user(
+            email='student@example.com', name='Student', password='Passw0rd!'
+        )
+        self.physics = Subject.objects.create(
+            name='physics', display_name='Physics', color='#3b82f6', order=1
+        )
+        self.maths = Subject.objects.create(
+            name='maths', display_name='Maths', color='#ec4899', order=2
+        )
+        self.kinematics = Chapter.objects.create(
+            subject=self.physics, title='Kinematics', order=1, total_videos=10
+        )
+        self.optics = Chapter.objects.create(
+            subject=self.physics, title='Optics', order=2, total_videos=5
+        )
+        self.algebra = Chapter.objects.create(
+            subject=self.maths, title='Algebra', order=1, total_videos=8
+        )
+        self.client.force_authenticate(self.student)
+
+
+class DashboardTests(ProgressTestCase):
+
+    def test_dashboard_payload(self):
+        record_progress(self.student, self.kinematics, 4)
+        record_progress(self.student, self.optics, 2)
+
+        response = self.client.get(reverse('progress:dashboard'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data'], {
+            'progress': [
+                {'subject': 'Physics', 'videos_watched': 6, 'total_videos': 15,
+                 'percentage': 40.0, 'color': '#3b82f6'},
+                {'subject': 'Maths', 'videos_watched': 0, 'total_videos': 8,
+                 'percentage': 0, 'color': '#ec4899'},
+            ],
+            'subjects': [
+                {'subject': 'Physics', 'chapters': [
+                    {'id': str(self.kinematics.id), 'title': 'Kinematics',
+                     'total_videos': 10, 'watched_videos': 4},
+                    {'id': str(self.optics.id), 'title': 'Optics',
+                     'total_videos': 5, 'watched_videos': 2},
+                ]},
+                {'subject': 'Maths', 'chapters': [
+                    {'id': str(self.algebra.id), 'title': 'Algebra',
+                     'total_videos': 8, 'watched_videos': 0},
+                ]},
+            ],
+        })
+
+    def test_dashboard_query_budget(self):
+        """Query count must not grow with the number of subjects"""
+        for i in range(10):
+            subject = Subject.objects.create(name=f'extra-{i}', display_name=f'Extra {i}', order=10 + i)
+            for j in range(3):
+                chapter = Chapter.objects.create(subject=subject, title=f'Chapter {j}', total_videos=3)
+                VideoProgress.objects.create(student=self.student, chapter=chapter, videos_watched=1)
+
+        # Cold: generation check, chapters, subjects, rollup and progress rows
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('progress:dashboard'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['data']['subjects']), 12)
+
+        # Warm catalog snapshot: the student's rollup and progress rows
+        cache.clear()
+        with self.assertNumQueries(2):
+            self.client.get(reverse('progress:dashboard'))
+
+    def test_dashboard_students_only(self):
+        teacher = User.objects.create_user(
+            email='teacher@example.com', name='Teacher', password='Passw0rd!', role='teacher'
+        )
+        self.client.force_authenticate(teacher)
+
+        response = self.client.get(reverse('progress:dashboard'))
+
+        self.assertEqual(response.status_code, 403)
+
+
+class DashboardCacheTests(ProgressTestCase):
+
+    def test_repeat_reads_hit_cache(self):
+        self.client.get(reverse('progress:dashboard'))
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('progress:dashboard'))
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_progress_update_invalidates(self):
+        self.client.get(reverse('progress:dashboard'))
+
+        self.client.post(reverse('progress:update'), {
+            'chapter_id': str(self.algebra.id), 'videos_watched': 6
+        }, format='json')
+        response = self.client.get(reverse('progress:dashboard'))
+
+        maths = response.json()['data']['progress'][1]
+        self.assertEqual(maths['videos_watched'], 6)
+        self.assertEqual(maths['percentage'], 75.0)
+
+    def test_catalog_edit_served_stale_then_revalidated(self):
+        self.client.get(reverse('progress:dashboard'))
+        self.algebra.total_videos = 16
+        self.algebra.save()
+
+        with mock.patch.object(caching, '_schedule_refresh', side_effect=caching.refresh_dashboard) as refresh:
+            stale = self.client.get(reverse('progress:dashboard'))
+        fresh = self.client.get(reverse('progress:dashboard'))
+
+        refresh.assert_called_once()
+        self.assertEqual(stale.json()['data']['progress'][1]['total_videos'], 8)
+        self.assertEqual(fresh.json()['data']['progress'][1]['total_videos'], 16)
+
+
+class CatalogSnapshotTests(ProgressTestCase):
+
+    def test_snapshot_contents(self):
+        snapshot = catalog.get_catalog()
+
+        self.assertEqual([subject.display_name for subject in snapshot.subjects], ['Physics', 'Maths'])
+        self.assertEqual(snapshot.subjects[0].total_videos, 15)
+        self.assertEqual(snapshot.get_chapter(str(self.optics.id)).title, 'Optics')
+        self.assertIsNone(snapshot.get_chapter('not-a-uuid'))
+
+    def test_update_progress_does_not_query_chapters(self):
+        catalog.get_catalog()
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('progress:update'), {
+                'chapter_id': str(self.kinematics.id), 'videos_watched': 5
+            }, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q for q in queries.captured_queries if '"chapters"' in q['sql']])
+        self.assertEqual(response.json()['data']['percentage'], 50.0)
+
+    def test_update_progress_unknown_chapter(self):
+        response = self.client.post(reverse('progress:update'), {
+            'chapter_id': 'missing', 'videos_watched': 1
+        }, format='json')
+
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(CATALOG_CHECK_INTERVAL=0)
+    def test_edit_in_another_worker_reloads_snapshot(self):
+        before = catalog.get_catalog()
+
+        # Simulate another worker: change rows and bump without signals
+        Chapter.objects.filter(pk=self.optics.pk).update(total_videos=9)
+        CatalogVersion.objects.filter(pk=1).update(generation=before.generation + 1)
+
+        after = catalog.get_catalog()
+        self.assertEqual(after.get_chapter(self.optics.id).total_videos, 9)
+        self.assertEqual(after.subjects[0].total_videos, 19)
+
+
+class RollupTests(ProgressTestCase):
+
+    def rollup(self, subject):
+        return StudentSubjectProgress.objects.get(student=self.student, subject=subject).videos_watched
+
+    def test_updates_apply_delta(self):
+        for chapter_id, watched in [(self.kinematics.id, 4), (self.optics.id, 3), (self.kinematics.id, 1)]:
+            self.client.post(reverse('progress:update'), {
+                'chapter_id': str(chapter_id), 'videos_watched': watched
+            }, format='json')
+
+        self.assertEqual(self.rollup(self.physics), 4)
+        self.assertFalse(StudentSubjectProgress.objects.filter(subject=self.maths).exists())
+
+    def test_rebuild_command_repairs_drift(self):
+        record_progress(self.student, self.kinematics, 4)
+        record_progress(self.student, self.algebra, 2)
+        StudentSubjectProgress.objects.filter(subject=self.physics).update(videos_watched=99)
+        VideoProgress.objects.filter(chapter=self.algebra).delete()
+
+        call_command('rebuild_progress_rollups', stdout=StringIO())
+
+        self.assertEqual(self.rollup(self.physics), 4)
+        self.assertEqual(self.rollup(self.maths), 0)
+
+    def test_orm_save_and_delete_adjust_rollup(self):
+        record_progress(self.student, self.kinematics, 3)
+        record_progress(self.student, self.optics, 2)
+        row = VideoProgress.objects.get(student=self.student, chapter=self.kinematics)
+
+        row.videos_watched = 1
+        row.save()
+        self.assertEqual(self.rollup(self.physics), 3)
+
+        row.chapter = self.algebra
+        row.save()
+        self.assertEqual(self.rollup(self.physics), 2)
+        self.assertEqual(self.rollup(self.maths), 1)
+
+        row.delete()
+        self.assertEqual(self.rollup(self.maths), 0)
+
+    def test_chapter_delete_and_move_adjust_rollups(self):
+        record_progress(self.student, self.kinematics, 3)
+        record_progress(self.student, self.optics, 2)
+
+        self.optics.subject = self.maths
+        self.optics.save()
+        self.assertEqual(self.rollup(self.physics), 3)
+        self.assertEqual(self.rollup(self.maths), 2)
+
+        Chapter.objects.filter(pk__in=[self.kinematics.pk, self.optics.pk]).delete()
+        response = self.client.get(reverse('progress:dashboard'))
+
+        self.assertEqual(self.rollup(self.physics), 0)
+        self.assertEqual(self.rollup(self.maths), 0)
+        self.assertEqual(response.json()['data']['progress'][0]['videos_watched'], 0)
+
+
+class BatchUpdateTests(ProgressTestCase):
+
+    def test_batch_upsert(self):
+        record_progress(self.student, self.kinematics, 2)
+
+        response = self.client.post(reverse('progress:update-batch'), {'updates': [
+            {'chapter_id': str(self.kinematics.id), 'videos_watched': 6},
+            {'chapter_id': str(self.optics.id), 'videos_watched': 5},
+            {'chapter_id': str(self.algebra.id), 'videos_watched': 'lots'},
+            {'chapter_id': 'missing', 'videos_watched': 1},
+        ]}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['data']['results']
+        self.assertEqual([r['success'] for r in results], [True, True, False, False])
+        self.assertEqual(results[1]['percentage'], 100.0)
+        self.assertEqual(
+            dict(VideoProgress.objects.values_list('chapter_id', 'videos_watched')),
+            {self.kinematics.id: 6, self.optics.id: 5}
+        )
+        self.assertEqual(StudentSubjectProgress.objects.get(subject=self.physics).videos_watched, 11)
+
+    def test_batch_query_budget(self):
+        catalog.get_catalog()
+        updates = [
+            {'chapter_id': str(chapter.id), 'videos_watched': 1}
+            for chapter in (self.kinematics, self.optics, self.algebra)
+        ]
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('progress:update-batch'), {'updates': updates}, format='json')
+
+        inserts = [q for q in queries.captured_queries if q['sql'].startswith('INSERT INTO "video_progress"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertFalse([q for q in queries.captured_queries if '"chapters"' in q['sql']])
+
+    def test_batch_requires_list(self):
+        response = self.client.post(reverse('progress:update-batch'), {'updates': []}, format='json')
+
+        self.assertEqual(response.status_code, 400)
+
+
+class ProgressUpsertTests(ProgressTestCase):
+
+    def post_update(self, chapter, videos_watched, **extra):
+        return self.client.post(reverse('progress:update'), {
+            'chapter_id': str(chapter.id), 'videos_watched': videos_watched, **extra
+        }, format='json')
+
+    def test_single_upsert_statement(self):
+        record_progress(self.student, self.kinematics, 3)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.post_update(self.kinematics, 4)
+
+        writes = [q for q in queries.captured_queries if 'INTO "video_progress"' in q['sql']]
+        self.assertEqual(len(writes), 1)
+        self.assertIn('ON CONFLICT', writes[0]['sql'])
+
+    def test_monotonic_keeps_max(self):
+        self.post_update(self.kinematics, 7)
+        response = self.post_update(self.kinematics, 5, monotonic=True)
+
+        self.assertEqual(response.json()['data']['videos_watched'], 7)
+        self.assertEqual(StudentSubjectProgress.objects.get(subject=self.physics).videos_watched, 7)
+
+        response = self.post_update(self.kinematics, 5)
+
+        self.assertEqual(response.json()['data']['videos_watched'], 5)
+        self.assertEqual(StudentSubjectProgress.objects.get(subject=self.physics).videos_watched, 5)
+
+    def test_clamped_to_chapter_total(self):
+        response = self.post_update(self.optics, 50)
+
+        self.assertEqual(response.json()['data']['videos_watched'], 5)
+        self.assertEqual(response.json()['data']['percentage'], 100.0)
+        self.assertEqual(VideoProgress.objects.get(chapter=self.optics).videos_watched, 5)
+
+
+@override_settings(PROGRESS_WRITE_BEHIND=True)
+class WriteBehindTests(ProgressTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.buffer = writebehind.ProgressBuffer(autostart=False)
+        patcher = mock.patch.object(writebehind, 'get_buffer', return_value=self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post_update(self, chapter, videos_watched):
+        return self.client.post(reverse('progress:update'), {
+            'chapter_id': str(chapter.id), 'videos_watched': videos_watched
+        }, format='json')
+
+    def test_updates_coalesce_until_flush(self):
+        for watched in (1, 2, 3):
+            self.post_update(self.kinematics, watched)
+        self.post_update(self.optics, 4)
+
+        self.assertFalse(VideoProgress.objects.exists())
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(
+            dict(VideoProgress.objects.values_list('chapter_id', 'videos_watched')),
+            {self.kinematics.id: 3, self.optics.id: 4}
+        )
+        self.assertEqual(StudentSubjectProgress.objects.get(subject=self.physics).videos_watched, 7)
+
+        stats = self.buffer.stats()
+        self.assertEqual(stats['depth'], 0)
+        self.assertEqual(stats['rows_written'], 2)
+        self.assertEqual(stats['coalesced_ratio'], 0.5)
+
+    def test_dashboard_merges_buffered_values(self):
+        record_progress(self.student, self.kinematics, 2)
+        self.post_update(self.kinematics, 6)
+        self.post_update(self.algebra, 4)
+
+        data = self.client.get(reverse('progress:dashboard')).json()['data']
+
+        self.assertEqual(data['progress'][0]['videos_watched'], 6)
+        self.assertEqual(data['progress'][1]['videos_watched'], 4)
+        self.assertEqual(data['subjects'][0]['chapters'][0]['watched_videos'], 6)
+
+    def test_size_threshold_flushes_inline(self):
+        self.buffer.max_pending = 2
+
+        self.post_update(self.kinematics, 1)
+        self.post_update(self.optics, 1)
+
+        self.assertEqual(VideoProgress.objects.count(), 2)
+        self.assertEqual(self.buffer.stats()['depth'], 0)
+
+    def test_rows_that_cannot_be_written_are_dropped(self):
+        other = User.objects.create_user(email='other@example.com', name='Other')
+        self.post_update(self.kinematics, 3)
+        self.post_update(self.algebra, 2)
+        for chapter in (self.kinematics, self.optics):
+            self.buffer.add(other.id, catalog.get_catalog().chapters[chapter.id], 1)
+        # Deleted after its update was buffered
+        self.algebra.delete()
+        write_progress = services.write_progress
+
+        def failing_for_other(updates, monotonic):
+            # As the rollup's foreign key fails at commit for a deleted student
+            if any(student_id == other.id for student_id, _ in updates):
+                raise IntegrityError('FOREIGN KEY constraint failed')
+            return write_progress(updates, monotonic)
+
+        with mock.patch.object(services, 'write_progress', side_effect=failing_for_other), \
+                self.assertLogs('progress.writebehind', 'ERROR'):
+            self.assertEqual(self.buffer.flush(), 1)
+
+        self.assertEqual(list(VideoProgress.objects.values_list('student_id', 'chapter_id', 'videos_watched')), [
+            (self.student.id, self.kinematics.id, 3)
+        ])
+        stats = self.buffer.stats()
+        self.assertEqual((stats['depth'], stats['rows_written'], stats['rows_dropped']), (0, 1, 3))
+
+        # Later writes are not held up by them
+        self.post_update(self.optics, 4)
+        self.assertEqual(self.buffer.flush(), 1)
+
+    def test_failing_database_keeps_updates(self):
+        self.post_update(self.kinematics, 3)
+        self.post_update(self.optics, 2)
+
+        with mock.patch.object(services, 'write_progress', side_effect=OperationalError('database is down')), \
+                self.assertLogs('progress.writebehind', 'ERROR'):
+            self.assertEqual(self.buffer.flush(), 0)
+        self.assertEqual(self.buffer.stats()['depth'], 2)
+
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(self.buffer.stats()['rows_dropped'], 0)
+
+
+class DashboardConditionalGetTests(ProgressTestCase):
+
+    def test_etag_round_trip(self):
+        first = self.client.get(reverse('progress:dashboard'))
+        etag = first['ETag']
+
+        self.assertFalse(etag.startswith('W/'))
+        self.assertNotIn('Last-Modified', first)
+
+        with self.assertNumQueries(0):
+            cached = self.client.get(reverse('progress:dashboard'), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(cached.status_code, 304)
+
+    def test_if_modified_since_is_not_enough(self):
+        self.client.get(reverse('progress:dashboard'))
+        record_progress(self.student, self.optics, 1)
+
+        # Dates have one-second resolution, so only the ETag can tell
+        response = self.client.get(reverse('progress:dashboard'), HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 60))
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_progress_write_changes_etag(self):
+        etag = self.client.get(reverse('progress:dashboard'))['ETag']
+
+        self.client.post(reverse('progress:update'), {
+            'chapter_id': str(self.optics.id), 'videos_watched': 1
+        }, format='json')
+        response = self.client.get(reverse('progress:dashboard'), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_catalog_edit_changes_etag(self):
+        etag = self.client.get(reverse('progress:dashboard'))['ETag']
+
+        self.optics.title = 'Waves and Optics'
+        self.optics.save()
+        with mock.patch.object(caching, '_schedule_refresh', side_effect=caching.refresh_dashboard) as refresh:
+            # The stale payload is still what is served, so it still matches
+            stale = self.client.get(reverse('progress:dashboard'), HTTP_IF_NONE_MATCH=etag)
+        response = self.client.get(reverse('progress:dashboard'), HTTP_IF_NONE_MATCH=etag)
+
+        refresh.assert_called_once()
+        self.assertEqual(stale.status_code, 304)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['data']['subjects'][0]['chapters'][1]['title'], 'Waves and Optics')
+
+    def test_stale_payload_keeps_its_etag(self):
+        self.client.get(reverse('progress:dashboard'))
+        self.optics.title = 'Waves and Optics'
+        self.optics.save()
+
+        with mock.patch.object(caching, '_schedule_refresh'):
+            stale = self.client.get(reverse('progress:dashboard'))
+        revalidated = self.client.get(reverse('progress:dashboard'), HTTP_IF_NONE_MATCH=stale['ETag'])
+
+        self.assertEqual(stale.json()['data']['subjects'][0]['chapters'][1]['title'], 'Optics')
+        self.assertEqual(revalidated.status_code, 304)
+
+
+@override_settings(DASHBOARD_SYNC_SETTLE_SECONDS=0)
+class DashboardSyncTests(ProgressTestCase):
+
+    def sync(self, cursor=None):
+        response = self.client.get(reverse('progress:dashboard-sync'), {'cursor': cursor} if cursor else {})
+        self.assertEqual(response.status_code, 200)
+        return response.json()['data']
+
+    def test_full_then_only_changes(self):
+        record_progress(self.student, self.kinematics, 4)
+        first = self.sync()
+
+        self.assertTrue(first['full'])
+        self.assertEqual([entry['videos_watched'] for entry in first['progress']], [4, 0])
+        self.assertEqual([chapter['title'] for chapter in first['chapters']], ['Kinematics', 'Optics', 'Algebra'])
+
+        # Steady state: one query for the student's rows, nothing sent
+        with self.assertNumQueries(1):
+            idle = self.sync(first['cursor'])
+        self.assertEqual((idle['full'], idle['progress'], idle['chapters']), (False, [], []))
+
+        record_progress(self.student, self.optics, 2)
+        delta = self.sync(idle['cursor'])
+
+        self.assertFalse(delta['full'])
+        self.assertEqual(delta['chapters'], [{
+            'id': str(self.optics.id), 'title': 'Optics', 'total_videos': 5, 'watched_videos': 2,
+            'subject_id': str(self.physics.id), 'order': 2,
+        }])
+        self.assertEqual([(entry['subject'], entry['videos_watched']) for entry in delta['progress']], [('Physics', 6)])
+
+    def test_catalog_changes(self):
+        cursor = self.sync()['cursor']
+
+        self.algebra.total_videos = 12
+        self.algebra.save()
+        delta = self.sync(cursor)
+
+        self.assertFalse(delta['full'])
+        self.assertEqual([chapter['title'] for chapter in delta['chapters']], ['Algebra'])
+        self.assertEqual(delta['chapters'][0]['total_videos'], 12)
+        # Every subject's totals, as the catalog moved
+        self.assertEqual([entry['subject'] for entry in delta['progress']], ['Physics', 'Maths'])
+
+        # A deleted chapter leaves no updated_at behind: start over
+        self.optics.delete()
+        full = self.sync(delta['cursor'])
+        self.assertTrue(full['full'])
+        self.assertEqual([chapter['title'] for chapter in full['chapters']], ['Kinematics', 'Algebra'])
+
+    def test_deleted_progress_starts_over(self):
+        record_progress(self.student, self.kinematics, 4)
+        cursor = self.sync()['cursor']
+
+        # A new row is still just a change
+        record_progress(self.student, self.optics, 2)
+        delta = self.sync(cursor)
+        self.assertFalse(delta['full'])
+
+        # A deleted row leaves nothing to send: start over
+        VideoProgress.objects.filter(chapter=self.kinematics).delete()
+        full = self.sync(delta['cursor'])
+        self.assertTrue(full['full'])
+        self.assertEqual([chapter['watched_videos'] for chapter in full['chapters']], [0, 2, 0])
+        self.assertFalse(self.sync(full['cursor'])['full'])
+
+    def test_bad_or_foreign_cursor_starts_over(self):
+        other = User.objects.create_user(email='other@example.com', name='Other', password='Passw0rd!')
+        self.client.force_authenticate(other)
+        foreign = self.sync()['cursor']
+        self.client.force_authenticate(self.student)
+
+        self.assertTrue(self.sync('not-a-cursor')['full'])
+        self.assertTrue(self.sync(foreign)['full'])
+
+    def test_students_only(self):
+        teacher = User.objects.create_user(email='teacher@example.com', name='Teacher', password='Passw0rd!', role='teacher')
+        self.client.force_authenticate(teacher)
+        self.assertEqual(self.client.get(reverse('progress:dashboard-sync')).status_code, 403)
+
+
+class AsyncViewTests(ProgressTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.auth = {'AUTHORIZATION': f"Bearer {get_tokens_for_user(self.student)['access']}"}
+
+    async def test_async_dashboard_matches_sync(self):
+        await sync_to_async(record_progress)(self.student, self.kinematics, 4)
+        expected = (await sync_to_async(self.client.get)(reverse('progress:dashboard'))).json()
+        await sync_to_async(cache.clear)()
+
+        response = await self.async_client.get(reverse('progress:async-dashboard'), headers=self.auth)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), expected)
+
+        not_modified = await self.async_client.get(
+            reverse('progress:async-dashboard'),
+            headers={**self.auth, 'If-None-Match': response['ETag']}
+        )
+        self.assertEqual(not_modified.status_code, 304)
+
+    async def test_async_stale_payload_keeps_its_etag(self):
+        first = await self.async_client.get(reverse('progress:async-dashboard'), headers=self.auth)
+        self.optics.title = 'Waves and Optics'
+        await self.optics.asave()
+
+        with mock.patch.object(caching, '_schedule_refresh', side_effect=caching.refresh_dashboard):
+            stale = await self.async_client.get(
+                reverse('progress:async-dashboard'),
+                headers={**self.auth, 'If-None-Match': first['ETag']}
+            )
+        fresh = await self.async_client.get(
+            reverse('progress:async-dashboard'),
+            headers={**self.auth, 'If-None-Match': first['ETag']}
+        )
+
+        self.assertEqual(stale.status_code, 304)
+        self.assertEqual(fresh.status_code, 200)
+        self.assertEqual(fresh.json()['data']['subjects'][0]['chapters'][1]['title'], 'Waves and Optics')
+
+    async def test_async_update(self):
+        response = await self.async_client.post(
+            reverse('progress:async-update'),
+            {'chapter_id': str(self.optics.id), 'videos_watched': 2},
+            content_type='application/json',
+            headers=self.auth
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data']['percentage'], 40.0)
+        rollup = await StudentSubjectProgress.objects.aget(student_id=self.student.id, subject=self.physics)
+        self.assertEqual(rollup.videos_watched, 2)
+
+    async def test_async_requires_token(self):
+        response = await self.async_client.get(reverse('progress:async-dashboard'))
+
+        self.assertEqual(response.status_code, 401)
+
+
+class RecordingFanout(live.LocalFanout):
+    """Keeps what was published, as a cross-process fan-out would see it"""
+    published = []
+
+    def publish(self, channel, message):
+        self.published.append((channel, message))
+        super().publish(channel, message)
+
+
+class LiveUpdateTests(ProgressTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.auth = {'AUTHORIZATION': f"Bearer {get_tokens_for_user(self.student)['access']}"}
+        self.addCleanup(live.reset_fanout)
+
+    def write(self, chapter, videos_watched):
+        with self.captureOnCommitCallbacks(execute=True):
+            record_progress(self.student, chapter, videos_watched)
+
+    async def open_stream(self, headers):
+        response = await self.async_client.get(reverse('progress:live'), headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        frames = aiter(response.streaming_content)
+        self.assertTrue((await anext(frames)).startswith(b'retry: '))
+        return frames
+
+    async def disconnect(self, frames):
+        # What the ASGI handler does when the client goes away
+        pending = asyncio.ensure_future(anext(frames))
+        await asyncio.sleep(0)
+        pending.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await pending
+
+    async def test_writes_are_pushed_to_student_and_class(self):
+        teacher = await sync_to_async(User.objects.create_user)(
+            email='teacher@example.com', name='Teacher', password='Passw0rd!', role='teacher'
+        )
+        teacher_auth = {'AUTHORIZATION': f"Bearer {(await sync_to_async(get_tokens_for_user)(teacher))['access']}"}
+        own = await self.open_stream(self.auth)
+        everyone = await self.open_stream(teacher_auth)
+
+        await sync_to_async(self.write)(self.optics, 2)
+        # An unchanged value is not pushed
+        await sync_to_async(self.write)(self.optics, 2)
+        await sync_to_async(self.write)(self.kinematics, 5)
+
+        for frames in (own, everyone):
+            events = [await anext(frames), await anext(frames)]
+            payloads = [json.loads(frame.decode().split('data: ', 1)[1]) for frame in events]
+            self.assertTrue(all(b'event: progress' in frame for frame in events))
+            self.assertEqual(
+                [(payload['chapter_id'], payload['videos_watched'], payload['percentage']) for payload in payloads],
+                [(str(self.optics.id), 2, 40.0), (str(self.kinematics.id), 5, 50.0)]
+            )
+            await self.disconnect(frames)
+        self.assertEqual(live.get_broker().stream_count(), 0)
+
+    async def test_heartbeat_and_resync_on_reconnect(self):
+        with self.settings(LIVE_HEARTBEAT_SECONDS=0.01):
+            frames = await self.open_stream({**self.auth, 'Last-Event-ID': '41'})
+            self.assertIn(b'event: resync', await anext(frames))
+            self.assertEqual(await anext(frames), live.HEARTBEAT_FRAME)
+            await self.disconnect(frames)
+        self.assertEqual(live.get_broker().stream_count(), 0)
+
+    async def test_slow_reader_gets_resync(self):
+        subscription = live.get_broker().subscribe([live.CLASS_CHANNEL], max_queued=3)
+        try:
+            for number in range(10):
+                live.get_broker().deliver(live.CLASS_CHANNEL, {'number': number})
+            # Deliveries are handed to the loop; let them run
+            await asyncio.sleep(0)
+
+            self.assertIs(await subscription.get(1), live.RESYNC_FRAME)
+            self.assertEqual(subscription.dropped, 10)
+            self.assertIsNone(await subscription.get(0.01))
+
+            live.get_broker().deliver(live.CLASS_CHANNEL, {'number': 10})
+            self.assertIn(b'"number":10', await subscription.get(1))
+        finally:
+            live.get_broker().unsubscribe(subscription)
+
+    async def remaining_frames(self, frames):
+        """Frames up to the end of the stream, which must come within a second"""
+        async def read():
+            return [frame async for frame in frames]
+        return await asyncio.wait_for(read(), 1)
+
+    async def test_stream_ends_when_account_changes(self):
+        teacher = await sync_to_async(User.objects.create_user)(
+            email='teacher@example.com', name='Teacher', password='Passw0rd!', role='teacher'
+        )
+        teacher_auth = {'AUTHORIZATION': f"Bearer {(await sync_to_async(get_tokens_for_user)(teacher))['access']}"}
+
+        with self.settings(LIVE_HEARTBEAT_SECONDS=0.01):
+            demoted = await self.open_stream(teacher_auth)
+            deactivated = await self.open_stream(self.auth)
+            self.assertEqual(await anext(demoted), live.HEARTBEAT_FRAME)
+
+            teacher.role = 'student'
+            await teacher.asave()
+            self.student.is_active = False
+            await self.student.asave()
+
+            for frames in (demoted, deactivated):
+                self.assertTrue(all(frame == live.HEARTBEAT_FRAME for frame in await self.remaining_frames(frames)))
+        self.assertEqual(live.get_broker().stream_count(), 0)
+
+    async def test_stream_lifetime_is_capped(self):
+        with self.settings(LIVE_MAX_STREAM_SECONDS=0.05):
+            frames = await self.open_stream(self.auth)
+            await self.remaining_frames(frames)
+        self.assertEqual(live.get_broker().stream_count(), 0)
+
+    def test_pluggable_fanout(self):
+        RecordingFanout.published = []
+        with self.settings(LIVE_FANOUT_BACKEND='progress.tests.RecordingFanout'):
+            live.reset_fanout()
+            self.write(self.algebra, 3)
+
+        self.assertEqual([channel for channel, _ in RecordingFanout.published], [
+            live.STUDENT_CHANNEL.format(self.student.id), live.CLASS_CHANNEL
+        ])
+
+    def test_needs_asgi(self):
+        response = self.client.get(reverse('progress:live'), headers=self.auth)
+
+        self.assertEqual(response.status_code, 501)
+
+
+class ClassAnalyticsTests(ProgressTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.teacher = User.objects.create_user(email='teacher@example.com', name='Teacher', role='teacher')
+        others = [
+            User.objects.create_user(email=f'student{i}@example.com', name=f'Student {i}')
+            for i in range(3)
+        ]
+        # Kinematics: 100%, 50%, 20% and one student not started
+        for student, watched in zip([self.student, *others], [10, 5, 2]):
+            record_progress(student, self.kinematics, watched)
+        self.client.force_authenticate(self.teacher)
+
+    def get_analytics(self):
+        response = self.client.get(reverse('progress:analytics'))
+        self.assertEqual(response.status_code, 200)
+        return response.json()['data']
+
+    def test_distributions(self):
+        physics, maths = self.get_analytics()['subjects']
+        kinematics = physics['chapters'][0]['summary']
+
+        self.assertEqual(kinematics['students'], 4)
+        self.assertEqual(kinematics['not_started'], 1)
+        self.assertEqual(kinematics['completed'], 1)
+        self.assertEqual(kinematics['mean_percentage'], 42.5)
+        self.assertEqual(kinematics['median_percentage'], 35.0)
+        self.assertEqual(kinematics['buckets'], {
+            'not_started': 1, '0-25': 1, '25-50': 0, '50-75': 1, '75-100': 0, 'completed': 1
+        })
+        # Physics has 15 videos: 66.7%, 33.3%, 13.3%, 0%
+        self.assertEqual(physics['summary']['median_percentage'], 23.3)
+        self.assertEqual(physics['summary']['completed'], 0)
+        self.assertEqual(maths['summary']['not_started'], 4)
+
+    def test_served_from_summaries_until_refreshed(self):
+        self.get_analytics()
+        record_progress(self.student, self.algebra, 8)
+
+        with CaptureQueriesContext(connection) as queries:
+            maths = self.get_analytics()['subjects'][1]
+        self.assertEqual(maths['summary']['completed'], 0)
+        self.assertFalse(any('"video_progress"' in query['sql'] for query in queries.captured_queries))
+
+        call_command('refresh_progress_summaries', stdout=StringIO())
+        self.assertEqual(self.get_analytics()['subjects'][1]['summary']['completed'], 1)
+
+    def test_students_forbidden(self):
+        self.client.force_authenticate(self.student)
+
+        response = self.client.get(reverse('progress:analytics'))
+
+        self.assertEqual(response.status_code, 403)
+
+
+class LeaderboardTests(ProgressTestCase):
+
+    def setUp(self):
+        super().setUp()
+        leaderboard.get_leaderboard().invalidate()
+        self.others = [
+            User.objects.create_user(email=f'student{i}@example.com', name=f'Student {i}')
+            for i in range(3)
+        ]
+        # Physics totals: 12, 7, 7, 0
+        record_progress(self.others[0], self.kinematics, 10)
+        record_progress(self.others[0], self.optics, 2)
+        record_progress(self.others[1], self.kinematics, 7)
+        record_progress(self.student, self.optics, 5)
+        record_progress(self.student, self.kinematics, 2)
+
+    def get_physics(self, **params):
+        response = self.client.get(reverse('progress:leaderboard'), {'subject': 'physics', **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()['data']['subjects'][0]
+
+    def test_top_and_rank(self):
+        physics = self.get_physics()
+
+        self.assertEqual(physics['students_ranked'], 3)
+        self.assertEqual([entry['rank'] for entry in physics['top']], [1, 2, 2])
+        self.assertEqual(physics['top'][0]['name'], 'Student 0')
+        self.assertEqual(physics['you'], {'rank': 2, 'videos_watched': 7})
+        self.assertEqual(len(self.get_physics(limit=1)['top']), 1)
+
+    def test_own_write_updates_rank(self):
+        self.get_physics()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('progress:update'), {
+                'chapter_id': str(self.kinematics.id), 'videos_watched': 10
+            }, format='json')
+
+        self.assertEqual(self.get_physics()['you'], {'rank': 1, 'videos_watched': 15})
+
+    def test_not_started_is_unranked(self):
+        self.client.force_authenticate(self.others[2])
+
+        self.assertEqual(self.get_physics()['you'], {'rank': None, 'videos_watched': 0})
+
+    def test_only_active_students_are_ranked(self):
+        teacher = User.objects.create_user(email='teacher@example.com', name='Teacher', role='teacher')
+        record_progress(teacher, self.kinematics, 10)
+        self.others[0].is_active = False
+        self.others[0].save()
+        leaderboard.get_leaderboard().invalidate()
+
+        physics = self.get_physics()
+
+        self.assertEqual(physics['students_ranked'], 2)
+        self.assertEqual({entry['name'] for entry in physics['top']}, {'Student 1', 'Student'})
+        self.assertEqual(physics['you'], {'rank': 1, 'videos_watched': 7})
+
+    def test_sync_queries_outside_the_lock(self):
+        board = leaderboard.get_leaderboard()
+        board.sync()
+        locked = []
+        rows = board._rows
+
+        def checked_rows(queryset):
+            locked.append(board._lock.locked())
+            return rows(queryset)
+
+        board.mark_stale()
+        with mock.patch.object(board, '_rows', side_effect=checked_rows):
+            board.sync()
+
+        self.assertEqual(locked, [False])
+
+    def test_ranking_matches_sort(self):
+        ranking = leaderboard.SubjectRanking(size=4)
+        scores = {}
+        rng = random.Random(7)
+        for _ in range(500):
+            slot, score = rng.randrange(50), rng.randrange(40)
+            ranking.set(slot, score)
+            scores[slot] = score
+
+        for slot, score in scores.items():
+            expected = 1 + sum(other > score for other in scores.values()) if score else None
+            self.assertEqual(ranking.rank_of_score(ranking.score(slot)), expected)
+
+
+class ExportTests(ProgressTestCase):
+
+    def setUp(self):
+        super().setUp()
+        record_progress(self.student, self.kinematics, 5)
+        record_progress(self.student, self.algebra, 8)
+        VideoProgress.objects.filter(chapter=self.algebra).update(last_watched_at=datetime(2026, 1, 10, tzinfo=dt_timezone.utc))
+        self.teacher = User.objects.create_user(email='teacher@example.com', name='Teacher', role='teacher')
+        self.client.force_authenticate(self.teacher)
+
+    def export(self, **params):
+        response = self.client.get(reverse('progress:export'), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_ndjson(self):
+        rows = [json.loads(line) for line in self.export().splitlines()]
+
+        self.assertEqual(len(rows), 2)
+        kinematics = next(row for row in rows if row['chapter_title'] == 'Kinematics')
+        self.assertEqual(kinematics['student_email'], 'student@example.com')
+        self.assertEqual(kinematics['subject'], 'physics')
+        self.assertEqual(kinematics['percentage'], 50.0)
+
+    def test_csv_with_filters(self):
+        rows = list(csv.reader(StringIO(self.export(output='csv', subject='maths', until='2026-01-10'))))
+
+        self.assertEqual(rows[0][:3], ['student_id', 'student_email', 'student_name'])
+        self.assertEqual([row[5] for row in rows[1:]], ['Algebra'])
+        self.assertEqual(len(list(csv.reader(StringIO(self.export(output='csv', since='2026-01-11'))))), 2)
+
+    def test_rejects_bad_parameters(self):
+        self.assertEqual(self.client.get(reverse('progress:export'), {'output': 'xml'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('progress:export'), {'since': 'yesterday'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('progress:export'), {'subject': 'biology'}).status_code, 404)
+
+        self.client.force_authenticate(self.student)
+        self.assertEqual(self.client.get(reverse('progress:export')).status_code, 403)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('export_progress', '--subject', 'physics', stdout=out)
+
+        self.assertEqual([json.loads(line)['chapter_title'] for line in out.getvalue().splitlines()], ['Kinematics'])
+
+
+class BulkImportTests(ProgressTestCase):
+
+    def write_file(self, suffix, content):
+        handle = tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False, encoding='utf-8')
+        with handle:
+            handle.write(content)
+        self.addCleanup(os.remove, handle.name)
+        return handle.name
+
+    def run_import(self, *args):
+        out = StringIO()
+        call_command('bulk_import', *args, stdout=out)
+        return json.loads(out.getvalue())
+
+    def test_roster(self):
+        path = self.write_file('.csv', (
+            'email,name,role,password\n'
+            'New@Example.com,New Teacher,teacher,Passw0rd!\n'
+            'student@example.com,Renamed,student,\n'
+            'other@example.com,Other,admin,\n'
+            'quiet@example.com,Quiet,,\n'
+        ))
+
+        report = self.run_import('roster', path, '--hash-workers', '2')
+
+        self.assertEqual(report['rows_read'], 4)
+        self.assertEqual((report['rows_written'], report['rows_skipped']), (2, 1))
+        self.assertEqual(report['errors'], ['line 4: role must be one of student, teacher'])
+        teacher = User.objects.get(email='new@example.com')
+        self.assertEqual(teacher.role, 'teacher')
+        self.assertTrue(teacher.check_password('Passw0rd!'))
+        self.assertFalse(User.objects.get(email='quiet@example.com').has_usable_password())
+        # Existing users are skipped without --update
+        self.assertEqual(User.objects.get(email='student@example.com').name, 'Student')
+
+        # Nothing new the second time
+        report = self.run_import('roster', path, '--hash-workers', '0')
+        self.assertEqual((report['rows_written'], report['rows_skipped']), (0, 3))
+
+        report = self.run_import('roster', path, '--hash-workers', '0', '--update')
+        self.assertEqual((report['rows_written'], report['rows_skipped']), (3, 0))
+        self.student.refresh_from_db()
+        self.assertEqual(self.student.name, 'Renamed')
+        self.assertTrue(self.student.check_password('Passw0rd!'))
+
+    def test_catalog(self):
+        catalog.get_catalog()
+        path = self.write_file('.ndjson', '\n'.join([
+            json.dumps({'subject': 'physics', 'title': 'Kinematics', 'total_videos': 12}),
+            json.dumps({'subject': 'chemistry', 'title': 'Atoms', 'total_videos': 6, 'order': 1}),
+            'not json',
+        ]))
+
+        report = self.run_import('catalog', path, '--update')
+
+        self.assertEqual(report['rows_written'], 2)
+        self.assertEqual(report['errors'], ['line 3: not a JSON object'])
+        self.assertEqual(Subject.objects.get(name='chemistry').display_name, 'Chemistry')
+        self.assertEqual(catalog.get_chapter(self.kinematics.id).total_videos, 12)
+
+        report = self.run_import('catalog', path)
+        self.assertEqual((report['rows_written'], report['rows_skipped']), (0, 2))
+
+
+class HistoryTests(ProgressTestCase):
+
+    def days_ago(self, days):
+        return timezone.now() - timedelta(days=days)
+
+    def test_writes_append_events_for_changes(self):
+        record_progress(self.student, self.kinematics, 3)
+        record_progress(self.student, self.kinematics, 3)
+        record_progress(self.student, self.kinematics, 5)
+
+        self.assertEqual(list(ProgressEvent.objects.order_by('id').values_list('videos_watched', 'delta')), [(3, 3), (5, 2)])
+
+        today = self.client.get(reverse('progress:history')).json()['data']['days'][-1]
+        self.assertEqual(today['videos_gained'], 5)
+        self.assertEqual(today['chapters'][0]['title'], 'Kinematics')
+
+    def test_compaction_and_pruning(self):
+        record_progress(self.student, self.kinematics, 4)
+        record_progress(self.student, self.optics, 2)
+        ProgressEvent.objects.update(created_at=self.days_ago(3))
+        record_progress(self.student, self.kinematics, 1)
+        ProgressEvent.objects.filter(delta=-3).update(created_at=self.days_ago(2))
+        record_progress(self.student, self.algebra, 6)
+
+        call_command('compact_progress_events', '--retention-days', '0', stdout=StringIO())
+
+        self.assertEqual(DailyProgress.objects.count(), 3)
+        kinematics = DailyProgress.objects.get(chapter=self.kinematics, day=self.days_ago(2).date())
+        self.assertEqual((kinematics.videos_gained, kinematics.net_change), (0, -3))
+        # Everything before the last compacted day (yesterday) is pruned
+        self.assertEqual(ProgressEvent.objects.count(), 1)
+
+        days = self.client.get(reverse('progress:history'), {'days': 4}).json()['data']['days']
+        self.assertEqual([day['net_change'] for day in days], [6, -3, 0, 6])
+
+        # Re-running does not double count
+        call_command('compact_progress_events', stdout=StringIO())
+        self.assertEqual(DailyProgress.objects.get(chapter=self.optics).videos_gained, 2)
+
+
+class QueryPlanTests(APITestCase):
+    """
+    EXPLAIN the hot queries on a seeded database and fail when a plan falls
+    back to a full table scan or stops using the index it was built for
+
+    No ANALYZE is run: with statistics from a tiny seed the planner would
+    (rightly) scan; without them it plans as for large tables.
+    """
+
+    # Plan lines that read a whole table
+    FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)$|Seq Scan on (\w+)')
+
+    @classmethod
+    def setUpTestData(cls):
+        subjects = [
+            Subject.objects.create(name=name, display_name=name.title(), order=order)
+            for order, name in enumerate(['physics', 'chemistry', 'maths'])
+        ]
+        chapters = Chapter.objects.bulk_create([
+            Chapter(subject=subject, title=f'Chapter {number}', order=number, total_videos=10)
+            for subject in subjects for number in range(10)
+        ])
+        students = User.objects.bulk_create([
+            User(email=f'student{number}@example.com', name=f'Student {number}', role='student')
+            for number in range(200)
+        ])
+        rng = random.Random(17)
+        VideoProgress.objects.bulk_create([
+            VideoProgress(student=student, chapter=chapter, videos_watched=rng.randint(0, 10))
+            for student in students for chapter in rng.sample(chapters, 8)
+        ])
+        cls.physics = subjects[0]
+        cls.chapters = chapters
+        cls.student = students[0]
+        cls.admin = User.objects.create_superuser(email='admin@example.com', name='Admin', password='Passw0rd!')
+
+    def query_plan(self, queryset):
+        return self.sql_plan(*queryset.query.sql_with_params())
+
+    def sql_plan(self, sql, params=()):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # Sequential scans always win on test-sized tables
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}', params)
+            return [str(row[-1]) for row in cursor.fetchall()]
+
+    def assertIndexedPlan(self, queryset, index=None):
+        plan = self.query_plan(queryset) if isinstance(queryset, QuerySet) else self.sql_plan(queryset)
+        text = '\n'.join(plan)
+        scans = [line for line in plan if self.FULL_SCAN.search(line.strip())]
+        self.assertEqual(scans, [], f'Full scan in plan:\n{text}')
+        if index:
+            self.assertIn(index, text, f'{index} not used:\n{text}')
+
+    def changelist(self, **params):
+        request = RequestFactory().get('/admin/progress/videoprogress/', params)
+        request.user = self.admin
+        return VideoProgressAdmin(VideoProgress, admin.site).get_changelist_instance(request)
+
+    def test_dashboard(self):
+        self.assertIndexedPlan(dashboard._rollup_rows(self.student))
+        self.assertIndexedPlan(dashboard._progress_rows(self.student), 'vp_student_covering_idx')
+        self.assertIndexedPlan(Chapter.objects.filter(subject=self.physics), 'chapter_subject_order_idx')
+
+    def test_dashboard_sync(self):
+        rows = sharding.student_rows(self.student.id).values_list(*sync.PROGRESS_FIELDS)
+        self.assertIndexedPlan(rows, 'vp_student_covering_idx')
+        if connection.vendor == 'sqlite':
+            self.assertIn('COVERING INDEX', '\n'.join(self.query_plan(rows)))
+
+    def test_update(self):
+        previous = VideoProgress.objects.filter(
+            student_id__in=[self.student.id], chapter_id__in=[chapter.id for chapter in self.chapters[:3]]
+        ).values_list('student_id', 'chapter_id', 'videos_watched')
+        self.assertIndexedPlan(previous, 'vp_student_covering_idx')
+        self.assertIndexedPlan(StudentSubjectProgress.objects.filter(student=self.student, subject=self.physics))
+        self.assertIndexedPlan(ProgressEvent.objects.filter(student=self.student, created_at__gte=timezone.now()))
+
+    def test_admin_list(self):
+        page = self.changelist()
+        self.assertIndexedPlan(page.queryset[:page.list_per_page], 'vp_last_watched_idx')
+        by_subject = self.changelist(chapter__subject__id__exact=str(self.physics.id))
+        self.assertIndexedPlan(by_subject.queryset[:by_subject.list_per_page], 'vp_chapter_watched_idx')
+        self.assertIndexedPlan(by_subject.queryset.order_by(), 'vp_chapter_watched_idx')
+        recent = self.changelist(last_watched_at__gte=(timezone.now() - timedelta(days=7)).isoformat())
+        self.assertIndexedPlan(recent.queryset[:recent.list_per_page], 'vp_last_watched_idx')
+
+        users = User.objects.filter(role='student').order_by('-date_joined')[:100]
+        self.assertIndexedPlan(users, 'users_role_joined_idx')
+
+        with self.settings(ADMIN_KEYSET_PAGINATION=True), CaptureQueriesContext(connection) as queries:
+            deep = self.changelist(after=f"{timezone.now().isoformat()}~{self.student.pk}")
+        page = [query['sql'] for query in queries if f'LIMIT {deep.list_per_page + 1}' in query['sql']]
+        self.assertEqual(len(page), 1)
+        self.assertIndexedPlan(page[0], 'vp_last_watched_idx')
+
+    def test_export(self):
+        since = timezone.now() - timedelta(days=7)
+        self.assertIndexedPlan(export.export_queryset(since=since), 'vp_last_watched_idx')
+        self.assertIndexedPlan(export.export_queryset(subject='physics'), 'vp_chapter_watched_idx')
+        self.assertIndexedPlan(export.export_queryset(subject='physics', since=since), 'vp_chapter_watched_idx')
+
+
+class AdminChangelistTests(ProgressTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_superuser(email='admin@example.com', name='Admin', password='Passw0rd!')
+        students = User.objects.bulk_create([
+            User(email=f'student{number}@example.com', name=f'Student {number}') for number in range(40)
+        ])
+        VideoProgress.objects.bulk_create([
+            VideoProgress(student=student, chapter=chapter, videos_watched=number % 6)
+            for number, student in enumerate(students) for chapter in (self.kinematics, self.optics)
+        ])
+        self.client.force_login(self.admin)
+        self.url = reverse('admin:progress_videoprogress_changelist')
+
+    def test_query_budget(self):
+        # Session, user, subject filter, statistics check, count, page, then one
+        # query each for the page's students, chapters and subjects; not per row
+        with self.assertNumQueries(9):
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cl'].result_count, 80)
+        self.assertContains(response, '100.0%')
+
+    def test_estimated_count_for_large_unfiltered_tables(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        VideoProgress.objects.bulk_create([VideoProgress(student=self.student, chapter=self.algebra)])
+
+        with self.settings(ADMIN_ESTIMATED_COUNT_THRESHOLD=10):
+            self.assertEqual(self.client.get(self.url).context['cl'].result_count, 80)
+            filtered = self.client.get(self.url, {'chapter__subject__id__exact': str(self.maths.id)})
+            self.assertEqual(filtered.context['cl'].result_count, 1)
+        self.assertEqual(self.client.get(self.url).context['cl'].result_count, 81)
+
+    def test_email_prefix_search(self):
+        response = self.client.get(self.url, {'q': 'STUDENT1'})
+
+        emails = {row.student.email for row in response.context['cl'].result_list}
+        self.assertEqual(emails, {'student1@example.com'} | {f'student1{n}@example.com' for n in range(10)})
+
+    def test_search_by_name_and_chapter(self):
+        record_progress(self.student, self.algebra, 2)
+        student = User.objects.create_user(email='Ada.Lovelace@example.com', name='Ada Lovelace')
+        record_progress(student, self.kinematics, 1)
+
+        for term, expected in (('ada.l', student), ('lovelace', student), ('algebra', self.student)):
+            with self.subTest(term=term):
+                rows = self.client.get(self.url, {'q': term}).context['cl'].result_list
+                self.assertEqual([row.student for row in rows], [expected])
+
+    @override_settings(ADMIN_KEYSET_PAGINATION=True)
+    def test_keyset_pagination(self):
+        # Ties on last_watched_at are broken by pk
+        VideoProgress.objects.filter(chapter=self.optics).update(last_watched_at=timezone.now())
+        seen = []
+        url = self.url
+        with mock.patch.object(VideoProgressAdmin, 'list_per_page', 30):
+            while url:
+                cl = self.client.get(url).context['cl']
+                seen += [(row.last_watched_at, row.pk) for row in cl.result_list]
+                url = cl.keyset['next_url'] and self.url + cl.keyset['next_url']
+
+        self.assertEqual(len(seen), 80)
+        self.assertEqual(seen, sorted(set(seen), reverse=True))
+        self.assertEqual(self.client.get(self.url, {'after': 'garbage'}).status_code, 302)
+
+
+class BenchmarkCommandTests(APITestCase):
+
+    def test_bench_api_report(self):
+        out = StringIO()
+        call_command(
+            'bench_api', '--users', '5', '--chapters', '3', '--progress', '2', '--flows', 'verify,dashboard,update',
+            '--requests', '6', '--warmup', '1', stdout=out
+        )
+
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['dataset']['progress_rows'], 10)
+        self.assertEqual(set(report['flows']), {'verify', 'dashboard', 'update'})
+        for flow in report['flows'].values():
+            self.assertEqual((flow['requests'], flow['failures']), (6, 0))
+            self.assertIsNotNone(flow['queries_per_request'])
+            self.assertLessEqual(flow['latency_ms']['p50'], flow['latency_ms']['p99'])
+        # Seeded data is removed
+        self.assertFalse(User.objects.filter(email__startswith='bench-').exists())
+        self.assertFalse(Subject.objects.exists())
+
+    def test_bench_progress_shards_report(self):
+        out = StringIO()
+        # The writer threads connect to the benchmark's own throwaway databases
+        aliases = {'bench_shard_1_1', 'bench_shard_2_1', 'bench_shard_2_2'}
+        with mock.patch.object(type(self), 'databases', self.databases | aliases):
+            call_command('bench_progress_shards', '--shards', '1,2', '--writers', '2', '--writes', '20', stdout=out)
+
+        report = json.loads(out.getvalue())
+        self.assertEqual(set(report['shards']), {'1', '2'})
+        self.assertEqual(report['shards']['1']['speedup'], 1.0)
+        for result in report['shards'].values():
+            self.assertEqual(result['writes'], 20)
+            self.assertEqual(sum(result['writes_per_shard'].values()), 20)
+        self.assertFalse(any(alias.startswith('bench_shard') for alias in connections.settings))
+
+
+class InstrumentationTests(ProgressTestCase):
+
+    def setUp(self):
+        super().setUp()
+        instrumentation.get_registry().reset()
+
+    def server_timing(self, response):
+        return dict(entry.split(';', 1) for entry in response['Server-Timing'].split(', '))
+
+    def test_server_timing_header(self):
+        record_progress(self.student, self.kinematics, 4)
+        self.assertNotIn('Server-Timing', self.client.get(reverse('progress:dashboard')))
+
+        # Staff only
+        self.student.is_staff = True
+        self.student.save()
+        cache.clear()
+        timing = self.server_timing(self.client.get(reverse('progress:dashboard')))
+
+        self.assertEqual(set(timing), {'app', 'db', 'render'})
+        self.assertRegex(timing['db'], r'desc="[1-9]\d* queries";dur=\d')
+
+    @override_settings(METRICS_TOKEN='scrape-secret')
+    def test_metrics_endpoint(self):
+        self.client.get(reverse('progress:dashboard'))
+        self.client.get(reverse('progress:dashboard'))
+        self.client.post(reverse('progress:update'), {'chapter_id': str(self.optics.id)}, format='json')
+
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        self.assertEqual(self.client.get(reverse('metrics'), headers={'Authorization': 'Bearer sécret'}).status_code, 403)
+        response = self.client.get(reverse('metrics'), headers={'Authorization': 'Bearer scrape-secret'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('http_requests_total{view="progress:dashboard",method="GET",status="200"} 2', body)
+        self.assertIn('http_requests_total{view="progress:update",method="POST",status="400"} 1', body)
+        self.assertIn('http_request_duration_seconds_bucket{view="progress:dashboard",method="GET",le="+Inf"} 2', body)
+        self.assertIn('http_request_db_queries_count{view="progress:dashboard"} 2', body)
+        self.assertIn('http_response_size_bytes_count{view="progress:dashboard"} 2', body)
+
+    def test_metrics_need_token_outside_debug(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+
+    async def test_async_view_queries_are_counted(self):
+        await User.objects.filter(pk=self.student.pk).aupdate(is_staff=True)
+        auth = {'AUTHORIZATION': f"Bearer {await sync_to_async(lambda: get_tokens_for_user(self.student)['access'])()}"}
+
+        response = await self.async_client.get(reverse('progress:async-dashboard'), headers=auth)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(self.server_timing(response)['db'], r'desc="[1-9]\d* queries"')
+
+
+class ProfilingTests(ProgressTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.staff = User.objects.create_user(
+            email='staff@example.com', name='Staff', password='Passw0rd!', is_staff=True
+        )
+        self.client.force_authenticate(None)
+
+    def bearer(self, user):
+        return {'Authorization': f"Bearer {get_tokens_for_user(user)['access']}"}
+
+    def test_staff_request_is_profiled(self):
+        response = self.client.get(
+            reverse('progress:dashboard'), headers={**self.bearer(self.staff), 'X-Profile': 'cprofile'}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        profile = RequestProfile.objects.get(pk=response['X-Profile-Id'])
+        self.assertEqual((profile.view_name, profile.trigger, profile.requested_by_id), ('progress:dashboard', 'requested', self.staff.id))
+        self.assertIn('dashboard_view', profile.summary)
+        with tempfile.NamedTemporaryFile(suffix='.prof') as stored:
+            stored.write(bytes(profile.data))
+            stored.flush()
+            self.assertGreater(pstats.Stats(stored.name).total_calls, 0)
+
+    def test_sampler_stores_collapsed_stacks(self):
+        response = self.client.get(reverse('progress:dashboard'), {'_profile': 'sample'}, headers=self.bearer(self.staff))
+
+        profile = RequestProfile.objects.get(pk=response['X-Profile-Id'])
+        self.assertEqual(profile.mode, 'sample')
+        for line in bytes(profile.data).decode().splitlines():
+            self.assertRegex(line, r'^\S.* \d+$')
+
+    def test_flag_ignored_for_non_staff(self):
+        response = self.client.get(
+            reverse('progress:dashboard'), headers={**self.bearer(self.student), 'X-Profile': 'cprofile'}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertFalse(RequestProfile.objects.exists())
+
+    @override_settings(PROFILE_SAMPLE_RATE=1.0, PROFILE_KEEP_SLOWEST=2)
+    def test_random_sampling_keeps_slowest(self):
+        for _ in range(4):
+            response = self.client.get(reverse('progress:dashboard'), headers=self.bearer(self.student))
+            self.assertNotIn('X-Profile-Id', response)
+
+        durations = list(RequestProfile.objects.filter(trigger='sampled').values_list('duration_ms', flat=True))
+        self.assertEqual(len(durations), 2)
+
+    def test_admin_download(self):
+        response = self.client.get(
+            reverse('progress:dashboard'), headers={**self.bearer(self.staff), 'X-Profile': 'sample'}
+        )
+        admin_user = User.objects.create_superuser(email='admin@example.com', name='Admin', password='Passw0rd!')
+        self.client.force_login(admin_user)
+
+        download = self.client.get(reverse('admin:progress_requestprofile_download', args=[response['X-Profile-Id']]))
+
+        self.assertEqual(download.status_code, 200)
+        self.assertIn(f"profile-{response['X-Profile-Id']}.folded", download['Content-Disposition'])
+        self.assertEqual(self.client.get(reverse('admin:progress_requestprofile_changelist')).status_code, 200)
+
+
+@skipUnless('replica' in settings.DATABASES, 'needs the local replica database')
+@override_settings(DATABASE_READ_REPLICAS=['replica'])
+class ReplicaRoutingTests(ProgressTestCase):
+    """The 'replica' SQLite database stands in for a replica that lags until replicate() copies rows"""
+    databases = {'default', 'replica'}
+
+    def replicate(self, *models):
+        for model in models:
+            model.objects.using('replica').all().delete()
+            model.objects.using('replica').bulk_create(list(model.objects.using('default').all()))
+
+    def setUp(self):
+        super().setUp()
+        self.replicate(User, Subject, Chapter, CatalogVersion)
+
+    def watched(self):
+        chapters = self.client.get(reverse('progress:dashboard')).json()['data']['subjects'][0]['chapters']
+        return chapters[0]['watched_videos']
+
+    def test_sync_reads_replica_except_right_after_a_write(self):
+        def synced():
+            chapters = self.client.get(reverse('progress:dashboard-sync')).json()['data']['chapters']
+            return next(chapter['watched_videos'] for chapter in chapters if chapter['id'] == str(self.kinematics.id))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            record_progress(self.student, self.kinematics, 4)
+
+        # Sticky: the student's own write is visible at once
+        self.assertEqual(synced(), 4)
+
+        # Window over (cache cleared): read from the lagging replica
+        cache.clear()
+        self.assertEqual(synced(), 0)
+
+        self.replicate(VideoProgress, StudentSubjectProgress)
+        self.assertEqual(synced(), 4)
+
+    def test_dashboard_is_built_on_the_primary(self):
+        # Cached under the current progress version, so never from a
+        # replica that may not have the write behind it yet
+        record_progress(self.student, self.kinematics, 4)
+        cache.clear()
+
+        self.assertEqual(self.watched(), 4)
+
+    def test_catalog_is_read_on_the_primary(self):
+        self.kinematics.title = 'Motion'
+        self.kinematics.save()
+        catalog.invalidate()
+
+        with routers.replica_reads():
+            snapshot = catalog.get_catalog()
+
+        self.assertEqual(snapshot.get_chapter(self.kinematics.id).title, 'Motion')
+        self.assertEqual(snapshot.generation, CatalogVersion.objects.using('default').get().generation)
+
+    def test_writes_go_to_primary(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('progress:update'), {'chapter_id': str(self.optics.id), 'videos_watched': 3}, format='json'
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(VideoProgress.objects.using('default').get().videos_watched, 3)
+        self.assertFalse(VideoProgress.objects.using('replica').exists())
+        self.assertTrue(routers.is_sticky(self.student.id))
+
+    def test_export_and_analytics_read_replica(self):
+        record_progress(self.student, self.kinematics, 4)
+        teacher = User.objects.create_user(email='teacher@example.com', name='Teacher', role='teacher')
+        self.client.force_authenticate(teacher)
+
+        export_response = self.client.get(reverse('progress:export'))
+        self.assertEqual(b''.join(export_response.streaming_content), b'')
+
+        analytics = self.client.get(reverse('progress:analytics')).json()['data']
+        # Computed from the replica, where the student has not started yet,
+        # and written to the primary
+        self.assertEqual(analytics['subjects'][0]['summary']['not_started'], 1)
+        self.assertTrue(SubjectCompletionSummary.objects.using('default').exists())
+        self.assertFalse(SubjectCompletionSummary.objects.using('replica').exists())
+
+    @override_settings(DATABASE_READ_REPLICAS=[])
+    def test_without_replicas_reads_stay_on_primary(self):
+        record_progress(self.student, self.kinematics, 4)
+
+        self.assertEqual(self.watched(), 4)
+        self.assertEqual(routers.read_alias(), 'default')
+
+
+@skipUnless({'shard1', 'shard2'} <= set(settings.DATABASES), 'needs the local shard databases')
+@override_settings(PROGRESS_SHARDS=['shard1', 'shard2'])
+class ShardingTests(ProgressTestCase):
+    """The local 'shard1' and 'shard2' SQLite databases hold VideoProgress"""
+    databases = {'default', 'shard1', 'shard2'}
+
+    def setUp(self):
+        super().setUp()
+        # Fixed ids, so the students land on both shards every run
+        self.students = [self.student] + [
+            User.objects.create_user(email=f'student{i}@example.com', name=f'Student {i}', id=uuid.UUID(int=i + 1))
+            for i in range(7)
+        ]
+
+    def rows_on(self, alias):
+        return set(VideoProgress.objects.using(alias).values_list('student_id', flat=True))
+
+    def foreign_keys(self, alias):
+        with connections[alias].cursor() as cursor:
+            constraints = connections[alias].introspection.get_constraints(cursor, 'video_progress')
+        return {constraint['foreign_key'] for constraint in constraints.values() if constraint['foreign_key']}
+
+    def test_jump_hash_moves_only_keys_for_the_new_shard(self):
+        keys = range(0, 2 ** 64, 2 ** 64 // 4000)
+        moved = [key for key in keys if sharding.jump_hash(key, 4) != sharding.jump_hash(key, 5)]
+
+        self.assertTrue(all(sharding.jump_hash(key, 5) == 4 for key in moved))
+        self.assertAlmostEqual(len(moved) / len(keys), 1 / 5, delta=0.03)
+
+    def test_writes_go_to_the_students_shard(self):
+        for watched, student in enumerate(self.students, start=1):
+            record_progress(student, self.kinematics, watched)
+
+        expected = {alias: set() for alias in ('shard1', 'shard2')}
+        for student in self.students:
+            expected[sharding.shard_for(student.id)].add(student.id)
+        self.assertTrue(expected['shard1'] and expected['shard2'])
+        self.assertEqual(self.rows_on('shard1'), expected['shard1'])
+        self.assertEqual(self.rows_on('shard2'), expected['shard2'])
+        self.assertFalse(VideoProgress.objects.using('default').exists())
+        # Rollups stay on the primary
+        self.assertEqual(StudentSubjectProgress.objects.get(student=self.student).videos_watched, 1)
+
+        response = self.client.post(
+            reverse('progress:update'), {'chapter_id': str(self.optics.id), 'videos_watched': 3}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        chapters = self.client.get(reverse('progress:dashboard')).json()['data']['subjects'][0]['chapters']
+        self.assertEqual([chapter['watched_videos'] for chapter in chapters], [1, 3])
+
+    def test_rollups_analytics_and_export_read_every_shard(self):
+        for student in self.students:
+            record_progress(student, self.kinematics, 5)
+            record_progress(student, self.algebra, 8)
+        StudentSubjectProgress.objects.update(videos_watched=0)
+
+        call_command('rebuild_progress_rollups', stdout=StringIO())
+        self.assertEqual(
+            set(StudentSubjectProgress.objects.values_list('videos_watched', flat=True)), {5, 8}
+        )
+
+        teacher = User.objects.create_user(email='teacher@example.com', name='Teacher', role='teacher')
+        self.client.force_authenticate(teacher)
+        physics = self.client.get(reverse('progress:analytics')).json()['data']['subjects'][0]
+        self.assertEqual(physics['chapters'][0]['summary']['students'], 8)
+        self.assertEqual(physics['chapters'][0]['summary']['buckets']['50-75'], 8)
+
+        response = self.client.get(reverse('progress:export'), {'subject': 'maths'})
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(rows), 8)
+        self.assertEqual({row['chapter_title'] for row in rows}, {'Algebra'})
+        self.assertIn('student@example.com', {row['student_email'] for row in rows})
+        self.assertEqual(rows[0]['percentage'], 100.0)
+
+    def test_reshard_moves_rows_to_their_shard(self):
+        # Written before sharding, and while there was only one shard
+        with self.settings(PROGRESS_SHARDS=[]):
+            record_progress(self.student, self.kinematics, 4)
+        with self.settings(PROGRESS_SHARDS=['shard1']):
+            for student in self.students[1:]:
+                record_progress(student, self.kinematics, 2)
+        last_watched = VideoProgress.objects.using('default').get().last_watched_at
+
+        out = StringIO()
+        call_command('reshard_progress', '--dry-run', stdout=out)
+        self.assertIn('default -> ', out.getvalue())
+        self.assertEqual(VideoProgress.objects.using('default').count(), 1)
+
+        with mock.patch.object(services, 'refresh_rollups') as refresh_rollups:
+            call_command('reshard_progress', stdout=out)
+
+        # Moved rows are deleted without per-row signals
+        refresh_rollups.assert_not_called()
+        self.assertFalse(VideoProgress.objects.using('default').exists())
+        for student in self.students:
+            self.assertEqual(self.rows_on(sharding.shard_for(student.id)) & {student.id}, {student.id})
+        self.assertEqual(len(self.rows_on('shard1')) + len(self.rows_on('shard2')), 8)
+        self.assertEqual(sharding.student_rows(self.student.id).get().last_watched_at, last_watched)
+        # Nothing left to move
+        self.assertEqual(sum(sharding.reshard().values()), 0)
+
+    def test_deleting_a_student_or_chapter_deletes_their_shard_rows(self):
+        for student in self.students:
+            record_progress(student, self.kinematics, 2)
+            record_progress(student, self.algebra, 2)
+
+        student_id, algebra_id = self.student.id, self.algebra.id
+        self.student.delete()
+        self.assertFalse(sharding.student_rows(student_id).exists())
+        self.algebra.delete()
+        for alias in ('shard1', 'shard2'):
+            self.assertFalse(VideoProgress.objects.using(alias).filter(chapter_id=algebra_id).exists())
+        self.assertEqual(
+            sum(VideoProgress.objects.using(alias).count() for alias in ('shard1', 'shard2')), 7
+        )
+
+    def test_migrate_keeps_to_the_database_it_runs_on(self):
+        record_progress(self.student, self.kinematics, 4)
+        rollups = list(StudentSubjectProgress.objects.values_list('student_id', 'subject_id', 'videos_watched'))
+
+        with tempfile.TemporaryDirectory() as directory:
+            for alias in ('new_shard', 'new_primary'):
+                connections.settings[alias] = connections.configure_settings({
+                    'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': os.path.join(directory, alias)}
+                })['default']
+            try:
+                with mock.patch.object(type(self), 'databases', {*self.databases, 'new_shard', 'new_primary'}), \
+                        self.settings(PROGRESS_SHARDS=['shard1', 'shard2', 'new_shard']):
+                    call_command('migrate', database='new_shard', verbosity=0)
+                    call_command('migrate', database='new_primary', verbosity=0)
+
+                    self.assertEqual(
+                        set(connections['new_shard'].introspection.table_names()),
+                        {'django_migrations', 'video_progress'}
+                    )
+                    self.assertFalse(StudentSubjectProgress.objects.using('new_primary').exists())
+                    self.assertTrue(CatalogVersion.objects.using('new_primary').exists())
+                    self.assertEqual(self.foreign_keys('new_shard'), set())
+            finally:
+                for alias in ('new_shard', 'new_primary'):
+                    connections[alias].close()
+                    del connections[alias]
+                    del connections.settings[alias]
+
+        self.assertEqual(
+            list(StudentSubjectProgress.objects.values_list('student_id', 'subject_id', 'videos_watched')), rollups
+        )
+        # Only the primary, which has users and chapters, keeps the constraints
+        self.assertEqual(self.foreign_keys('default'), {('chapters', 'id'), ('users', 'id')})
@@ -2,11 +2,23 @@
 URL Configuration for progress app
 """
 from django.urls import path
-from . import views
+from . import views, async_views
 
 app_name = 'progress'
 
 urlpatterns = [
     path('dashboard/', views.dashboard_view, name='dashboard'),
+    path('dashboard/sync/', views.dashboard_sync_view, name='dashboard-sync'),
     path('update/', views.update_progress_view, name='update'),
+    path('update/batch/', views.update_progress_batch_view, name='update-batch'),
+    path('write-behind/stats/', views.write_behind_stats_view, name='write-behind-stats'),
+    path('analytics/', views.class_analytics_view, name='analytics'),
+    path('leaderboard/', views.leaderboard_view, name='leaderboard'),
+    path('export/', views.export_progress_view, name='export'),
+    path('history/', views.history_view, name='history'),
+
+    # Native async variants for ASGI deployments
+    path('async/dashboard/', async_views.dashboard_view, name='async-dashboard'),
+    path('async/update/', async_views.update_progress_view, name='async-update'),
+    path('live/', async_views.live_view, name='live'),
 ]
\ No newline at end of file
@@ -3,21 +3,49 @@ Progress and Dashboard Views
 """
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
-from django.db.models import Sum
-from .models import Subject, Chapter, VideoProgress
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+from backend.routers import reads_from_replica, read_alias
+from .analytics import get_class_analytics
+from .caching import get_dashboard, dashboard_etag
+from .services import save_progress
+from .sync import sync_dashboard
+from . import catalog, export, history, leaderboard, writebehind
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+def monotonic_flag(data):
+    """Per-request override of PROGRESS_MONOTONIC_UPDATES, None if not given"""
+    monotonic = data.get('monotonic') if isinstance(data, dict) else None
+    return monotonic if isinstance(monotonic, bool) else None
+
+
+def _dashboard_lookup(request):
+    """(etag, entry) for the student, looked up once per request"""
+    if request.user.role != 'student':
+        return None, None
+    if not hasattr(request, '_dashboard_lookup'):
+        request._dashboard_lookup = dashboard_etag(request.user)
+    return request._dashboard_lookup
+
+
+def _dashboard_etag(request):
+    return _dashboard_lookup(request)[0]
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@condition(etag_func=_dashboard_etag)
 def dashboard_view(request):
     """
     Get Student Dashboard Data
     Returns progress and chapters for all subjects
+    Supports If-None-Match: returns 304 before building the payload
     """
     try:
         user = request.user
@@ -29,68 +57,16 @@ def dashboard_view(request):
                 'message': 'Only students can access dashboard'
             }, status=status.HTTP_403_FORBIDDEN)
         
-        # Get all subjects
-        subjects = Subject.objects.all().order_by('order')
-        
-        progress_data = []
-        subjects_data = []
-        
-        for subject in subjects:
-            # Get all chapters for this subject
-            chapters = Chapter.objects.filter(subject=subject).order_by('order')
-            
-            # Calculate subject totals
-            total_videos = chapters.aggregate(total=Sum('total_videos'))['total'] or 0
-            
-            # Get user's progress for this subject's chapters
-            chapter_progress = VideoProgress.objects.filter(
-                student=user,
-                chapter__subject=subject
-            ).select_related('chapter')
-            
-            # Create a map of chapter_id -> videos_watched
-            progress_map = {str(p.chapter.id): p.videos_watched for p in chapter_progress}
-            
-            # Calculate total watched for subject
-            videos_watched = sum(progress_map.values())
-            
-            # Calculate percentage
-            percentage = round((videos_watched / total_videos * 100), 1) if total_videos > 0 else 0
-            
-            # Add to progress summary
-            progress_data.append({
-                'subject': subject.display_name,
-                'videos_watched': videos_watched,
-                'total_videos': total_videos,
-                'percentage': percentage,
-                'color': subject.color
-            })
-            
-            # Build chapters data
-            chapters_list = []
-            for chapter in chapters:
-                watched = progress_map.get(str(chapter.id), 0)
-                chapters_list.append({
-                    'id': str(chapter.id),
-                    'title': chapter.title,
-                    'total_videos': chapter.total_videos,
-                    'watched_videos': watched
-                })
-            
-            subjects_data.append({
-                'subject': subject.display_name,
-                'chapters': chapters_list
-            })
-        
-        response_data = {
-            'progress': progress_data,
-            'subjects': subjects_data
-        }
+        response_data = get_dashboard(user, _dashboard_lookup(request)[1])
         
-        return Response({
+        response = Response({
             'success': True,
             'data': response_data
         }, status=status.HTTP_200_OK)
+        # Cacheable by the client only, and always revalidated with the ETag
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Authorization'])
+        return response
         
     except Exception as e:
         logger.error(f"Dashboard error: {str(e)}", exc_info=True)
@@ -101,12 +77,48 @@ def dashboard_view(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@reads_from_replica
+def dashboard_sync_view(request):
+    """
+    Dashboard changes since the last sync
+    Query params: cursor (from the previous response; omit for everything)
+    Returns: {success, data: {cursor, full, progress: [...], chapters: [...]}}
+    With full, the data replaces what the client holds; otherwise entries update it
+    """
+    try:
+        user = request.user
+        
+        if user.role != 'student':
+            return Response({
+                'success': False,
+                'message': 'Only students can access dashboard'
+            }, status=status.HTTP_403_FORBIDDEN)
+        
+        response = Response({
+            'success': True,
+            'data': sync_dashboard(user, request.query_params.get('cursor'))
+        }, status=status.HTTP_200_OK)
+        patch_cache_control(response, private=True, no_store=True)
+        return response
+        
+    except Exception as e:
+        logger.error(f"Dashboard sync error: {str(e)}", exc_info=True)
+        return Response({
+            'success': False,
+            'message': 'Failed to sync dashboard data',
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def update_progress_view(request):
     """
     Update video progress for a chapter
-    Expects: { "chapter_id": "uuid", "videos_watched": number }
+    Expects: { "chapter_id": "uuid", "videos_watched": number, "monotonic": bool (optional) }
+    With monotonic, a lower videos_watched than stored (e.g. a late heartbeat) is ignored
     """
     try:
         user = request.user
@@ -119,30 +131,36 @@ def update_progress_view(request):
                 'message': 'chapter_id and videos_watched are required'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Get chapter
         try:
-            chapter = Chapter.objects.get(id=chapter_id)
-        except Chapter.DoesNotExist:
+            videos_watched = int(videos_watched)
+        except (TypeError, ValueError):
+            return Response({
+                'success': False,
+                'message': 'videos_watched must be a number'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Get chapter from the catalog snapshot
+        chapter = catalog.get_chapter(chapter_id)
+        if chapter is None:
             return Response({
                 'success': False,
                 'message': 'Chapter not found'
             }, status=status.HTTP_404_NOT_FOUND)
         
-        # Update or create progress
-        progress, created = VideoProgress.objects.update_or_create(
-            student=user,
-            chapter=chapter,
-            defaults={'videos_watched': videos_watched}
-        )
+        # Update progress and the subject rollup
+        videos_watched = save_progress(user, {chapter: videos_watched}, monotonic_flag(request.data))[chapter.id]
+        
+        total_videos = chapter.total_videos
+        percentage = round((videos_watched / total_videos) * 100, 1) if total_videos > 0 else 0
         
         return Response({
             'success': True,
             'message': 'Progress updated successfully',
             'data': {
                 'chapter_id': str(chapter.id),
-                'videos_watched': progress.videos_watched,
-                'total_videos': chapter.total_videos,
-                'percentage': progress.percentage
+                'videos_watched': videos_watched,
+                'total_videos': total_videos,
+                'percentage': percentage
             }
         }, status=status.HTTP_200_OK)
         
@@ -152,4 +170,295 @@ def update_progress_view(request):
             'success': False,
             'message': 'Failed to update progress',
             'error': str(e)
-        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+MAX_BATCH_UPDATES = 500
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def update_progress_batch_view(request):
+    """
+    Update video progress for several chapters at once
+    Expects: { "updates": [{ "chapter_id": "uuid", "videos_watched": number }, ...], "monotonic": bool (optional) }
+    Returns: {success, data: {results: [...]}} with one result per update, in order
+    """
+    try:
+        user = request.user
+        updates = request.data.get('updates') if isinstance(request.data, dict) else None
+        
+        if not isinstance(updates, list) or not updates:
+            return Response({
+                'success': False,
+                'message': 'updates must be a non-empty list'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        if len(updates) > MAX_BATCH_UPDATES:
+            return Response({
+                'success': False,
+                'message': f'At most {MAX_BATCH_UPDATES} updates per request'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Validate every item against the catalog snapshot before writing anything
+        results = []
+        valid = {}
+        for item in updates:
+            item = item if isinstance(item, dict) else {}
+            chapter_id = item.get('chapter_id')
+            chapter = catalog.get_chapter(chapter_id) if chapter_id else None
+            try:
+                videos_watched = int(item.get('videos_watched'))
+            except (TypeError, ValueError):
+                videos_watched = None
+            
+            if chapter is None:
+                results.append({'chapter_id': chapter_id, 'success': False, 'message': 'Chapter not found'})
+            elif videos_watched is None:
+                results.append({'chapter_id': chapter_id, 'success': False, 'message': 'videos_watched must be a number'})
+            else:
+                # Later updates for the same chapter win
+                valid[chapter] = videos_watched
+                results.append({'chapter': chapter, 'success': True})
+        
+        stored = save_progress(user, valid, monotonic_flag(request.data))
+        
+        for index, result in enumerate(results):
+            if not result['success']:
+                continue
+            chapter = result['chapter']
+            videos_watched = stored[chapter.id]
+            total_videos = chapter.total_videos
+            results[index] = {
+                'chapter_id': str(chapter.id),
+                'success': True,
+                'videos_watched': videos_watched,
+                'total_videos': total_videos,
+                'percentage': round((videos_watched / total_videos) * 100, 1) if total_videos > 0 else 0
+            }
+        
+        return Response({
+            'success': True,
+            'message': f'{len(valid)} chapter(s) updated',
+            'data': {
+                'results': results
+            }
+        }, status=status.HTTP_200_OK)
+        
+    except Exception as e:
+        logger.error(f"Batch update progress error: {str(e)}", exc_info=True)
+        return Response({
+            'success': False,
+            'message': 'Failed to update progress',
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def write_behind_stats_view(request):
+    """
+    Write-behind buffer metrics for this worker (staff only)
+    Returns: {success, enabled, data: {depth, coalesced_ratio, last_flush_ms, ...}}
+    """
+    return Response({
+        'success': True,
+        'enabled': writebehind.is_enabled(),
+        'data': writebehind.get_buffer().stats()
+    }, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@reads_from_replica
+def class_analytics_view(request):
+    """
+    Completion analytics across all students (teachers and staff only)
+    Returns: {success, data: {refreshed_at, buckets, subjects: [{summary, chapters: [{summary}]}]}}
+    Each summary: {students, not_started, completed, mean_percentage, median_percentage, buckets}
+    """
+    try:
+        user = request.user
+        
+        if user.role != 'teacher' and not user.is_staff:
+            return Response({
+                'success': False,
+                'message': 'Only teachers can access analytics'
+            }, status=status.HTTP_403_FORBIDDEN)
+        
+        return Response({
+            'success': True,
+            'data': get_class_analytics()
+        }, status=status.HTTP_200_OK)
+        
+    except Exception as e:
+        logger.error(f"Analytics error: {str(e)}", exc_info=True)
+        return Response({
+            'success': False,
+            'message': 'Failed to fetch analytics',
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+MAX_LEADERBOARD_LIMIT = 100
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def leaderboard_view(request):
+    """
+    Per-subject leaderboards with the requesting student's rank
+    Query params: subject (name, optional - default all), limit (default 10, max 100)
+    Returns: {success, data: {subjects: [{subject, students_ranked, top: [...], you: {rank, videos_watched}}]}}
+    """
+    try:
+        user = request.user
+        snapshot = catalog.get_catalog()
+        
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), MAX_LEADERBOARD_LIMIT)
+        except ValueError:
+            return Response({
+                'success': False,
+                'message': 'limit must be a number'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        subjects = snapshot.subjects
+        name = request.query_params.get('subject')
+        if name:
+            subjects = [subject for subject in subjects if subject.name == name]
+            if not subjects:
+                return Response({
+                    'success': False,
+                    'message': 'Subject not found'
+                }, status=status.HTTP_404_NOT_FOUND)
+        
+        board = leaderboard.get_leaderboard()
+        subjects_data = []
+        for subject in subjects:
+            rank, videos_watched, ranked = board.rank(subject.id, user.id)
+            subjects_data.append({
+                'subject': subject.display_name,
+                'total_videos': subject.total_videos,
+                'students_ranked': ranked,
+                'top': [
+                    {
+                        'rank': entry['rank'],
+                        'name': entry['name'],
+                        'videos_watched': entry['videos_watched'],
+                        'is_you': entry['student_id'] == user.id
+                    }
+                    for entry in board.top(subject.id, limit)
+                ],
+                'you': {
+                    'rank': rank,
+                    'videos_watched': videos_watched
+                }
+            })
+        
+        return Response({
+            'success': True,
+            'data': {'subjects': subjects_data}
+        }, status=status.HTTP_200_OK)
+        
+    except Exception as e:
+        logger.error(f"Leaderboard error: {str(e)}", exc_info=True)
+        return Response({
+            'success': False,
+            'message': 'Failed to fetch leaderboard',
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_progress_view(request):
+    """
+    Stream every progress row as NDJSON or CSV (teachers and staff only)
+    Query params: output (ndjson | csv, default ndjson), subject (name),
+    since / until (ISO date or datetime on last_watched_at)
+    """
+    user = request.user
+    
+    if user.role != 'teacher' and not user.is_staff:
+        return Response({
+            'success': False,
+            'message': 'Only teachers can export progress'
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    # Not "format": DRF reserves it for content negotiation
+    output = request.query_params.get('output', 'ndjson')
+    if output not in export.OUTPUT_CONTENT_TYPES:
+        return Response({
+            'success': False,
+            'message': 'output must be ndjson or csv'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    subject = request.query_params.get('subject')
+    if subject and not any(item.name == subject for item in catalog.get_catalog().subjects):
+        return Response({
+            'success': False,
+            'message': 'Subject not found'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    try:
+        since = export.parse_bound(request.query_params.get('since'))
+        until = export.parse_bound(request.query_params.get('until'), end=True)
+    except ValueError as e:
+        return Response({
+            'success': False,
+            'message': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    # Rows are read after the view returns, so pin the replica here
+    rows = export.export_rows(subject=subject, since=since, until=until, using=read_alias())
+    response = StreamingHttpResponse(
+        export.stream_export(output, rows),
+        content_type=export.OUTPUT_CONTENT_TYPES[output]
+    )
+    response['Content-Disposition'] = f'attachment; filename="progress.{output}"'
+    return response
+
+
+MAX_HISTORY_DAYS = 90
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def history_view(request):
+    """
+    Get the student's daily watch history
+    Query params: days (default 7, max 90)
+    Returns: {success, data: {days: [{date, videos_gained, net_change, chapters: [...]}]}}
+    """
+    try:
+        user = request.user
+        
+        if user.role != 'student':
+            return Response({
+                'success': False,
+                'message': 'Only students have watch history'
+            }, status=status.HTTP_403_FORBIDDEN)
+        
+        try:
+            days = min(max(int(request.query_params.get('days', 7)), 1), MAX_HISTORY_DAYS)
+        except ValueError:
+            return Response({
+                'success': False,
+                'message': 'days must be a number'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({
+            'success': True,
+            'data': {
+                'days': history.get_history(user.id, days, catalog.get_catalog())
+            }
+        }, status=status.HTTP_200_OK)
+        
+    except Exception as e:
+        logger.error(f"History error: {str(e)}", exc_info=True)
+        return Response({
+            'success': False,
+            'message': 'Failed to fetch history',
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
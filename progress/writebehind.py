@@ -0,0 +1,248 @@
+"""
+Write-behind buffer for progress heartbeats
+
+Opt-in with PROGRESS_WRITE_BEHIND. Updates are coalesced per
+(student, chapter) in a bounded in-process buffer and flushed with
+write_progress() every PROGRESS_WRITE_BEHIND_INTERVAL seconds, once
+PROGRESS_WRITE_BEHIND_FLUSH_AT keys are pending, and at worker exit. When the
+buffer holds PROGRESS_WRITE_BEHIND_MAX_PENDING keys the writer flushes inline.
+
+Dashboards built in the same worker merge buffered values; other workers see
+them after the next flush.
+
+A flush is one write_progress() batch. If that fails, the keys are written
+one at a time: a key that can never be written (its chapter, subject or
+student was deleted after it was buffered) is logged and dropped, and when
+the database itself is failing the rest are kept for the next flush.
+"""
+from django.conf import settings
+from django.db import DataError, IntegrityError, close_old_connections
+from . import caching, catalog, services
+import atexit
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ProgressBuffer:
+    """Coalescing (student_id, chapter) -> videos_watched buffer"""
+
+    def __init__(self, interval=2.0, flush_at=500, max_pending=10000, autostart=True):
+        self.interval = interval
+        self.flush_at = flush_at
+        self.max_pending = max_pending
+        self.autostart = autostart
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        # (student_id, chapter) -> (videos_watched, monotonic)
+        self._pending = {}
+        # Entries being written by the current flush, still visible to reads
+        self._inflight = {}
+        self._received = 0
+        self._written = 0
+        self._dropped = 0
+        self._flushes = 0
+        self._errors = 0
+        self._flush_seconds_total = 0.0
+        self._flush_seconds_max = 0.0
+        self._last_flush_seconds = 0.0
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            interval=settings.PROGRESS_WRITE_BEHIND_INTERVAL,
+            flush_at=settings.PROGRESS_WRITE_BEHIND_FLUSH_AT,
+            max_pending=settings.PROGRESS_WRITE_BEHIND_MAX_PENDING,
+        )
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='progress-write-behind', daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+    def add(self, student_id, chapter, videos_watched, monotonic=None):
+        """
+        Buffer an update and return the value it will be written as
+
+        Mirrors write_progress(): the value is clamped to the chapter's
+        total_videos and, for monotonic updates, coalesced with max().
+        """
+        if monotonic is None:
+            monotonic = settings.PROGRESS_MONOTONIC_UPDATES
+        videos_watched = max(0, min(videos_watched, chapter.total_videos))
+        key = (student_id, chapter)
+
+        with self._lock:
+            if self.autostart:
+                self._start()
+            previous = self._pending.get(key)
+            if monotonic and previous is not None:
+                videos_watched = max(videos_watched, previous[0])
+            self._pending[key] = (videos_watched, monotonic)
+            self._received += 1
+            depth = len(self._pending)
+
+        if depth >= self.max_pending:
+            self.flush()
+        elif depth >= self.flush_at:
+            self._wake.set()
+
+        return videos_watched
+
+    def pending_for(self, student_id):
+        """Buffered {chapter_id: (videos_watched, monotonic)} for a student"""
+        with self._lock:
+            entries = {**self._inflight, **self._pending}
+        return {
+            chapter.id: value
+            for (entry_student_id, chapter), value in entries.items()
+            if entry_student_id == student_id
+        }
+
+    def _write(self, batch):
+        for monotonic in (False, True):
+            updates = {key: value for key, (value, flag) in batch.items() if flag is monotonic}
+            services.write_progress(updates, monotonic)
+
+    def _write_each(self, batch):
+        """Write keys one by one; returns ({key: value} still to write, number dropped)"""
+        items = list(batch.items())
+        dropped = 0
+        for index, (key, value) in enumerate(items):
+            try:
+                self._write({key: value})
+            except (IntegrityError, DataError) as e:
+                logger.error(f"Write-behind dropped {key[0]}/{key[1].id}: {str(e)}")
+                dropped += 1
+            except Exception:
+                # Not this key: keep it and the rest for the next flush
+                return dict(items[index:]), dropped
+        return {}, dropped
+
+    def flush(self):
+        """Write everything buffered so far; returns the number of rows written"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                self._inflight = batch
+            if not batch:
+                return 0
+
+            started = time.perf_counter()
+            chapters = catalog.get_catalog().chapters
+            # Deleted from the catalog since they were buffered
+            deleted = [key for key in batch if key[1].id not in chapters]
+            for key in deleted:
+                logger.error(f"Write-behind dropped {key[0]}/{key[1].id}: chapter no longer exists")
+                del batch[key]
+
+            remaining, dropped = {}, len(deleted)
+            try:
+                self._write(batch)
+            except Exception as e:
+                logger.error(f"Write-behind flush error: {str(e)}", exc_info=True)
+                with self._lock:
+                    self._errors += 1
+                remaining, failed = self._write_each(batch)
+                dropped += failed
+
+            elapsed = time.perf_counter() - started
+            written = len(batch) - len(remaining) - (dropped - len(deleted))
+            with self._lock:
+                # Re-queue unless a newer update arrived meanwhile
+                for key, value in remaining.items():
+                    self._pending.setdefault(key, value)
+                self._inflight = {}
+                self._written += written
+                self._dropped += dropped
+                self._flushes += 1
+                self._last_flush_seconds = elapsed
+                self._flush_seconds_total += elapsed
+                self._flush_seconds_max = max(self._flush_seconds_max, elapsed)
+            return written
+
+    def stats(self):
+        """Buffer depth, flush latency and how many updates were coalesced away"""
+        with self._lock:
+            received = self._received
+            buffered = len(self._pending) + len(self._inflight)
+            coalesced = received - self._written - self._dropped - buffered
+            return {
+                'depth': len(self._pending),
+                'inflight': len(self._inflight),
+                'updates_received': received,
+                'rows_written': self._written,
+                'rows_dropped': self._dropped,
+                'rows_coalesced': coalesced,
+                'coalesced_ratio': round(coalesced / received, 4) if received else 0.0,
+                'flushes': self._flushes,
+                'flush_errors': self._errors,
+                'last_flush_ms': round(self._last_flush_seconds * 1000, 2),
+                'mean_flush_ms': round(self._flush_seconds_total / self._flushes * 1000, 2) if self._flushes else 0.0,
+                'max_flush_ms': round(self._flush_seconds_max * 1000, 2),
+            }
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    """The worker's buffer, created on first use"""
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = ProgressBuffer.from_settings()
+    return _buffer
+
+
+def is_enabled():
+    return settings.PROGRESS_WRITE_BEHIND
+
+
+def submit(student, updates, monotonic=None):
+    """
+    Buffer {chapter: videos_watched} for a student instead of writing it
+
+    Returns {chapter_id: videos_watched as it will be written}.
+    """
+    buffer = get_buffer()
+    buffered = {
+        chapter.id: buffer.add(student.id, chapter, videos_watched, monotonic)
+        for chapter, videos_watched in updates.items()
+    }
+    caching.bump_progress_version(student.id)
+    return buffered
+
+
+def merge_pending(student_id, progress_map, rollup_map, catalog):
+    """
+    Overlay a student's buffered updates onto the dashboard's
+    chapter -> watched and subject -> watched maps in place
+    """
+    if not is_enabled():
+        return
+    for chapter_id, (videos_watched, monotonic) in get_buffer().pending_for(student_id).items():
+        chapter = catalog.chapters.get(chapter_id)
+        if chapter is None:
+            continue
+        current = progress_map.get(chapter_id, 0)
+        if monotonic:
+            videos_watched = max(videos_watched, current)
+        progress_map[chapter_id] = videos_watched
+        rollup_map[chapter.subject_id] = rollup_map.get(chapter.subject_id, 0) + videos_watched - current